@@ -5,9 +5,12 @@ Enterprise chatbot with ScaleDown compression and Gemini AI
 
 import streamlit as st
 import os
+import time
 from src.database import init_database
-from src.kb_pipeline import rebuild_kb_index, get_kb_stats
-from src.retriever import get_retriever
+from src.kb_pipeline import get_kb_stats
+from src.kb_jobs import JOB_POLL_SECONDS, enqueue_rebuild, ensure_worker, get_active_jobs, get_recent_jobs
+from src.retriever import get_retriever, index_exists
+from src.kb_watcher import WATCH_DOCS, ensure_watcher
 
 # Page configuration
 st.set_page_config(
@@ -48,23 +51,61 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+def show_first_build(active_jobs):
+    """Show the progress of the rebuild jobs building the first KB index."""
+    for job in active_jobs:
+        if job['status'] == 'queued':
+            st.info(f"🕒 Knowledge base build queued as job #{job['id']}: {job['message'] or 'Waiting for worker...'}")
+            continue
+        
+        st.markdown(f"**📚 Building knowledge base index from sample data (job #{job['id']}):** {job['message'] or 'Starting...'}")
+        st.progress(min(job['progress'] or 0.0, 1.0))
+        details = [f"{job['rows_done']:,} sources"]
+        if job['eta_seconds'] is not None:
+            eta = int(job['eta_seconds'])
+            details.append(f"ETA {eta // 60}m {eta % 60:02d}s")
+        st.caption(" · ".join(details) + " · You can use the other pages meanwhile")
+
+
 def initialize_system():
-    """Initialize database and KB index on first run."""
-    # Initialize database
+    """
+    Initialize database and KB index on first run.
+    
+    The first index is built by a background rebuild job, so the page renders
+    right away and shows the job's progress instead of blocking on it.
+    
+    Returns:
+        Rebuild jobs still building the first index (empty once it exists)
+    """
+    # Initialize database (also adds tables/columns missing from older databases)
     if not os.path.exists("helpdesk.db"):
         with st.spinner("🔧 Initializing database..."):
             init_database()
             st.success("✅ Database initialized")
+    else:
+        init_database()
     
-    # Build KB index if not exists
-    if not os.path.exists("storage/kb_index.pkl"):
-        with st.spinner("📚 Building knowledge base index from sample data..."):
-            try:
-                rebuild_kb_index()
-                st.success("✅ Knowledge base index built successfully")
-            except Exception as e:
-                st.warning(f"⚠️ Could not build KB index: {e}")
-                st.info("You can build the index manually from the Admin/KB page")
+    # Queue a KB build if there is no index yet (one build however many sessions ask)
+    active_jobs = []
+    if not index_exists():
+        active_jobs = get_active_jobs("rebuild")
+        recent = get_recent_jobs(limit=1)
+        last_job = recent[0] if recent else None
+        if not active_jobs and last_job and last_job['kind'] == 'rebuild' and last_job['result']:
+            # Not retried automatically; a finished build that left no index had nothing to index
+            if last_job['result']['success']:
+                st.warning(f"⚠️ KB build job #{last_job['id']} found no documents or tickets to index")
+            else:
+                st.warning(f"⚠️ Could not build KB index (job #{last_job['id']}): {last_job['result']['error']}")
+            st.info("You can build the index manually from the Admin/KB page")
+        else:
+            if not active_jobs:
+                enqueue_rebuild()
+                active_jobs = get_active_jobs("rebuild")
+            # Also picks up jobs queued before a restart
+            ensure_worker()
+            show_first_build(active_jobs)
+        return active_jobs
     
     # Load retriever
     try:
@@ -73,9 +114,15 @@ def initialize_system():
             retriever.load_index()
     except Exception as e:
         st.warning(f"⚠️ Could not load retriever: {e}")
+    
+    # Optionally sync edits under data/docs into the live index in the background
+    if WATCH_DOCS:
+        ensure_watcher()
+    
+    return active_jobs
 
 # Initialize system
-initialize_system()
+first_build_jobs = initialize_system()
 
 # Sidebar title
 st.sidebar.title("🤖 IT Helpdesk Chatbot")
@@ -186,3 +233,8 @@ st.markdown("""
     <small>Hackathon MVP - Enterprise IT Helpdesk Chatbot</small>
 </div>
 """, unsafe_allow_html=True)
+
+# Poll the first KB build: rerun the page until it finishes
+if first_build_jobs:
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
@@ -134,9 +134,9 @@ if prompt := st.chat_input("Ask your IT question..."):
                 st.session_state.show_ticket_form = False
                 
             # Check confidence threshold and character count
-            elif not retrieved_chunks or confidence < 0.20 or total_chars < 400:
+            elif not retrieved_chunks or confidence < retriever.confidence_threshold or total_chars < 400:
                 response = "I don't have enough verified information in our internal KB to answer this question safely.\n\n"
-                response += f"**Retrieval Confidence:** {confidence:.2%} (minimum required: 20%)\n"
+                response += f"**Retrieval Confidence:** {confidence:.2%} (minimum required: {retriever.confidence_threshold:.0%})\n"
                 response += f"**KB Content Found:** {total_chars} characters (minimum required: 400)\n\n"
                 response += "To ensure you get accurate help, I recommend creating a support ticket. Please provide:\n"
                 response += "- Device type (laptop/desktop/mobile)\n"
@@ -168,7 +168,7 @@ if prompt := st.chat_input("Ask your IT question..."):
                     'description': f"""**User Query:** {prompt}
 
 **Retrieval Analysis:**
-- Confidence Score: {confidence:.2%} (threshold: 20%)
+- Confidence Score: {confidence:.2%} (threshold: {retriever.confidence_threshold:.0%})
 - KB Content Found: {total_chars} characters (threshold: 400)
 - Retrieved Chunks: {len(retrieved_chunks) if retrieved_chunks else 0}
 {sources_text}
@@ -388,7 +388,7 @@ if st.session_state.last_metrics:
         if 'confidence' in m:
             col1, col2, col3 = st.columns(3)
             col1.metric("Retrieval Confidence", f"{m['confidence']:.2%}", 
-                       help="TF-IDF cosine similarity score (threshold: 20%)")
+                       help=f"Average {retriever.mode} retrieval score (threshold: {retriever.confidence_threshold:.0%})")
             col2.metric("KB Content Found", f"{m.get('total_chars', 0)} chars",
                        help="Total characters in retrieved snippets (threshold: 400)")
             col3.metric("Retrieved Chunks", m['retrieved_chunks'])
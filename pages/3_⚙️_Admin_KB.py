@@ -3,10 +3,14 @@ Admin/KB Page - IT Helpdesk Chatbot
 Manage knowledge base and upload documents
 """
 
+import os
+import time
 import streamlit as st
 import plotly.express as px
-from src.kb_pipeline import rebuild_kb_index, get_kb_stats
-from src.database import get_connection
+from src.kb_pipeline import save_uploaded_files, sync_kb_index, get_kb_stats
+from src.kb_jobs import JOB_POLL_SECONDS, enqueue_rebuild, ensure_worker, get_active_jobs, get_recent_jobs
+from src.database import clear_kb
+from src.retriever import get_active_generation, get_retriever
 
 st.set_page_config(page_title="Admin/KB - IT Helpdesk", page_icon="⚙️", layout="wide")
 
@@ -30,6 +34,9 @@ with tab1:
         col3.metric("Total Tokens (Original)", f"{stats['total_original_tokens']:,}")
         col4.metric("Avg Compression Ratio", f"{stats['avg_compression_ratio']:.2f}x" if stats['avg_compression_ratio'] else "N/A")
         
+        if stats.get('total_duplicates'):
+            st.caption(f"🧬 {stats['total_duplicates']} near-duplicate chunks were merged at ingest")
+        
         # Category breakdown
         if stats['categories']:
             st.markdown("### Category Breakdown")
@@ -59,9 +66,11 @@ with tab2:
     st.markdown("""
     Upload new documents and tickets to rebuild the knowledge base. The system will:
     1. Save uploaded files to `data/uploads/`
-    2. Compress each document using ScaleDown (model: gemini-2.5-flash, rate: auto)
-    3. Store compressed chunks in `storage/kb_chunks.json`
-    4. Build TF-IDF index and save to `storage/tfidf_vectorizer.pkl` and `storage/tfidf_matrix.pkl`
+    2. Split documents into heading-aware chunks (~200 words with overlap)
+    3. Compress each chunk using ScaleDown (model: gemini-2.5-flash, rate: auto)
+    4. Stage compressed chunks beside the live KB (a failed rebuild resumes where it stopped)
+    5. Build the TF-IDF/BM25 index as a new generation under `storage/kb_index/` and swap it in together with the staged chunks
+    6. Export the chunks to the `storage/kb_chunks.jsonl.gz` artifact
     """)
     
     st.markdown("---")
@@ -103,32 +112,66 @@ with tab2:
         help="Include documents already in data/docs/ directory"
     )
     
-    # Rebuild button
+    # Rebuild button - queues a background job; requests made before it starts are merged into it
     if st.button("🔨 Rebuild KB Index", type="primary", use_container_width=True):
         if not md_files and not csv_file and not include_existing:
             st.error("Please upload files or enable 'Include existing documents'")
         else:
-            # Progress tracking
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            def update_progress(current, total, message):
-                progress = current / total if total > 0 else 0
-                progress_bar.progress(progress)
-                status_text.text(message)
-            
-            # Run rebuild
-            with st.spinner("Rebuilding KB..."):
-                result = rebuild_kb_index(
-                    md_files=md_files,
-                    csv_file=csv_file,
-                    include_existing_docs=include_existing,
-                    progress_callback=update_progress
+            saved_files = save_uploaded_files(md_files, csv_file)
+            job_id = enqueue_rebuild(
+                md_files=saved_files["md_files"],
+                csv_files=saved_files["csv_files"],
+                include_existing_docs=include_existing
+            )
+            ensure_worker()
+            st.success(f"🕒 Rebuild queued as job #{job_id}. It keeps running if you leave this page.")
+    
+    # Rebuild job status (polled from the kb_jobs table)
+    active_jobs = get_active_jobs("rebuild")
+    if active_jobs:
+        # Also picks up jobs queued before a restart
+        ensure_worker()
+        for job in active_jobs:
+            if job['status'] == 'queued':
+                st.info(
+                    f"🕒 Job #{job['id']} queued ({job['requests']} request(s) merged): "
+                    f"{job['message'] or 'Waiting for worker...'}"
                 )
+                continue
             
-            # Show results
+            st.markdown(f"**🔨 Job #{job['id']}:** {job['message'] or 'Starting...'}")
+            st.progress(min(job['progress'] or 0.0, 1.0))
+            details = [f"{job['rows_done']:,} sources"]
+            if job['rows_per_second']:
+                details.append(f"{job['rows_per_second']:,.0f} rows/s")
+            if job['eta_seconds'] is not None:
+                eta = int(job['eta_seconds'])
+                details.append(f"ETA {eta // 60}m {eta % 60:02d}s")
+            st.caption(" · ".join(details))
+    else:
+        recent = get_recent_jobs(limit=1)
+        job = recent[0] if recent else None
+        if job and job['kind'] == 'rebuild' and job['result']:
+            result = job['result']
             if result['success']:
-                st.success(f"✅ KB rebuilt successfully! {result['chunks_count']} chunks created.")
+                st.success(
+                    f"✅ KB rebuilt successfully (job #{job['id']}, finished {job['finished_at']})! "
+                    f"{result['chunks_count']} chunks created from {result['documents_count']} sources "
+                    f"({result['rows_per_second']:,.0f} rows/s)."
+                )
+                if result.get('resumed'):
+                    st.info(
+                        f"⏯️ Resumed an interrupted rebuild (attempt {result['attempts']}): "
+                        f"{result['sources_skipped']} sources were already staged"
+                    )
+                if result.get('duplicates_removed'):
+                    st.info(f"🧬 {result['duplicates_removed']} near-duplicate chunks merged into canonical chunks")
+                if result.get('compression_cache'):
+                    cache = result['compression_cache']
+                    st.info(
+                        f"♻️ Compression cache: {cache['hits']} hits, {cache['misses']} ScaleDown calls "
+                        f"({cache['hit_rate']:.0%} hit rate)"
+                    )
                 
                 if result['errors']:
                     st.warning("⚠️ Some warnings occurred:")
@@ -136,18 +179,16 @@ with tab2:
                         st.markdown(f"- {error}")
                 
                 # Show file status
+                params = job['params']
                 st.markdown("### 📁 Processing Summary")
-                if md_files:
-                    st.markdown(f"**Uploaded Documents:** {len(md_files)} files")
-                if csv_file:
-                    st.markdown(f"**Uploaded Tickets:** {csv_file.name}")
-                if include_existing:
+                if params['md_files']:
+                    st.markdown(f"**Uploaded Documents:** {len(params['md_files'])} files")
+                if params['csv_files']:
+                    st.markdown(f"**Uploaded Tickets:** {', '.join(os.path.basename(path) for path in params['csv_files'])}")
+                if params['include_existing_docs']:
                     st.markdown("**Existing Documents:** Included from data/docs/")
-                
-                st.balloons()
-                st.rerun()
             else:
-                st.error(f"❌ KB rebuild failed: {result['error']}")
+                st.error(f"❌ KB rebuild failed (job #{job['id']}): {result['error']}")
                 
                 if result['errors']:
                     st.markdown("**Errors:**")
@@ -159,7 +200,48 @@ with tab2:
                 - Check that your ScaleDown API key is configured correctly
                 - Verify that the uploaded files are valid markdown/text/CSV
                 - Check the console for detailed error messages
+                - Rebuild again to resume from the last completed batch
                 """)
+    
+    # Incremental sync button
+    if st.button("🔄 Sync Changed Sources", use_container_width=True,
+                 help="Only process documents and tickets added, changed or deleted since the last rebuild or sync"):
+        if not md_files and not csv_file and not include_existing:
+            st.error("Please upload files or enable 'Include existing documents'")
+        else:
+            progress_bar = st.progress(0)
+            status_text = st.empty()
+            
+            def update_sync_progress(current, total, message):
+                progress_bar.progress(current / total if total > 0 else 0)
+                status_text.text(message)
+            
+            with st.spinner("Syncing KB..."):
+                result = sync_kb_index(
+                    md_files=md_files,
+                    csv_file=csv_file,
+                    include_existing_docs=include_existing,
+                    progress_callback=update_sync_progress
+                )
+            
+            if result['success']:
+                st.success(
+                    f"✅ KB synced: {result['added']} added, {result['changed']} changed, "
+                    f"{result['deleted']} deleted, {result['reingested']} re-ingested near-duplicates, "
+                    f"{result['unchanged']} unchanged sources"
+                )
+                if result['members_pending']:
+                    st.info(f"{result['members_pending']} near-duplicate sources will be re-ingested by their next sync")
+                st.markdown(
+                    f"**Chunks:** +{result['chunks_added']} / -{result['chunks_removed']}"
+                    + (f" (index generation {result['generation']})" if result['generation'] else "")
+                )
+                if result['errors']:
+                    st.warning("⚠️ Some warnings occurred:")
+                    for error in result['errors']:
+                        st.markdown(f"- {error}")
+            else:
+                st.error(f"❌ KB sync failed: {result['error']}")
 
 with tab3:
     st.markdown("### 🗑️ Manage Knowledge Base")
@@ -194,14 +276,13 @@ with tab3:
     
     # Clear KB
     with st.expander("🗑️ Clear Knowledge Base"):
-        st.warning("This will delete all KB chunks from the database. Files will not be deleted.")
+        st.warning("This will delete all KB chunks and source fingerprints from the database and retire the index. Files will not be deleted.")
         
         if st.button("Clear KB", type="secondary"):
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM kb_chunks")
-            conn.commit()
-            conn.close()
+            clear_kb()
+            # Sharded retrievers serve through their local retriever
+            retriever = get_retriever()
+            getattr(retriever, 'local', retriever).refresh()
             
             st.success("✅ Knowledge base cleared")
             st.rerun()
@@ -213,9 +294,7 @@ with tab3:
         st.markdown("**Storage Files:**")
         
         files_to_check = [
-            ("storage/kb_chunks.json", "KB Chunks JSON"),
-            ("storage/tfidf_vectorizer.pkl", "TF-IDF Vectorizer"),
-            ("storage/tfidf_matrix.pkl", "TF-IDF Matrix"),
+            ("storage/kb_chunks.jsonl.gz", "KB Chunks Artifact"),
             ("helpdesk.db", "SQLite Database")
         ]
         
@@ -226,6 +305,25 @@ with tab3:
                 st.markdown(f"- ✅ **{description}**: {filepath} ({size_kb:.2f} KB)")
             else:
                 st.markdown(f"- ❌ **{description}**: Not found")
+        
+        generation = get_active_generation()
+        if generation and os.path.isdir(generation['path']):
+            size_kb = sum(
+                os.path.getsize(os.path.join(generation['path'], name))
+                for name in os.listdir(generation['path'])
+            ) / 1024
+            st.markdown(
+                f"- ✅ **Retrieval Index** (generation {generation['generation']}, "
+                f"{generation['chunks_count']} chunks): {generation['path']} ({size_kb:.2f} KB)"
+            )
+        else:
+            st.markdown("- ❌ **Retrieval Index**: Not found")
+        
+        cache = get_retriever().cache_stats()
+        st.markdown(
+            f"- 🗂️ **Query Cache**: {cache['entries']}/{cache['max_entries']} entries, "
+            f"{cache['hits']} hits / {cache['misses']} misses ({cache['hit_rate']:.0%} hit rate)"
+        )
 
 # Footer
 st.markdown("---")
@@ -234,3 +332,8 @@ st.markdown("""
     <small>💡 Tip: Rebuild the KB index after uploading new documents or tickets</small>
 </div>
 """, unsafe_allow_html=True)
+
+# Poll running jobs: rerun the page until the rebuild finishes
+if active_jobs:
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
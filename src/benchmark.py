@@ -0,0 +1,384 @@
+"""
+Retrieval benchmark on synthetic KB corpora.
+Scales the vocabulary of data/docs and resolved_tickets.csv up to large chunk
+counts and measures index build/load time, size on disk, RSS and query latency.
+
+Usage:
+    python -m src.benchmark --sizes 1000 10000 --modes tfidf bm25
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Optional
+import numpy as np
+
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+DEFAULT_QUERIES = 200
+WARMUP_QUERIES = 10
+
+# Words per synthetic chunk (uniform range) and the share drawn from the
+# chunk's own category vocabulary rather than the global one
+CHUNK_WORDS = (60, 200)
+CATEGORY_WORD_SHARE = 0.7
+
+# Share of a chunk's words kept in its synthetic compressed_text
+COMPRESSED_SHARE = 0.4
+
+BENCHMARK_DIR = os.path.join("storage", "benchmarks")
+
+WORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9'-]+")
+HEADING_LINE = re.compile(r"^#{1,6}\s+(.+)$", re.MULTILINE)
+
+
+def load_vocabulary(docs_dir: str = "data/docs", tickets_csv: str = "data/resolved_tickets.csv") -> Dict:
+    """
+    Collect word frequencies per category, titles and sample queries from the real KB.
+    
+    Returns:
+        Dict with 'categories' (category -> (words, probabilities)), 'global'
+        (words, probabilities), 'titles' and 'queries'
+    """
+    from src.kb_pipeline import load_documents_from_directory, load_tickets_from_csv
+    
+    documents = load_documents_from_directory(docs_dir) + load_tickets_from_csv(tickets_csv)
+    if not documents:
+        raise ValueError(f"No documents found in {docs_dir} or {tickets_csv}")
+    
+    counts = {}
+    for doc in documents:
+        words = [word.lower() for word in WORD_PATTERN.findall(f"{doc['title']} {doc['content']}")]
+        counts.setdefault(doc['category'], Counter()).update(words)
+    
+    def distribution(counter):
+        words, freqs = zip(*counter.most_common())
+        freqs = np.array(freqs, dtype=np.float64)
+        return list(words), (freqs / freqs.sum()).tolist()
+    
+    total = Counter()
+    for counter in counts.values():
+        total.update(counter)
+    
+    # Ticket titles and document headings read like real user questions
+    queries = [doc['title'] for doc in documents if doc['source'].endswith('.csv')]
+    for doc in documents:
+        queries.extend(heading.strip() for heading in HEADING_LINE.findall(doc['content']))
+    
+    return {
+        'categories': {category: distribution(counter) for category, counter in counts.items()},
+        'global': distribution(total),
+        'titles': sorted({doc['title'] for doc in documents}),
+        'queries': [query for query in dict.fromkeys(queries) if WORD_PATTERN.search(query)]
+    }
+
+
+def generate_chunks(num_chunks: int, vocabulary: Dict, seed: int = 0) -> List[Dict]:
+    """
+    Generate synthetic chunks whose words follow the real per-category frequencies.
+    
+    Args:
+        num_chunks: Number of chunks to generate
+        vocabulary: Output of load_vocabulary()
+        seed: Random seed (same seed, same corpus)
+    
+    Returns:
+        Chunk dicts shaped like load_chunks_from_db() rows
+    """
+    rng = np.random.default_rng(seed)
+    categories = sorted(vocabulary['categories'])
+    global_words, global_probs = vocabulary['global']
+    global_words = np.array(global_words)
+    titles = vocabulary['titles']
+    
+    chunk_categories = rng.integers(len(categories), size=num_chunks)
+    lengths = rng.integers(CHUNK_WORDS[0], CHUNK_WORDS[1] + 1, size=num_chunks)
+    title_ids = rng.integers(len(titles), size=num_chunks)
+    
+    texts = [None] * num_chunks
+    for c, category in enumerate(categories):
+        rows = np.flatnonzero(chunk_categories == c)
+        if not len(rows):
+            continue
+        
+        # Draw all words of this category's chunks at once, then split per chunk
+        words, probs = vocabulary['categories'][category]
+        words = np.array(words)
+        total = int(lengths[rows].sum())
+        own = rng.random(total) < CATEGORY_WORD_SHARE
+        drawn = np.where(
+            own,
+            words[rng.choice(len(words), size=total, p=probs)],
+            global_words[rng.choice(len(global_words), size=total, p=global_probs)]
+        )
+        for row, chunk_words in zip(rows, np.split(drawn, np.cumsum(lengths[rows])[:-1])):
+            texts[row] = chunk_words.tolist()
+    
+    chunks = []
+    for i in range(num_chunks):
+        words = texts[i]
+        title = titles[title_ids[i]]
+        chunks.append({
+            'id': i + 1,
+            'source_id': f"synthetic-{i // 10}",
+            'title': f"{title} #{i}",
+            'category': categories[chunk_categories[i]],
+            'text': " ".join(words),
+            'compressed_text': " ".join(words[:max(1, int(len(words) * COMPRESSED_SHARE))]),
+            'parent_title': title,
+            'section': None,
+            'chunk_index': i % 10
+        })
+    
+    return chunks
+
+
+def _rss_mb() -> float:
+    """Current resident set size of this process in MB."""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def _dir_size(path: str) -> int:
+    """Total size of the files under path in bytes."""
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def _build_phase(workdir: str, num_chunks: int, vocabulary: Dict, seed: int) -> Dict:
+    """Generate a corpus and publish it as an index generation (runs in a child process)."""
+    os.chdir(workdir)
+    from src.database import init_database
+    from src.retriever import KBRetriever, _generation_dir
+    
+    init_database()
+    
+    start = time.perf_counter()
+    chunks = generate_chunks(num_chunks, vocabulary, seed)
+    generate_seconds = time.perf_counter() - start
+    
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    generation = KBRetriever().build_index(chunks)
+    build_seconds = time.perf_counter() - start
+    
+    return {
+        'generate_seconds': generate_seconds,
+        'build_seconds': build_seconds,
+        'index_bytes': _dir_size(_generation_dir(generation)),
+        'rss_before_build_mb': rss_before,
+        'peak_rss_mb': _peak_rss_mb()
+    }
+
+
+def _latency_stats(latencies: List[float]) -> Dict:
+    """Summarize per-query latencies (seconds) in milliseconds."""
+    ms = np.array(latencies) * 1000
+    return {
+        'queries': len(ms),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'qps': float(len(ms) / ms.sum() * 1000) if ms.sum() else 0.0
+    }
+
+
+def _query_phase(workdir: str, mode: str, queries: List[str], top_k: int, seed: int) -> Dict:
+    """Load the active generation and time queries in one mode (runs in a child process)."""
+    os.chdir(workdir)
+    from src.retriever import KBRetriever
+    
+    rss_before = _rss_mb()
+    retriever = KBRetriever(mode)
+    start = time.perf_counter()
+    retriever.load_index()
+    load_seconds = time.perf_counter() - start
+    rss_after_load = _rss_mb()
+    
+    # Every query must be scored, not answered from the result cache
+    retriever.cache.max_entries = 0
+    
+    rng = np.random.default_rng(seed)
+    categories = retriever.get_all_categories()
+    filters = [categories[i] for i in rng.integers(len(categories), size=len(queries))]
+    
+    for query in queries[:WARMUP_QUERIES]:
+        retriever.retrieve(query, top_k=top_k)
+    
+    results = {}
+    for name, category_filters in (('unfiltered', [None] * len(queries)), ('filtered', filters)):
+        latencies = []
+        for query, category in zip(queries, category_filters):
+            start = time.perf_counter()
+            retriever.retrieve(query, top_k=top_k, category=category)
+            latencies.append(time.perf_counter() - start)
+        results[name] = _latency_stats(latencies)
+    
+    return {
+        'load_seconds': load_seconds,
+        'rss_before_load_mb': rss_before,
+        'rss_after_load_mb': rss_after_load,
+        'rss_after_queries_mb': _rss_mb(),
+        'peak_rss_mb': _peak_rss_mb(),
+        'latency': results
+    }
+
+
+def _run_isolated(function, *args):
+    """Run one benchmark phase in a fresh process so RSS figures are not shared."""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(function, *args).result()
+
+
+def _git_commit() -> Optional[str]:
+    """Current git commit of the working tree, if available."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(
+    sizes: List[int] = DEFAULT_SIZES,
+    modes: List[str] = ("tfidf",),
+    num_queries: int = DEFAULT_QUERIES,
+    top_k: int = 3,
+    seed: int = 0,
+    docs_dir: str = "data/docs",
+    tickets_csv: str = "data/resolved_tickets.csv",
+    keep_workdirs: bool = False
+) -> Dict:
+    """
+    Benchmark index build, load and retrieval for each corpus size and mode.
+    
+    Each size is built once in a scratch directory (with its own SQLite
+    database and index generation); each mode then loads it and runs the same
+    queries, unfiltered and with a random category filter per query.
+    
+    Returns:
+        Report dict (also what main() writes as JSON)
+    """
+    from src import index_store
+    
+    vocabulary = load_vocabulary(docs_dir, tickets_csv)
+    rng = np.random.default_rng(seed)
+    queries = [vocabulary['queries'][i] for i in rng.integers(len(vocabulary['queries']), size=num_queries)]
+    
+    report = {
+        'benchmark': 'retrieval',
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'index_format_version': index_store.INDEX_FORMAT_VERSION,
+        'config': {
+            'sizes': list(sizes),
+            'modes': list(modes),
+            'queries': num_queries,
+            'top_k': top_k,
+            'seed': seed,
+            'chunk_words': list(CHUNK_WORDS)
+        },
+        'results': []
+    }
+    
+    for size in sizes:
+        workdir = tempfile.mkdtemp(prefix=f"kb-bench-{size}-")
+        try:
+            print(f"🏗️  Building synthetic index with {size:,} chunks...")
+            build = _run_isolated(_build_phase, workdir, size, vocabulary, seed)
+            print(
+                f"   build {build['build_seconds']:.2f}s, "
+                f"{build['index_bytes'] / 2**20:.1f} MB on disk, peak RSS {build['peak_rss_mb']:.0f} MB"
+            )
+            
+            result = {'size': size, 'build': build, 'modes': {}}
+            for mode in modes:
+                stats = _run_isolated(_query_phase, workdir, mode, queries, top_k, seed)
+                result['modes'][mode] = stats
+                print(
+                    f"   {mode}: load {stats['load_seconds'] * 1000:.1f}ms, "
+                    f"RSS {stats['rss_after_load_mb']:.0f} MB, "
+                    f"p50/p95/p99 {stats['latency']['unfiltered']['p50_ms']:.2f}/"
+                    f"{stats['latency']['unfiltered']['p95_ms']:.2f}/"
+                    f"{stats['latency']['unfiltered']['p99_ms']:.2f}ms "
+                    f"(filtered p50 {stats['latency']['filtered']['p50_ms']:.2f}ms)"
+                )
+            report['results'].append(result)
+        finally:
+            if keep_workdirs:
+                print(f"   kept {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+    
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point."""
+    from src.retriever import RETRIEVAL_MODES
+    
+    parser = argparse.ArgumentParser(description="Benchmark KB retrieval on synthetic corpora.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Corpus sizes in chunks")
+    parser.add_argument("--modes", nargs="+", default=["tfidf"], choices=RETRIEVAL_MODES, help="Retrieval modes to time")
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES, help="Timed queries per mode and filter setting")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON report path (default: storage/benchmarks/retrieval-<timestamp>.json)")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch index directories")
+    args = parser.parse_args(argv)
+    
+    report = run_benchmark(
+        sizes=args.sizes,
+        modes=args.modes,
+        num_queries=args.queries,
+        top_k=args.top_k,
+        seed=args.seed,
+        docs_dir=os.path.abspath("data/docs"),
+        tickets_csv=os.path.abspath("data/resolved_tickets.csv"),
+        keep_workdirs=args.keep
+    )
+    
+    output = args.output or os.path.join(BENCHMARK_DIR, f"retrieval-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    
+    print(f"✅ Benchmark report saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
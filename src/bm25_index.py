@@ -0,0 +1,262 @@
+"""
+BM25 retrieval over an inverted index.
+Postings are stored per term and scored with MaxScore pruning so a query
+only touches the postings of its own terms.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+
+class BM25Index:
+    """Inverted index with precomputed BM25 impacts and MaxScore top-k search."""
+    
+    # Arrays written by to_arrays() and expected by from_arrays()
+    ARRAY_NAMES = ('terms', 'idf', 'offsets', 'doc_ids', 'impacts', 'max_impacts')
+    
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.terms = np.zeros(0, dtype=str)
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.analyzer = None
+        self.num_docs = 0
+        self.avg_doc_length = 0.0
+        
+        # Postings lists, concatenated: term t owns [offsets[t], offsets[t + 1])
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        self.impacts = np.zeros(0, dtype=np.float32)
+        self.max_impacts = np.zeros(0, dtype=np.float32)
+    
+    def build(self, texts: List[str], reference: Optional["BM25Index"] = None):
+        """
+        Build postings lists and BM25 impacts for texts.
+        
+        With a reference index, its vocabulary, IDF weights and average document
+        length are reused instead of being fitted on texts, so delta segments
+        stay comparable to the base. Words the reference has never seen are
+        added to the vocabulary, weighted by their document frequency in
+        texts, so new terms are searchable without refitting.
+        """
+        if reference is None:
+            counter = CountVectorizer(stop_words='english')
+            counts = counter.fit_transform(texts)
+            
+            # CountVectorizer numbers features in sorted term order
+            self.terms = counter.get_feature_names_out().astype(str)
+            self.num_docs = counts.shape[0]
+            doc_lengths = np.asarray(counts.sum(axis=1)).ravel().astype(np.float32)
+            self.avg_doc_length = float(doc_lengths.mean()) if self.num_docs else 0.0
+            
+            doc_freqs = np.asarray((counts > 0).sum(axis=0)).ravel()
+            self.idf = np.log1p((self.num_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        else:
+            analyzer = CountVectorizer(stop_words='english').build_analyzer()
+            tokenized = [analyzer(text) for text in texts]
+            words = np.unique(np.array([token for tokens in tokenized for token in tokens], dtype=str))
+            new_words = words[~_contains(reference.terms, words)]
+            
+            self.terms = reference.terms
+            self.num_docs = reference.num_docs
+            self.avg_doc_length = reference.avg_doc_length
+            self.idf = reference.idf
+            if len(new_words):
+                self.terms = np.union1d(reference.terms, new_words).astype(str)
+            
+            counter = CountVectorizer(stop_words='english', vocabulary=self.terms)
+            counts = counter.transform(texts)
+            
+            if len(new_words):
+                # Count the new documents too so the IDF of new words stays positive
+                new_ids = np.searchsorted(self.terms, new_words)
+                doc_freqs = np.asarray((counts[:, new_ids] > 0).sum(axis=0)).ravel()
+                num_docs = self.num_docs + len(texts)
+                self.idf = np.empty(len(self.terms), dtype=np.float32)
+                self.idf[np.searchsorted(self.terms, reference.terms)] = reference.idf
+                self.idf[new_ids] = np.log1p((num_docs - doc_freqs + 0.5) / (doc_freqs + 0.5))
+            
+            doc_lengths = np.array([len(tokens) for tokens in tokenized], dtype=np.float32)
+        
+        self.analyzer = counter.build_analyzer()
+        
+        # Column-major layout gives one doc-sorted postings list per term
+        postings = counts.tocsc()
+        postings.sort_indices()
+        self.offsets = postings.indptr.astype(np.int64)
+        self.doc_ids = postings.indices.astype(np.int32)
+        
+        tfs = postings.data.astype(np.float32)
+        norms = self.k1 * (1 - self.b + self.b * doc_lengths[self.doc_ids] / max(self.avg_doc_length, 1e-9))
+        term_ids = np.repeat(np.arange(len(self.terms)), np.diff(self.offsets))
+        self.impacts = (self.idf[term_ids] * tfs * (self.k1 + 1) / (tfs + norms)).astype(np.float32)
+        
+        self.max_impacts = np.zeros(len(self.terms), dtype=np.float32)
+        if len(self.impacts):
+            np.maximum.at(self.max_impacts, term_ids, self.impacts)
+    
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Get the index as plain arrays for on-disk storage."""
+        return {
+            'terms': self.terms,
+            'idf': self.idf,
+            'offsets': self.offsets,
+            'doc_ids': self.doc_ids,
+            'impacts': self.impacts,
+            'max_impacts': self.max_impacts
+        }
+    
+    def params(self) -> Dict:
+        """Get the scalar parameters that go with to_arrays()."""
+        return {
+            'k1': self.k1,
+            'b': self.b,
+            'num_docs': self.num_docs,
+            'avg_doc_length': self.avg_doc_length
+        }
+    
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], params: Dict) -> "BM25Index":
+        """Rebuild an index from to_arrays()/params() output (arrays may be memory-mapped)."""
+        index = cls(k1=params['k1'], b=params['b'])
+        index.num_docs = params['num_docs']
+        index.avg_doc_length = params['avg_doc_length']
+        index.terms = arrays['terms']
+        index.idf = arrays['idf']
+        index.offsets = arrays['offsets']
+        index.doc_ids = arrays['doc_ids']
+        index.impacts = arrays['impacts']
+        index.max_impacts = arrays['max_impacts']
+        index.analyzer = CountVectorizer(stop_words='english').build_analyzer()
+        return index
+    
+    def _query_terms(self, query: str) -> List[Tuple[int, float]]:
+        """Map a query to (term_id, query term frequency) pairs."""
+        tokens = self.analyzer(query)
+        if not tokens or not len(self.terms):
+            return []
+        
+        tokens, counts = np.unique(np.array(tokens, dtype=str), return_counts=True)
+        pos = np.minimum(np.searchsorted(self.terms, tokens), len(self.terms) - 1)
+        found = self.terms[pos] == tokens
+        return [(int(t), float(c)) for t, c in zip(pos[found], counts[found])]
+    
+    def _postings(
+        self,
+        term_id: int,
+        ranges: Optional[List[Tuple[int, int]]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Get (doc_ids, impacts) for a term.
+        
+        With ranges, only postings for docs in [start, end) row ranges are kept.
+        A single range is a zero-copy view since postings are sorted by doc id.
+        """
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        docs, impacts = self.doc_ids[start:end], self.impacts[start:end]
+        if ranges is None:
+            return docs, impacts
+        
+        slices = []
+        for lo, hi in ranges:
+            a, b = np.searchsorted(docs, [lo, hi])
+            slices.append((docs[a:b], impacts[a:b]))
+        if len(slices) == 1:
+            return slices[0]
+        return np.concatenate([d for d, _ in slices]), np.concatenate([i for _, i in slices])
+    
+    def term_bounds(self, query: str) -> Dict[str, float]:
+        """Highest score contribution of each query term found in the index, by term."""
+        if self.analyzer is None:
+            return {}
+        return {str(self.terms[t]): float(self.max_impacts[t] * w) for t, w in self._query_terms(query)}
+    
+    def upper_bound(self, query: str) -> float:
+        """Highest BM25 score any document could reach for query."""
+        return float(sum(self.term_bounds(query).values()))
+    
+    def search(
+        self,
+        query: str,
+        top_k: int = 3,
+        ranges: Optional[List[Tuple[int, int]]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the top-k documents for query with MaxScore pruning.
+        
+        Terms are visited in decreasing order of their maximum impact. Once the
+        remaining terms together cannot lift an unseen document above the current
+        k-th best score, they become non-essential: their postings are only probed
+        for existing candidates instead of being merged in full.
+        
+        Args:
+            query: User query
+            top_k: Number of documents to return
+            ranges: Optional sorted, non-overlapping doc id ranges to restrict the search to
+        
+        Returns:
+            (doc_ids, scores) sorted by descending score
+        """
+        empty = (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32))
+        if self.analyzer is None or top_k <= 0:
+            return empty
+        
+        terms = self._query_terms(query)
+        if not terms:
+            return empty
+        
+        terms.sort(key=lambda tw: self.max_impacts[tw[0]] * tw[1], reverse=True)
+        bounds = np.array([self.max_impacts[t] * w for t, w in terms], dtype=np.float64)
+        remaining = np.concatenate([np.cumsum(bounds[::-1])[::-1], [0.0]])
+        
+        cand_docs = np.zeros(0, dtype=np.int32)
+        cand_scores = np.zeros(0, dtype=np.float64)
+        
+        for i, (term_id, weight) in enumerate(terms):
+            threshold = _kth_largest(cand_scores, top_k)
+            if threshold is not None and remaining[i] <= threshold:
+                # Only existing candidates can still reach the top-k
+                keep = cand_scores + remaining[i] > threshold
+                cand_docs, cand_scores = cand_docs[keep], cand_scores[keep]
+                
+                for j in range(i, len(terms)):
+                    docs, impacts = self._postings(terms[j][0], ranges)
+                    if len(docs) and len(cand_docs):
+                        pos = np.minimum(np.searchsorted(docs, cand_docs), len(docs) - 1)
+                        hit = docs[pos] == cand_docs
+                        cand_scores[hit] += impacts[pos[hit]] * terms[j][1]
+                break
+            
+            # Essential term: merge its full postings list into the candidates
+            docs, impacts = self._postings(term_id, ranges)
+            merged_docs, inverse = np.unique(np.concatenate([cand_docs, docs]), return_inverse=True)
+            merged_scores = np.bincount(
+                inverse,
+                weights=np.concatenate([cand_scores, impacts * weight]),
+                minlength=len(merged_docs)
+            )
+            cand_docs, cand_scores = merged_docs.astype(np.int32), merged_scores
+        
+        k = min(top_k, len(cand_docs))
+        if k == 0:
+            return empty
+        
+        top = np.argpartition(-cand_scores, k - 1)[:k]
+        top = top[np.argsort(-cand_scores[top], kind='stable')]
+        return cand_docs[top], cand_scores[top].astype(np.float32)
+
+
+def _contains(terms: np.ndarray, words: np.ndarray) -> np.ndarray:
+    """Mask of the words present in a sorted terms array."""
+    if not len(terms):
+        return np.zeros(len(words), dtype=bool)
+    pos = np.minimum(np.searchsorted(terms, words), len(terms) - 1)
+    return terms[pos] == words
+
+
+def _kth_largest(values: np.ndarray, k: int) -> Optional[float]:
+    """Get the k-th largest value, or None if there are fewer than k values."""
+    if len(values) < k:
+        return None
+    return float(np.partition(values, len(values) - k)[len(values) - k])
@@ -0,0 +1,104 @@
+"""
+Batched SQLite writes for bulk ingestion.
+Rows are inserted with executemany in large transactions over one connection,
+instead of one connection, INSERT and commit (fsync) per row.
+"""
+
+import sqlite3
+from typing import Dict, List, Sequence
+from src.database import get_connection
+
+
+# Rows per transaction
+BULK_BATCH_SIZE = 1000
+
+# Connection settings for the load phase (per connection; the database file is unchanged).
+# synchronous=NORMAL skips the extra directory sync per commit; a crash can only
+# lose whole, not yet committed batches.
+LOAD_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA busy_timeout = 30000"
+)
+
+# kb_chunks columns written at ingest, in insert order
+KB_CHUNK_COLUMNS = (
+    "source_id", "title", "category", "text", "compressed_text",
+    "raw_words", "compressed_words", "original_tokens", "compressed_tokens",
+    "scaledown_latency_ms", "parent_title", "section", "chunk_index", "duplicate_count",
+    "source_key"
+)
+
+
+def kb_chunk_row(chunk: Dict) -> tuple:
+    """Get the KB_CHUNK_COLUMNS values of a chunk built by compress_and_store_documents."""
+    return (
+        chunk['source'], chunk['title'], chunk['category'],
+        chunk['original_text'], chunk['compressed_text'],
+        chunk['original_words'], chunk['compressed_words'],
+        chunk['original_tokens'], chunk['compressed_tokens'],
+        chunk['latency_ms'], chunk['parent_title'], chunk['section'],
+        chunk['chunk_index'], chunk['duplicate_count'],
+        chunk['source_key']
+    )
+
+
+class BulkWriter:
+    """
+    Context manager that inserts rows into one table in batches.
+    
+    Failure behavior: every flushed batch is one transaction, so a batch is
+    either fully written or not at all. If a batch fails to write it is
+    rolled back and the error is raised. If the caller's block raises, the
+    rows it had already added are still written before the error propagates.
+    """
+    
+    def __init__(self, table: str, columns: Sequence[str], batch_size: int = BULK_BATCH_SIZE):
+        self.sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        self.batch_size = max(1, batch_size)
+        self.pending: List[tuple] = []
+        self.rows_written = 0
+        self.conn = None
+    
+    def __enter__(self) -> "BulkWriter":
+        self.conn = get_connection()
+        for pragma in LOAD_PRAGMAS:
+            self.conn.execute(pragma)
+        return self
+    
+    def add(self, row: tuple):
+        """Queue one row, writing the batch once it is full."""
+        self.pending.append(row)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self):
+        """Write queued rows in one transaction."""
+        if not self.pending:
+            return
+        
+        rows, self.pending = self.pending, []
+        try:
+            self.conn.executemany(self.sql, rows)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        self.rows_written += len(rows)
+    
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            if exc_type is None:
+                self.flush()
+            else:
+                # Keep the caller's error; a failed final batch is rolled back
+                queued = len(self.pending)
+                try:
+                    self.flush()
+                except sqlite3.Error as flush_error:
+                    print(f"⚠️ Could not write {queued} queued rows: {flush_error}")
+        finally:
+            self.conn.close()
+            self.conn = None
+        return False
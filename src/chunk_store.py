@@ -0,0 +1,225 @@
+"""
+Columnar storage for indexed chunks.
+Chunk fields live in per-field arrays (interned strings, integer columns and one
+UTF-8 text buffer) instead of one dict per chunk; rows are exposed as
+lightweight read-only views. In lazy-text mode, text is not stored at all and
+is loaded by chunk id on demand.
+"""
+
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, List, Optional
+import numpy as np
+
+
+# Short, repetitive fields stored as ids into a per-field string table
+STRING_FIELDS = ("source_id", "title", "category", "parent_title", "section")
+
+# Integer fields (None is stored as INT_NONE)
+INT_FIELDS = ("id", "chunk_index")
+INT_NONE = np.iinfo(np.int64).min
+
+# Long fields stored back to back in one UTF-8 buffer
+TEXT_FIELDS = ("text", "compressed_text")
+
+# Rows loaded per text-loader call when iterating over a lazy-text store
+LAZY_ITER_BATCH = 500
+
+# Field order of a chunk
+FIELDS = ("id", "source_id", "title", "category", "text", "compressed_text", "parent_title", "section", "chunk_index")
+
+
+class ChunkStore:
+    """
+    Column-oriented, read-only sequence of chunks.
+    
+    With lazy_text, rows that have an id carry no text; text_loader (a callable
+    taking ids and returning id -> {'text', 'compressed_text'}) provides it.
+    """
+    
+    __slots__ = ("strings", "string_ids", "ints", "blob", "offsets", "num_rows", "lazy_text", "text_loader")
+    
+    def __init__(
+        self,
+        strings: Dict[str, List[str]],
+        string_ids: Dict[str, np.ndarray],
+        ints: Dict[str, np.ndarray],
+        blob,
+        offsets: np.ndarray,
+        lazy_text: bool = False,
+        text_loader: Optional[Callable] = None
+    ):
+        self.strings = strings
+        self.string_ids = string_ids
+        self.ints = ints
+        self.blob = blob
+        # Text field f of row i spans offsets[i * len(TEXT_FIELDS) + f] to the next offset
+        self.offsets = offsets
+        self.num_rows = len(offsets) // len(TEXT_FIELDS)
+        self.lazy_text = lazy_text
+        self.text_loader = text_loader
+    
+    @classmethod
+    def from_chunks(cls, chunks: Iterable, lazy_text: bool = False) -> "ChunkStore":
+        """
+        Build an in-memory store from chunk dicts (or views).
+        
+        With lazy_text, text is dropped for chunks that have an id.
+        """
+        tables = {field: {} for field in STRING_FIELDS}
+        string_ids = {field: [] for field in STRING_FIELDS}
+        ints = {field: [] for field in INT_FIELDS}
+        parts = []
+        offsets = [0]
+        
+        for chunk in chunks:
+            for field in STRING_FIELDS:
+                value = chunk.get(field)
+                if value is None:
+                    string_ids[field].append(-1)
+                else:
+                    string_ids[field].append(tables[field].setdefault(value, len(tables[field])))
+            for field in INT_FIELDS:
+                value = chunk.get(field)
+                ints[field].append(INT_NONE if value is None else int(value))
+            drop_text = lazy_text and chunk.get('id') is not None
+            for field in TEXT_FIELDS:
+                encoded = b"" if drop_text else (chunk.get(field) or "").encode('utf-8')
+                parts.append(encoded)
+                offsets.append(offsets[-1] + len(encoded))
+        
+        return cls(
+            strings={field: list(table) for field, table in tables.items()},
+            string_ids={field: np.array(ids, dtype=np.int32) for field, ids in string_ids.items()},
+            ints={field: np.array(values, dtype=np.int64) for field, values in ints.items()},
+            blob=b"".join(parts),
+            offsets=np.array(offsets, dtype=np.int64),
+            lazy_text=lazy_text
+        )
+    
+    def __len__(self) -> int:
+        return self.num_rows
+    
+    def __getitem__(self, row: int) -> "ChunkView":
+        if row < 0:
+            row += self.num_rows
+        if not 0 <= row < self.num_rows:
+            raise IndexError(row)
+        return ChunkView(self, row)
+    
+    def __iter__(self):
+        if not self.lazy_text:
+            for row in range(self.num_rows):
+                yield ChunkView(self, row)
+            return
+        
+        # Load text for a batch of rows at a time instead of one query per row
+        for start in range(0, self.num_rows, LAZY_ITER_BATCH):
+            views = [ChunkView(self, row) for row in range(start, min(start + LAZY_ITER_BATCH, self.num_rows))]
+            hydrate_views(views)
+            yield from views
+    
+    def value(self, row: int, field: str):
+        """Get one field of one row."""
+        if field in TEXT_FIELDS:
+            chunk_id = self.ints['id'].item(row)
+            if self.lazy_text and chunk_id != INT_NONE:
+                return self.text_loader([chunk_id])[chunk_id][field]
+            k = row * len(TEXT_FIELDS) + TEXT_FIELDS.index(field)
+            # item() avoids creating numpy scalars on this per-result path;
+            # slicing bytes or an mmap both give bytes
+            return self.blob[self.offsets.item(k):self.offsets.item(k + 1)].decode('utf-8')
+        if field in STRING_FIELDS:
+            string_id = self.string_ids[field].item(row)
+            return None if string_id < 0 else self.strings[field][string_id]
+        if field in INT_FIELDS:
+            value = self.ints[field].item(row)
+            return None if value == INT_NONE else value
+        raise KeyError(field)
+    
+    def column(self, field: str) -> List:
+        """Get one field for every row."""
+        if field in STRING_FIELDS:
+            table = self.strings[field]
+            return [None if i < 0 else table[i] for i in self.string_ids[field].tolist()]
+        if field in INT_FIELDS:
+            return [None if v == INT_NONE else v for v in self.ints[field].tolist()]
+        return [self.value(row, field) for row in range(len(self))]
+    
+    def nbytes(self) -> int:
+        """Approximate memory held by the store (text buffer, arrays and string tables)."""
+        total = len(self.blob) + self.offsets.nbytes
+        total += sum(ids.nbytes for ids in self.string_ids.values())
+        total += sum(values.nbytes for values in self.ints.values())
+        total += sum(len(s.encode('utf-8')) + 49 for table in self.strings.values() for s in table)
+        return total
+
+
+class ChunkView(Mapping):
+    """
+    Read-only view of one chunk in a ChunkStore, usable like a chunk dict.
+    
+    Fields are decoded on access. Views cannot be changed: with_values()
+    returns a new view carrying extra keys (such as 'score'), so annotating a
+    result never touches the store or a view held by someone else.
+    """
+    
+    __slots__ = ("store", "row", "extra")
+    
+    def __init__(self, store: ChunkStore, row: int, extra: Optional[Dict] = None):
+        self.store = store
+        self.row = row
+        self.extra = extra
+    
+    def __getitem__(self, key: str):
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        if key not in FIELDS:
+            raise KeyError(key)
+        return self.store.value(self.row, key)
+    
+    def __iter__(self):
+        yield from FIELDS
+        if self.extra:
+            yield from (key for key in self.extra if key not in FIELDS)
+    
+    def __len__(self) -> int:
+        return len(FIELDS) + sum(1 for key in (self.extra or ()) if key not in FIELDS)
+    
+    def with_values(self, values: Dict) -> "ChunkView":
+        """Get a new view of the same row with keys of values added or replaced."""
+        return ChunkView(self.store, self.row, {**self.extra, **values} if self.extra else dict(values))
+    
+    def copy(self) -> "ChunkView":
+        """Get a new view of the same row with its own extra keys."""
+        return ChunkView(self.store, self.row, dict(self.extra) if self.extra else None)
+    
+    def to_dict(self) -> Dict:
+        """Materialise the chunk as a plain dict."""
+        return dict(self)
+    
+    def __repr__(self) -> str:
+        return f"ChunkView({self.to_dict()!r})"
+
+
+def hydrate_views(chunks: Iterable):
+    """
+    Load text for lazy-text views with one text_loader call per store.
+    
+    Text is attached to the views in place, so call this before the views
+    are shared (e.g. before results are cached). Other chunks (dicts, views of stores holding text, views already
+    hydrated) are left as they are.
+    """
+    pending = {}
+    for chunk in chunks:
+        if not isinstance(chunk, ChunkView) or not chunk.store.lazy_text:
+            continue
+        if chunk.extra and 'text' in chunk.extra:
+            continue
+        chunk_id = chunk.store.ints['id'].item(chunk.row)
+        if chunk_id != INT_NONE:
+            pending.setdefault(id(chunk.store), (chunk.store, []))[1].append((chunk, chunk_id))
+    
+    for store, items in pending.values():
+        texts = store.text_loader([chunk_id for _, chunk_id in items])
+        for chunk, chunk_id in items:
+            chunk.extra = {**chunk.extra, **texts[chunk_id]} if chunk.extra else dict(texts[chunk_id])
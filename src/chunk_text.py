@@ -0,0 +1,94 @@
+"""
+On-demand loading of chunk text from SQLite.
+Lets the retrieval index keep only ids, vectors and facet metadata in memory;
+result text is fetched from kb_chunks by primary key, with a hot cache in front.
+"""
+
+import os
+from typing import Dict, List
+from src.database import get_connection
+from src.query_cache import QueryCache
+
+
+# Chunk texts kept in the hot cache
+TEXT_CACHE_SIZE = int(os.getenv("KB_TEXT_CACHE_SIZE", "2048"))
+
+# Ids per SELECT (SQLite caps the number of bound parameters)
+SQLITE_MAX_PARAMS = 900
+
+
+def fetch_chunk_texts(chunk_ids: List[int]) -> Dict[int, Dict]:
+    """
+    Fetch text and compressed_text for kb_chunks rows by id.
+    
+    Args:
+        chunk_ids: kb_chunks primary keys
+    
+    Returns:
+        Dict of id -> {'text', 'compressed_text'} for the ids that exist
+    """
+    texts = {}
+    if not chunk_ids:
+        return texts
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    for start in range(0, len(chunk_ids), SQLITE_MAX_PARAMS):
+        batch = chunk_ids[start:start + SQLITE_MAX_PARAMS]
+        cursor.execute(
+            f"SELECT id, text, compressed_text FROM kb_chunks WHERE id IN ({','.join('?' * len(batch))})",
+            batch
+        )
+        for row in cursor.fetchall():
+            texts[row['id']] = {'text': row['text'], 'compressed_text': row['compressed_text']}
+    conn.close()
+    
+    return texts
+
+
+class ChunkTextCache:
+    """LRU cache of chunk texts by kb_chunks id, filled by one batched query per miss set."""
+    
+    def __init__(self, max_entries: int = TEXT_CACHE_SIZE):
+        # kb_chunks ids are AUTOINCREMENT and never reused, so entries need no expiry
+        self.cache = QueryCache(max_entries, ttl_seconds=float('inf'))
+    
+    def get_many(self, chunk_ids: List[int]) -> Dict[int, Dict]:
+        """
+        Get texts for chunk ids, querying SQLite once for all cache misses.
+        
+        Ids no longer in kb_chunks (e.g. while a rebuild rewrites the table)
+        map to empty texts.
+        """
+        texts = {}
+        missing = []
+        for chunk_id in dict.fromkeys(chunk_ids):
+            cached = self.cache.get(chunk_id)
+            if cached is None:
+                missing.append(chunk_id)
+            else:
+                texts[chunk_id] = cached
+        
+        fetched = fetch_chunk_texts(missing)
+        for chunk_id in missing:
+            if chunk_id in fetched:
+                self.cache.put(chunk_id, fetched[chunk_id])
+            texts[chunk_id] = fetched.get(chunk_id, {'text': '', 'compressed_text': ''})
+        
+        return texts
+    
+    def stats(self) -> Dict:
+        """Get hot cache hit/miss counters."""
+        return self.cache.stats()
+
+
+# Global text cache instance
+_text_cache = None
+
+
+def get_text_cache() -> ChunkTextCache:
+    """Get global chunk text cache instance."""
+    global _text_cache
+    if _text_cache is None:
+        _text_cache = ChunkTextCache()
+    return _text_cache
@@ -0,0 +1,285 @@
+"""
+Headless KB command line.
+Ingests documents and tickets, builds the retrieval index and the chunk
+artifact, and checks the result, so deployments can pre-build the KB instead
+of the first web request building it.
+
+Usage:
+    python -m src.cli ingest-docs data/docs --workers 8
+    python -m src.cli ingest-tickets data/resolved_tickets.csv --batch-size 2000 --no-index
+    python -m src.cli build-index --index-format inline
+    python -m src.cli build-index --from-artifact storage/kb_chunks.jsonl.gz
+    python -m src.cli verify
+    python -m src.cli stats --json
+"""
+
+import os
+import sys
+import json
+import argparse
+from typing import List, Dict, Optional
+from src.database import get_connection, init_database
+from src import compression_cache, index_store
+from src.kb_artifact import ARTIFACT_PATH, build_index_from_artifact, iter_artifact, write_artifact
+from src.kb_pipeline import (
+    COMPRESSION_WORKERS, INGEST_BATCH_SIZE, get_kb_stats, ingest_documents, ingest_tickets_csv, iter_kb_chunks
+)
+from src.retriever import KBRetriever, LAZY_TEXT, RETRIEVAL_MODE, get_active_generation, load_chunks_from_db
+
+
+# --index-format choices: chunk text stored in the index files, or loaded from SQLite per result
+INDEX_FORMATS = ("inline", "lazy")
+
+
+def _print_progress(current, total, message):
+    print(f"   [{int(current / total * 100) if total else 0:3d}%] {message}")
+
+
+def _retriever(index_format: str) -> KBRetriever:
+    """Retriever that writes generations in the given index format."""
+    return KBRetriever(mode=RETRIEVAL_MODE, lazy_text=index_format == "lazy")
+
+
+def build_index(index_format: str, from_artifact: Optional[str] = None, artifact: Optional[str] = ARTIFACT_PATH) -> Dict:
+    """
+    Build and publish an index generation, from kb_chunks or from an artifact.
+    
+    Args:
+        index_format: One of INDEX_FORMATS
+        from_artifact: Build from this artifact instead of kb_chunks
+        artifact: Also export kb_chunks to this artifact path (not when
+            building from an artifact)
+    
+    Returns:
+        Dict with generation, chunks_count and artifact
+    """
+    retriever = _retriever(index_format)
+    if from_artifact:
+        generation = build_index_from_artifact(from_artifact, retriever)
+        active = get_active_generation()
+        return {"generation": generation, "chunks_count": active['chunks_count'] if generation else 0, "artifact": None}
+    
+    chunks = load_chunks_from_db()
+    generation = retriever.build_index(chunks)
+    written = write_artifact(iter_kb_chunks(), artifact) if artifact else None
+    return {"generation": generation, "chunks_count": len(chunks), "artifact": artifact if written is not None else None}
+
+
+def verify_kb(artifact: Optional[str] = None) -> Dict:
+    """
+    Check that the KB tables, the active index generation and the artifact agree.
+    
+    Returns:
+        Dict with ok (no errors), errors and warnings (lists of messages)
+    """
+    errors = []
+    warnings = []
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM kb_chunks")
+    chunk_ids = {row['id'] for row in cursor.fetchall()}
+    cursor.execute("SELECT COUNT(*) FROM kb_sources")
+    sources_count = cursor.fetchone()[0]
+    cursor.execute("SELECT attempts, started_at FROM kb_rebuild_state WHERE id = 1")
+    rebuild_state = cursor.fetchone()
+    conn.close()
+    
+    if not chunk_ids:
+        errors.append("kb_chunks is empty")
+    if not sources_count:
+        warnings.append("kb_sources is empty; incremental syncs will re-ingest every source")
+    if rebuild_state:
+        warnings.append(
+            f"An unfinished rebuild is staged (attempt {rebuild_state['attempts']}, "
+            f"started {rebuild_state['started_at']}); the next rebuild resumes it"
+        )
+    
+    active = get_active_generation()
+    index = index_store.load_index(active['path']) if active else None
+    if active is None:
+        errors.append("No active index generation")
+    elif index is None:
+        errors.append(f"Index generation {active['generation']} at {active['path']} is missing or in an old format")
+    else:
+        index_ids = [chunk_id for chunk_id in index['chunks'].column('id') if chunk_id is not None]
+        missing = set(index_ids) - chunk_ids
+        unindexed = chunk_ids - set(index_ids)
+        if len(index_ids) != len(set(index_ids)):
+            errors.append("Index generation contains duplicate chunk ids")
+        if missing:
+            message = f"{len(missing)} indexed chunks are not in kb_chunks (e.g. id {min(missing)})"
+            # Inline indexes carry their own text, so they still serve results
+            (errors if index['chunks'].lazy_text else warnings).append(message)
+        if unindexed:
+            errors.append(f"{len(unindexed)} kb_chunks rows are not indexed (e.g. id {min(unindexed)})")
+    
+    artifact = artifact or ARTIFACT_PATH
+    if os.path.exists(artifact):
+        try:
+            artifact_ids = {record.get('id') for record in iter_artifact(artifact)}
+            if artifact_ids != chunk_ids:
+                warnings.append(f"{artifact} is out of date with kb_chunks (run build-index to re-export it)")
+        except (ValueError, OSError, EOFError) as e:
+            errors.append(f"{artifact} is unreadable: {e}")
+    else:
+        warnings.append(f"No artifact at {artifact}")
+    
+    return {"ok": not errors, "errors": errors, "warnings": warnings}
+
+
+def kb_stats() -> Dict:
+    """Collect KB, index, compression cache and job statistics."""
+    stats = get_kb_stats()
+    stats.pop('categories', None)
+    active = get_active_generation()
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT status, COUNT(*) AS count FROM kb_jobs GROUP BY status")
+    jobs = {row['status']: row['count'] for row in cursor.fetchall()}
+    cursor.execute("SELECT COUNT(*) FROM kb_sources")
+    sources_count = cursor.fetchone()[0]
+    conn.close()
+    
+    manifest = index_store.read_manifest(active['path']) if active else None
+    return {
+        "kb": stats,
+        "sources": sources_count,
+        "index": {
+            "generation": active['generation'] if active else None,
+            "chunks_count": active['chunks_count'] if active else 0,
+            "path": active['path'] if active else None,
+            "format": ("lazy" if manifest.get('lazy_text') else "inline") if manifest else None
+        },
+        "compression_cache": compression_cache.get_cache_stats(),
+        "jobs": jobs
+    }
+
+
+def _print_ingest(result: Dict) -> int:
+    if not result['success']:
+        print(f"❌ Ingest failed: {result['error']}")
+        return 1
+    
+    cache = result['compression_cache']
+    print(
+        f"✅ Ingested {result['documents_count']:,} sources ({result['unchanged']:,} unchanged): "
+        f"+{result['chunks_count']:,} / -{result['chunks_removed']:,} chunks, "
+        f"{result['duplicates_removed']:,} near-duplicates merged, {result['rows_per_second']:,.0f} rows/s"
+    )
+    if cache['skipped']:
+        print(f"   Compression skipped for {cache['skipped']:,} chunks; a run with compression compresses them")
+    else:
+        print(f"   Compression cache: {cache['hits']:,} hits, {cache['misses']:,} misses ({cache['hit_rate']:.0%})")
+    for error in result['errors']:
+        print(f"⚠️  {error}")
+    return 0
+
+
+def _build_and_report(args) -> int:
+    result = build_index(args.index_format, getattr(args, 'from_artifact', None), args.artifact)
+    if result['generation'] is None:
+        print("❌ No chunks to index")
+        return 1
+    print(f"✅ Published index generation {result['generation']} ({result['chunks_count']:,} chunks, {args.index_format})")
+    if result['artifact']:
+        print(f"✅ Artifact written to {result['artifact']}")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point; returns the exit code."""
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="Build and inspect the helpdesk knowledge base.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    index_options = argparse.ArgumentParser(add_help=False)
+    index_options.add_argument(
+        "--index-format", choices=INDEX_FORMATS, default="lazy" if LAZY_TEXT else "inline",
+        help="inline: chunk text in the index files (self-contained); lazy: text loaded from SQLite per result"
+    )
+    index_options.add_argument("--artifact", default=ARTIFACT_PATH, help="Chunk artifact to export (.jsonl, .gz, .bz2, .xz)")
+    
+    ingest_options = argparse.ArgumentParser(add_help=False, parents=[index_options])
+    ingest_options.add_argument("--workers", type=int, default=COMPRESSION_WORKERS, help="Concurrent ScaleDown requests")
+    ingest_options.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Source documents per ingest batch")
+    ingest_options.add_argument("--skip-compression", action="store_true", help="Store chunks uncompressed, without calling ScaleDown")
+    ingest_options.add_argument("--no-index", action="store_true", help="Only ingest; build the index later with build-index")
+    ingest_options.add_argument("--quiet", action="store_true", help="Do not print progress")
+    
+    docs = subparsers.add_parser("ingest-docs", parents=[ingest_options], help="Ingest .md/.txt documents (new and changed ones)")
+    docs.add_argument("paths", nargs="*", default=["data/docs"], help="Files or directories (default: data/docs)")
+    
+    tickets = subparsers.add_parser("ingest-tickets", parents=[ingest_options], help="Stream a resolved tickets CSV into the KB")
+    tickets.add_argument("csv_path", nargs="?", default="data/resolved_tickets.csv")
+    
+    build = subparsers.add_parser("build-index", parents=[index_options], help="Build and publish the retrieval index and artifact")
+    build.add_argument("--from-artifact", help="Build from this artifact instead of kb_chunks (no SQLite reads or ScaleDown calls)")
+    
+    verify = subparsers.add_parser("verify", help="Check the KB tables, active index and artifact agree")
+    verify.add_argument("--artifact", help=f"Artifact to check (default: {ARTIFACT_PATH})")
+    
+    stats = subparsers.add_parser("stats", help="Print KB, index, cache and job statistics")
+    stats.add_argument("--json", action="store_true", help="Print as JSON")
+    
+    args = parser.parse_args(argv)
+    init_database()
+    
+    if args.command in ("ingest-docs", "ingest-tickets"):
+        options = dict(
+            batch_size=args.batch_size,
+            progress_callback=None if args.quiet else _print_progress,
+            compression_workers=args.workers,
+            skip_compression=args.skip_compression,
+            update_index=False
+        )
+        if args.command == "ingest-docs":
+            result = ingest_documents(args.paths, **options)
+        else:
+            if not os.path.exists(args.csv_path):
+                print(f"❌ {args.csv_path} not found")
+                return 1
+            result = ingest_tickets_csv(args.csv_path, **options)
+        
+        status = _print_ingest(result)
+        if status or args.no_index:
+            return status
+        return _build_and_report(args)
+    
+    if args.command == "build-index":
+        return _build_and_report(args)
+    
+    if args.command == "verify":
+        result = verify_kb(args.artifact)
+        for warning in result['warnings']:
+            print(f"⚠️  {warning}")
+        for error in result['errors']:
+            print(f"❌ {error}")
+        if result['ok']:
+            print("✅ KB verified")
+        return 0 if result['ok'] else 1
+    
+    if args.command == "stats":
+        result = kb_stats()
+        if args.json:
+            print(json.dumps(result, indent=2, default=str))
+            return 0
+        
+        kb = result['kb']
+        index = result['index']
+        cache = result['compression_cache']
+        print(f"📚 Chunks: {kb['total_chunks'] or 0:,} from {result['sources']:,} sources, {kb['total_categories'] or 0} categories")
+        print(f"🧬 Near-duplicates merged: {kb.get('total_duplicates') or 0:,}")
+        if index['generation'] is not None:
+            print(f"🗂️  Index: generation {index['generation']} ({index['chunks_count']:,} chunks, {index['format']}) at {index['path']}")
+        else:
+            print("🗂️  Index: none")
+        print(f"♻️  Compression cache: {json.dumps(cache, default=str)}")
+        print(f"🛠️  Jobs: {', '.join(f'{count} {status}' for status, count in result['jobs'].items()) or 'none'}")
+        return 0
+    
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
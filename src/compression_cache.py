@@ -0,0 +1,123 @@
+"""
+Persistent, content-addressed cache of ScaleDown compression results.
+Entries are keyed by a hash of the text, target model and compressor version,
+so rebuilds only send new or changed documents to ScaleDown.
+"""
+
+import os
+import hashlib
+from typing import Dict, List
+from src.database import get_connection
+
+
+# Bump when compression output changes (API endpoint, parameters) to invalidate old entries
+COMPRESSOR_VERSION = "scaledown-raw-v1"
+
+# Entries kept; the least recently used are evicted beyond this
+COMPRESSION_CACHE_MAX_ENTRIES = int(os.getenv("KB_COMPRESSION_CACHE_SIZE", "50000"))
+
+# Keys per SELECT (SQLite caps the number of bound parameters)
+SQLITE_MAX_PARAMS = 900
+
+RESULT_FIELDS = ("compressed_text", "original_tokens", "compressed_tokens", "original_words", "compressed_words")
+
+
+def cache_key(text: str, target_model: str) -> str:
+    """Content address of a compression request."""
+    digest = hashlib.sha256()
+    for part in (COMPRESSOR_VERSION, target_model, text):
+        digest.update(part.encode('utf-8'))
+        # Separator keeps ("ab", "c") and ("a", "bc") apart
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def get_cached(keys: List[str]) -> Dict[str, Dict]:
+    """
+    Look up cached compression results and mark them as recently used.
+    
+    Args:
+        keys: Cache keys from cache_key()
+    
+    Returns:
+        Dict of key -> compress_text-style result (latency 0) for the keys found
+    """
+    results = {}
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return results
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    for start in range(0, len(keys), SQLITE_MAX_PARAMS):
+        batch = keys[start:start + SQLITE_MAX_PARAMS]
+        placeholders = ','.join('?' * len(batch))
+        cursor.execute(
+            f"SELECT cache_key, {', '.join(RESULT_FIELDS)} FROM compression_cache WHERE cache_key IN ({placeholders})",
+            batch
+        )
+        for row in cursor.fetchall():
+            result = {field: row[field] for field in RESULT_FIELDS}
+            result.update({
+                "compression_ratio": row['original_tokens'] / max(row['compressed_tokens'], 1),
+                "latency_ms": 0,
+                "success": True,
+                "error": None,
+                "cached": True
+            })
+            results[row['cache_key']] = result
+        cursor.execute(
+            f"UPDATE compression_cache SET last_used_at = CURRENT_TIMESTAMP WHERE cache_key IN ({placeholders})",
+            batch
+        )
+    conn.commit()
+    conn.close()
+    
+    return results
+
+
+def store(entries: Dict[str, Dict], target_model: str, max_entries: int = COMPRESSION_CACHE_MAX_ENTRIES):
+    """
+    Store successful compression results, then evict least recently used entries.
+    
+    Args:
+        entries: Dict of cache key -> compress_text result
+        target_model: Model the texts were compressed for
+        max_entries: Maximum entries kept in the cache
+    """
+    rows = [
+        (key, target_model) + tuple(result[field] for field in RESULT_FIELDS)
+        for key, result in entries.items()
+        if result.get('success')
+    ]
+    if not rows:
+        return
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.executemany(f"""
+        INSERT OR REPLACE INTO compression_cache (cache_key, target_model, {', '.join(RESULT_FIELDS)})
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    cursor.execute("""
+        DELETE FROM compression_cache WHERE cache_key IN (
+            SELECT cache_key FROM compression_cache
+            ORDER BY last_used_at DESC, rowid DESC
+            LIMIT -1 OFFSET ?
+        )
+    """, (max(max_entries, 0),))
+    conn.commit()
+    conn.close()
+
+
+def get_cache_stats() -> Dict:
+    """Get number of cached entries and their total compressed size."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT COUNT(*) as entries, COALESCE(SUM(LENGTH(compressed_text)), 0) as compressed_bytes
+        FROM compression_cache
+    """)
+    stats = dict(cursor.fetchone())
+    conn.close()
+    return stats
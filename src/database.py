@@ -18,28 +18,110 @@ def get_connection():
     return conn
 
 
+def _ensure_columns(cursor, table: str, columns: dict):
+    """Add columns missing from an existing table (lightweight migration)."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, ddl in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+
+
 def init_database():
     """Initialize database schema."""
     conn = get_connection()
     cursor = conn.cursor()
     
-    # KB Chunks table - stores compressed knowledge base
+    # KB Chunks table - stores compressed knowledge base.
+    # Rebuilds write to kb_chunks_staging (same schema) and swap it in when complete.
+    for table in ("kb_chunks", "kb_chunks_staging"):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source_id TEXT NOT NULL,
+                title TEXT NOT NULL,
+                category TEXT NOT NULL,
+                text TEXT NOT NULL,
+                compressed_text TEXT NOT NULL,
+                raw_words INTEGER NOT NULL,
+                compressed_words INTEGER NOT NULL,
+                original_tokens INTEGER NOT NULL,
+                compressed_tokens INTEGER NOT NULL,
+                scaledown_latency_ms REAL NOT NULL,
+                parent_title TEXT,
+                section TEXT,
+                chunk_index INTEGER DEFAULT 0,
+                duplicate_count INTEGER DEFAULT 0,
+                source_key TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        _ensure_columns(cursor, table, {
+            "parent_title": "TEXT",
+            "section": "TEXT",
+            "chunk_index": "INTEGER DEFAULT 0",
+            "duplicate_count": "INTEGER DEFAULT 0",
+            "source_key": "TEXT"
+        })
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_source_key ON {table} (source_key)")
+    
+    # KB sources - content fingerprint of each source document for incremental sync.
+    # kb_sources_staging doubles as the per-source checkpoint of a running rebuild.
+    for table in ("kb_sources", "kb_sources_staging"):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                source_key TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    
+    # Near-duplicate clusters spanning sources: source_key had chunks merged into chunks
+    # of canonical_key, so it is re-ingested when canonical_key changes or is deleted
+    for table in ("kb_duplicate_sources", "kb_duplicate_sources_staging"):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                source_key TEXT NOT NULL,
+                canonical_key TEXT NOT NULL,
+                PRIMARY KEY (source_key, canonical_key)
+            )
+        """)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_canonical_key ON {table} (canonical_key)")
+    
+    # Settings and start time of an unfinished (resumable) rebuild
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS kb_rebuild_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            settings TEXT NOT NULL,
+            attempts INTEGER DEFAULT 1,
+            started_at TEXT NOT NULL
+        )
+    """)
+    
+    # Background KB jobs (rebuilds) with progress written by the worker
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS kb_chunks (
+        CREATE TABLE IF NOT EXISTS kb_jobs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            source_id TEXT NOT NULL,
-            title TEXT NOT NULL,
-            category TEXT NOT NULL,
-            text TEXT NOT NULL,
-            compressed_text TEXT NOT NULL,
-            raw_words INTEGER NOT NULL,
-            compressed_words INTEGER NOT NULL,
-            original_tokens INTEGER NOT NULL,
-            compressed_tokens INTEGER NOT NULL,
-            scaledown_latency_ms REAL NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            status TEXT DEFAULT 'queued',
+            requests INTEGER DEFAULT 1,
+            attempts INTEGER DEFAULT 0,
+            worker TEXT,
+            progress REAL DEFAULT 0,
+            message TEXT,
+            rows_done INTEGER DEFAULT 0,
+            rows_per_second REAL,
+            eta_seconds REAL,
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            heartbeat_at TIMESTAMP,
+            finished_at TIMESTAMP
         )
     """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_kb_jobs_status ON kb_jobs (status, id)")
     
     # Tickets table
     cursor.execute("""
@@ -108,19 +190,59 @@ def init_database():
         )
     """)
     
+    # Index generations - one row per published retrieval index build
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS index_generations (
+            generation INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT NOT NULL,
+            chunks_count INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'building',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Compression cache - ScaleDown results keyed by hash of (text, model, compressor version)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS compression_cache (
+            cache_key TEXT PRIMARY KEY,
+            target_model TEXT NOT NULL,
+            compressed_text TEXT NOT NULL,
+            original_tokens INTEGER NOT NULL,
+            compressed_tokens INTEGER NOT NULL,
+            original_words INTEGER NOT NULL,
+            compressed_words INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_compression_cache_last_used ON compression_cache (last_used_at)"
+    )
+    
     conn.commit()
     conn.close()
     print(f"✅ Database initialized at {DB_PATH}")
 
 
 def clear_kb():
-    """Clear all KB chunks."""
+    """
+    Clear all KB chunks, source fingerprints and any staged rebuild.
+    
+    The active index generation is retired in the same transaction, so
+    running retrievers stop serving the cleared chunks and the next sync
+    re-ingests every source.
+    """
     conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute("DELETE FROM kb_chunks")
+    for table in (
+        "kb_chunks", "kb_chunks_staging", "kb_sources", "kb_sources_staging",
+        "kb_duplicate_sources", "kb_duplicate_sources_staging", "kb_rebuild_state"
+    ):
+        cursor.execute(f"DELETE FROM {table}")
+    cursor.execute("UPDATE index_generations SET status = 'retired' WHERE status = 'active'")
     conn.commit()
     conn.close()
-    print("✅ KB chunks cleared")
+    print("✅ KB cleared")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,190 @@
+"""
+Near-duplicate detection with MinHash signatures and LSH banding.
+Used at ingest so near-identical tickets and sections become one KB chunk.
+"""
+
+import re
+import zlib
+from collections import OrderedDict
+from typing import List
+import numpy as np
+
+
+# Jaccard similarity of word shingles above which two texts are near-duplicates
+DUPLICATE_THRESHOLD = 0.8
+
+# Signature length and LSH banding (bands * rows == NUM_PERMUTATIONS).
+# 16 bands of 8 rows make pairs above ~0.7 similarity likely to share a bucket.
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 16
+
+SHINGLE_WORDS = 3
+
+# Canonical texts remembered when deduplicating a stream (~0.5 KB each)
+DEDUPE_WINDOW = 20000
+
+# Universal hashing modulo a Mersenne prime keeps products within 64 bits
+_MERSENNE_PRIME = (1 << 31) - 1
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> set:
+    """Get the set of lowercase word n-grams of text (single words for very short texts)."""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < size:
+        return set(words)
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash_signatures(texts: List[str], num_permutations: int = NUM_PERMUTATIONS, seed: int = 0) -> np.ndarray:
+    """
+    Compute MinHash signatures.
+    
+    Returns:
+        Array of shape (len(texts), num_permutations); the fraction of equal
+        columns of two rows estimates the Jaccard similarity of their shingles
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _MERSENNE_PRIME, size=num_permutations, dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE_PRIME, size=num_permutations, dtype=np.uint64)
+    
+    signatures = np.full((len(texts), num_permutations), _MERSENNE_PRIME, dtype=np.uint64)
+    for i, text in enumerate(texts):
+        # crc32 is stable across processes, unlike hash()
+        hashed = np.array([zlib.crc32(s.encode('utf-8')) for s in shingles(text)], dtype=np.uint64)
+        if len(hashed):
+            hashed %= _MERSENNE_PRIME
+            signatures[i] = ((hashed[:, None] * a + b) % _MERSENNE_PRIME).min(axis=0)
+    
+    return signatures
+
+
+def find_near_duplicates(
+    texts: List[str],
+    threshold: float = DUPLICATE_THRESHOLD,
+    num_permutations: int = NUM_PERMUTATIONS,
+    bands: int = LSH_BANDS
+) -> List[int]:
+    """
+    Cluster near-duplicate texts.
+    
+    Candidate pairs come from LSH banding (texts sharing any band of their
+    signature) and are kept if their estimated Jaccard similarity reaches the
+    threshold. Clusters are the connected components of the kept pairs.
+    
+    Args:
+        texts: Texts to compare
+        threshold: Minimum estimated Jaccard similarity of duplicates
+        num_permutations: MinHash signature length
+        bands: LSH bands (must divide num_permutations)
+    
+    Returns:
+        For each text, the index of its cluster's canonical (first) text
+    """
+    signatures = minhash_signatures(texts, num_permutations)
+    rows = num_permutations // bands
+    
+    # Union-find over text indices; the smallest index is always the root
+    parent = list(range(len(texts)))
+    
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    for band in range(bands):
+        buckets = {}
+        for i, key in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+            buckets.setdefault(key.tobytes(), []).append(i)
+        
+        for members in buckets.values():
+            first = members[0]
+            for other in members[1:]:
+                root_first, root_other = find(first), find(other)
+                if root_first == root_other:
+                    continue
+                if np.mean(signatures[first] == signatures[other]) >= threshold:
+                    parent[max(root_first, root_other)] = min(root_first, root_other)
+    
+    return [find(i) for i in range(len(texts))]
+
+
+class NearDuplicateIndex:
+    """
+    Streaming near-duplicate lookup over a bounded window of canonical texts.
+    
+    Texts are added batch by batch; each is either matched to a canonical text
+    seen before (estimated Jaccard similarity >= threshold) or becomes a new
+    canonical text. Only the most recent `capacity` canonical signatures are
+    kept, so memory stays flat however many texts are streamed through.
+    """
+    
+    def __init__(
+        self,
+        capacity: int = DEDUPE_WINDOW,
+        threshold: float = DUPLICATE_THRESHOLD,
+        num_permutations: int = NUM_PERMUTATIONS,
+        bands: int = LSH_BANDS
+    ):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.num_permutations = num_permutations
+        self.bands = bands
+        self.rows = num_permutations // bands
+        # Canonical key -> signature, oldest first
+        self.signatures = OrderedDict()
+        # (band, band bytes) -> canonical keys
+        self.buckets = {}
+    
+    def _band_keys(self, signature: np.ndarray) -> List[tuple]:
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+    
+    def add_many(self, keys: List, texts: List[str]) -> List:
+        """
+        Match texts against the window and add the new canonical ones.
+        
+        Args:
+            keys: Hashable key per text (used to refer to canonical texts)
+            texts: Texts to match
+        
+        Returns:
+            For each text, the key of the canonical text it duplicates, or None
+            if it is a new canonical text
+        """
+        # Values are below 2**31, so uint32 halves the window's memory
+        signatures = minhash_signatures(texts, self.num_permutations).astype(np.uint32)
+        matches = []
+        
+        for key, signature in zip(keys, signatures):
+            band_keys = self._band_keys(signature)
+            match = None
+            for band_key in band_keys:
+                for candidate in self.buckets.get(band_key, ()):
+                    if np.mean(self.signatures[candidate] == signature) >= self.threshold:
+                        match = candidate
+                        break
+                if match is not None:
+                    break
+            matches.append(match)
+            
+            if match is None:
+                self.signatures[key] = signature
+                for band_key in band_keys:
+                    self.buckets.setdefault(band_key, []).append(key)
+                if len(self.signatures) > self.capacity:
+                    self._evict_oldest()
+        
+        return matches
+    
+    def _evict_oldest(self):
+        key, signature = self.signatures.popitem(last=False)
+        for band_key in self._band_keys(signature):
+            members = self.buckets[band_key]
+            members.remove(key)
+            if not members:
+                del self.buckets[band_key]
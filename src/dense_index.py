@@ -0,0 +1,180 @@
+"""
+Dense LSA retrieval with a random-projection LSH index.
+TF-IDF rows are projected to a small float32 space with TruncatedSVD, which
+matches paraphrases sharing related terms; LSH buckets keep search sub-linear.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.decomposition import TruncatedSVD
+
+
+# LSA dimensions (capped by vocabulary and corpus size)
+DENSE_COMPONENTS = 128
+
+# Segments up to this size are scanned exactly instead of through LSH
+EXACT_SEARCH_MAX_ROWS = 4096
+
+# LSH layout: independent hash tables and target rows per bucket
+LSH_TABLES = 8
+LSH_BUCKET_SIZE = 32
+
+
+class DenseIndex:
+    """LSA vectors with random-hyperplane LSH tables and exact re-ranking."""
+    
+    # Arrays written by to_arrays() and expected by from_arrays()
+    ARRAY_NAMES = ('components', 'vectors', 'planes', 'codes', 'rows')
+    
+    def __init__(self):
+        self.components = np.zeros((0, 0), dtype=np.float32)
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        
+        # LSH: planes is (tables, bits, dims); codes[t] holds each row's bucket
+        # code in table t sorted ascending, rows[t] the matching row numbers
+        self.planes = np.zeros((0, 0, 0), dtype=np.float32)
+        self.codes = np.zeros((0, 0), dtype=np.int64)
+        self.rows = np.zeros((0, 0), dtype=np.int32)
+    
+    def build(self, tfidf_matrix: csr_matrix, reference: Optional["DenseIndex"] = None, seed: int = 0):
+        """
+        Fit LSA on a TF-IDF matrix and hash the resulting vectors.
+        
+        With a reference index, its SVD components and hyperplanes are reused,
+        so delta segments share the base segment's vector space and buckets.
+        """
+        num_docs, num_features = tfidf_matrix.shape
+        
+        if reference is None:
+            dims = min(DENSE_COMPONENTS, num_features - 1, num_docs - 1)
+            if dims >= 1:
+                svd = TruncatedSVD(n_components=dims, random_state=seed)
+                svd.fit(tfidf_matrix)
+                self.components = svd.components_.astype(np.float32)
+            else:
+                self.components = np.zeros((0, num_features), dtype=np.float32)
+            
+            # About LSH_BUCKET_SIZE rows per bucket
+            bits = int(np.clip(np.round(np.log2(max(num_docs, 1) / LSH_BUCKET_SIZE)), 1, 30))
+            rng = np.random.default_rng(seed)
+            self.planes = rng.standard_normal((LSH_TABLES, bits, len(self.components))).astype(np.float32)
+        else:
+            self.components = reference.components
+            self.planes = reference.planes
+        
+        self.vectors = self.project(tfidf_matrix)
+        
+        codes = self._hash(self.vectors)
+        order = np.argsort(codes, axis=1, kind='stable')
+        self.codes = np.take_along_axis(codes, order, axis=1)
+        self.rows = order.astype(np.int32)
+    
+    def expanded(self, columns: np.ndarray, num_features: int) -> "DenseIndex":
+        """
+        Get an unbuilt index sharing these hyperplanes, with the SVD components
+        spread over a larger vocabulary (columns[j] is the new column of
+        feature j). Added features get zero weight, so vectors do not change.
+        """
+        index = DenseIndex()
+        index.components = np.zeros((len(self.components), num_features), dtype=np.float32)
+        index.components[:, columns] = self.components
+        index.planes = self.planes
+        return index
+    
+    def project(self, tfidf_rows: csr_matrix) -> np.ndarray:
+        """Project TF-IDF rows to L2-normalised float32 LSA vectors."""
+        vectors = np.asarray(tfidf_rows @ self.components.T, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+    
+    def _hash(self, vectors: np.ndarray) -> np.ndarray:
+        """Bucket code of each vector in each table, shape (tables, len(vectors))."""
+        bits = self.planes.shape[1]
+        signs = np.einsum('tbd,nd->tnb', self.planes, vectors) > 0
+        return signs.astype(np.int64) @ (1 << np.arange(bits, dtype=np.int64))
+    
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Get the index as plain arrays for on-disk storage."""
+        return {name: getattr(self, name) for name in self.ARRAY_NAMES}
+    
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "DenseIndex":
+        """Rebuild an index from to_arrays() output (arrays may be memory-mapped)."""
+        index = cls()
+        for name in cls.ARRAY_NAMES:
+            setattr(index, name, arrays[name])
+        return index
+    
+    def _candidates(self, vector: np.ndarray) -> np.ndarray:
+        """Rows sharing a bucket with vector, or one bit away, in any table."""
+        bits = self.planes.shape[1]
+        codes = self._hash(vector[None, :])[:, 0]
+        
+        found = []
+        for t, code in enumerate(codes):
+            # Multi-probe: the query's bucket plus every bucket one bit flip away
+            probes = np.concatenate([[code], code ^ (1 << np.arange(bits, dtype=np.int64))])
+            lo = np.searchsorted(self.codes[t], probes, side='left')
+            hi = np.searchsorted(self.codes[t], probes, side='right')
+            found.extend(self.rows[t][a:b] for a, b in zip(lo, hi) if b > a)
+        
+        return np.unique(np.concatenate(found)) if found else np.zeros(0, dtype=np.int32)
+    
+    def search(
+        self,
+        vector: np.ndarray,
+        top_k: int = 3,
+        ranges: Optional[List[Tuple[int, int]]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the top-k rows by cosine similarity to a projected query vector.
+        
+        Large segments only re-rank LSH candidates. Small segments, and searches
+        where the candidates cannot fill top_k, are scanned exactly.
+        
+        Args:
+            vector: Query vector from project()
+            top_k: Number of rows to return
+            ranges: Optional [start, end) row ranges to restrict the search to
+        
+        Returns:
+            (rows, similarities) sorted by descending similarity
+        """
+        empty = (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32))
+        num_rows = len(self.vectors)
+        if top_k <= 0 or not num_rows or not self.vectors.shape[1] or not vector.any():
+            return empty
+        
+        if ranges is None:
+            allowed = num_rows
+        else:
+            allowed = sum(end - start for start, end in ranges)
+        
+        candidates = None
+        if num_rows > EXACT_SEARCH_MAX_ROWS:
+            candidates = self._candidates(vector)
+            if ranges is not None:
+                keep = np.zeros(len(candidates), dtype=bool)
+                for start, end in ranges:
+                    keep |= (candidates >= start) & (candidates < end)
+                candidates = candidates[keep]
+            if len(candidates) < min(top_k, allowed):
+                candidates = None
+        
+        if candidates is None:
+            if ranges is None:
+                candidates = np.arange(num_rows, dtype=np.int32)
+            else:
+                candidates = np.concatenate(
+                    [np.arange(start, end, dtype=np.int32) for start, end in ranges] or [np.zeros(0, dtype=np.int32)]
+                )
+        
+        if not len(candidates):
+            return empty
+        
+        scores = self.vectors[candidates] @ vector
+        k = min(top_k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return candidates[top].astype(np.int32), scores[top].astype(np.float32)
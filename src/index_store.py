@@ -0,0 +1,280 @@
+"""
+Pickle-free on-disk format for the KB retrieval index.
+Arrays are raw .npy files opened with memory mapping, so several processes
+can share one page-cached copy of the index and start almost instantly.
+
+Layout of an index directory (format version 4):
+    manifest.json          format version, vectorizer/BM25 parameters, category ranges
+    tfidf_indptr.npy       CSR row pointers of the TF-IDF matrix
+    tfidf_indices.npy      CSR column indices
+    tfidf_data.npy         CSR values
+    tfidf_terms.npy        sorted vocabulary (position = column id)
+    tfidf_idf.npy          IDF weight per column
+    bm25_*.npy             BM25 postings (see BM25Index.to_arrays)
+    dense_*.npy            LSA vectors and LSH tables (see DenseIndex.to_arrays)
+    chunk_text.bin         UTF-8 text and compressed_text of every chunk, back to back
+                           (only chunks without an id for lazy-text indexes)
+    chunk_offsets.npy      byte offsets into chunk_text.bin, two fields per chunk
+    chunk_strings.json     interned string table per string field (category, title, ...)
+    chunk_<field>.npy      per-chunk ids into those tables, and integer fields (id, chunk_index)
+"""
+
+import os
+import json
+import mmap
+from typing import Dict, List, Optional
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from src.bm25_index import BM25Index
+from src.dense_index import DenseIndex
+from src.chunk_store import ChunkStore, STRING_FIELDS, INT_FIELDS
+
+
+INDEX_FORMAT = "kb-index"
+INDEX_FORMAT_VERSION = 4
+
+MANIFEST_FILE = "manifest.json"
+
+
+class QueryVectorizer:
+    """
+    TF-IDF query transformer backed by a sorted vocabulary array.
+    
+    Produces the same vectors as the fitted TfidfVectorizer it was taken from
+    (raw term counts x IDF, L2-normalised) without pickling sklearn objects.
+    """
+    
+    def __init__(self, terms: np.ndarray, idf: np.ndarray, stop_words: Optional[str], ngram_range: tuple):
+        self.terms = terms
+        self.idf = idf
+        self.stop_words = stop_words
+        self.ngram_range = tuple(ngram_range)
+        self.analyzer = TfidfVectorizer(
+            stop_words=stop_words,
+            ngram_range=self.ngram_range
+        ).build_analyzer()
+    
+    @classmethod
+    def from_tfidf(cls, vectorizer: TfidfVectorizer) -> "QueryVectorizer":
+        """Take vocabulary and IDF weights from a fitted TfidfVectorizer."""
+        # sklearn numbers features in sorted term order
+        return cls(
+            terms=vectorizer.get_feature_names_out().astype(str),
+            idf=vectorizer.idf_.astype(np.float64),
+            stop_words=vectorizer.stop_words,
+            ngram_range=vectorizer.ngram_range
+        )
+    
+    def params(self) -> Dict:
+        """Get the analyzer parameters stored in the manifest."""
+        return {'stop_words': self.stop_words, 'ngram_range': list(self.ngram_range)}
+    
+    def extended(self, words: np.ndarray, texts: List[str], num_docs: int) -> tuple:
+        """
+        Get a vectorizer whose vocabulary also holds words that this one lacks.
+        
+        The added words get TfidfVectorizer's smoothed IDF over num_docs
+        documents, with their document frequency counted in texts.
+        
+        Returns:
+            (vectorizer, columns): columns[j] is the new column of feature j
+        """
+        words = np.setdiff1d(np.asarray(words, dtype=str), self.terms)
+        if not len(words):
+            return self, None
+        
+        terms = np.union1d(self.terms, words).astype(str)
+        columns = np.searchsorted(terms, self.terms)
+        counts = CountVectorizer(stop_words=self.stop_words, ngram_range=self.ngram_range, vocabulary=words).transform(texts)
+        doc_freqs = np.asarray((counts > 0).sum(axis=0)).ravel()
+        
+        idf = np.empty(len(terms), dtype=np.float64)
+        idf[columns] = self.idf
+        idf[np.searchsorted(terms, words)] = np.log((1 + num_docs) / (1 + doc_freqs)) + 1
+        return QueryVectorizer(terms, idf, self.stop_words, self.ngram_range), columns
+    
+    def transform(self, queries: List[str]) -> csr_matrix:
+        """Vectorize queries into L2-normalised TF-IDF rows."""
+        indptr = [0]
+        indices = []
+        data = []
+        
+        for query in queries:
+            tokens = self.analyzer(query)
+            if tokens and len(self.terms):
+                tokens, counts = np.unique(np.array(tokens, dtype=str), return_counts=True)
+                pos = np.minimum(np.searchsorted(self.terms, tokens), len(self.terms) - 1)
+                found = self.terms[pos] == tokens
+                cols = pos[found]
+                values = counts[found] * self.idf[cols]
+                norm = np.sqrt(np.dot(values, values))
+                indices.extend(cols.tolist())
+                data.extend((values / norm if norm else values).tolist())
+            indptr.append(len(indices))
+        
+        return csr_matrix(
+            (np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+            shape=(len(queries), len(self.terms))
+        )
+
+
+def save_index(
+    directory: str,
+    chunks: List[Dict],
+    vectorizer: QueryVectorizer,
+    tfidf_matrix: csr_matrix,
+    bm25: BM25Index,
+    dense: DenseIndex,
+    category_ranges: Dict[str, tuple]
+):
+    """
+    Write an index to directory in the memory-mappable format.
+    
+    Args:
+        directory: Target index directory (created if missing)
+        chunks: Chunks (dicts or a ChunkStore) in index row order
+        vectorizer: Query vectorizer holding the vocabulary and IDF weights
+        tfidf_matrix: CSR TF-IDF matrix, one row per chunk
+        bm25: BM25 inverted index over the same rows
+        dense: LSA vectors and LSH tables over the same rows
+        category_ranges: Row range per category
+    """
+    os.makedirs(directory, exist_ok=True)
+    
+    # Files are written under temporary names and renamed into place at the end.
+    # Renaming (rather than truncating) keeps existing memory maps of the old
+    # files valid in processes still serving the previous index.
+    written = []
+    
+    def temp_path(filename):
+        path = os.path.join(directory, filename)
+        written.append(path)
+        return f"{path}.tmp"
+    
+    def save(name, array):
+        with open(temp_path(f"{name}.npy"), 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+    
+    # scipy wants one index dtype for indptr and indices; a mismatch forces a copy on load
+    index_dtype = np.int32 if tfidf_matrix.nnz < np.iinfo(np.int32).max else np.int64
+    save("tfidf_indptr", tfidf_matrix.indptr.astype(index_dtype))
+    save("tfidf_indices", tfidf_matrix.indices.astype(index_dtype))
+    save("tfidf_data", tfidf_matrix.data.astype(np.float32))
+    save("tfidf_terms", vectorizer.terms)
+    save("tfidf_idf", vectorizer.idf)
+    
+    for name, array in bm25.to_arrays().items():
+        save(f"bm25_{name}", array)
+    
+    for name, array in dense.to_arrays().items():
+        save(f"dense_{name}", array)
+    
+    # Columnar chunk store: one text blob plus small per-field arrays
+    store = chunks if isinstance(chunks, ChunkStore) else ChunkStore.from_chunks(chunks)
+    with open(temp_path("chunk_text.bin"), 'wb') as f:
+        f.write(store.blob)
+    save("chunk_offsets", store.offsets)
+    for field in STRING_FIELDS:
+        save(f"chunk_{field}", store.string_ids[field])
+    for field in INT_FIELDS:
+        save(f"chunk_{field}", store.ints[field])
+    
+    with open(temp_path("chunk_strings.json"), 'w', encoding='utf-8') as f:
+        json.dump(store.strings, f, ensure_ascii=False)
+    
+    manifest = {
+        'format': INDEX_FORMAT,
+        'version': INDEX_FORMAT_VERSION,
+        'num_chunks': len(store),
+        'num_features': int(tfidf_matrix.shape[1]),
+        'vectorizer': vectorizer.params(),
+        'bm25': bm25.params(),
+        'lazy_text': store.lazy_text,
+        'category_ranges': {c: list(r) for c, r in category_ranges.items()}
+    }
+    
+    with open(temp_path(MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    
+    # Manifest is renamed last so a directory with a manifest is always complete
+    manifest_path = written.pop()
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    for path in written:
+        os.replace(f"{path}.tmp", path)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+
+def read_manifest(directory: str) -> Optional[Dict]:
+    """Read an index manifest, or None if the directory holds no compatible index."""
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    
+    if manifest.get('format') != INDEX_FORMAT or manifest.get('version') != INDEX_FORMAT_VERSION:
+        return None
+    return manifest
+
+
+def load_index(directory: str) -> Optional[Dict]:
+    """
+    Open an index directory with memory-mapped arrays.
+    
+    Returns:
+        Dict with vectorizer, tfidf_matrix, bm25, dense, chunks, category_ranges
+        and manifest, or None if there is no index of the current format version.
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return None
+    
+    def load(name):
+        return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r')
+    
+    num_chunks = manifest['num_chunks']
+    tfidf_matrix = csr_matrix(
+        (load("tfidf_data"), load("tfidf_indices"), load("tfidf_indptr")),
+        shape=(num_chunks, manifest['num_features']),
+        copy=False
+    )
+    
+    vectorizer = QueryVectorizer(
+        terms=load("tfidf_terms"),
+        idf=load("tfidf_idf"),
+        stop_words=manifest['vectorizer']['stop_words'],
+        ngram_range=manifest['vectorizer']['ngram_range']
+    )
+    
+    bm25_arrays = {name: load(f"bm25_{name}") for name in BM25Index.ARRAY_NAMES}
+    bm25 = BM25Index.from_arrays(bm25_arrays, manifest['bm25'])
+    dense = DenseIndex.from_arrays({name: load(f"dense_{name}") for name in DenseIndex.ARRAY_NAMES})
+    
+    with open(os.path.join(directory, "chunk_strings.json"), 'r', encoding='utf-8') as f:
+        strings = json.load(f)
+    
+    with open(os.path.join(directory, "chunk_text.bin"), 'rb') as f:
+        # mmap cannot map an empty file
+        blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+    
+    chunks = ChunkStore(
+        strings=strings,
+        string_ids={field: load(f"chunk_{field}") for field in STRING_FIELDS},
+        ints={field: load(f"chunk_{field}") for field in INT_FIELDS},
+        blob=blob,
+        offsets=load("chunk_offsets"),
+        lazy_text=manifest.get('lazy_text', False)
+    )
+    
+    return {
+        'vectorizer': vectorizer,
+        'tfidf_matrix': tfidf_matrix,
+        'bm25': bm25,
+        'dense': dense,
+        'chunks': chunks,
+        'category_ranges': {c: tuple(r) for c, r in manifest['category_ranges'].items()},
+        'manifest': manifest
+    }
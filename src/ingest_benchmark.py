@@ -0,0 +1,166 @@
+"""
+KB ingestion write benchmark.
+Compares the per-row write path (one connection, INSERT and commit per chunk)
+with BulkWriter batches on synthetic ticket chunks in a scratch SQLite database.
+Compression is not part of the timing; rows are written as already compressed.
+
+Usage:
+    python -m src.ingest_benchmark --rows 100000 --batch-sizes 1000 10000
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from datetime import datetime
+from typing import List, Dict, Optional
+from src import database
+from src.benchmark import BENCHMARK_DIR, load_vocabulary, generate_chunks, _git_commit
+from src.bulk_writer import BulkWriter, BULK_BATCH_SIZE, KB_CHUNK_COLUMNS, kb_chunk_row
+
+
+DEFAULT_ROWS = 100000
+
+
+def _ticket_chunks(num_rows: int, vocabulary: Dict, seed: int) -> List[Dict]:
+    """Synthetic chunks shaped like compress_and_store_documents output."""
+    chunks = []
+    for i, chunk in enumerate(generate_chunks(num_rows, vocabulary, seed)):
+        original_words = len(chunk['text'].split())
+        compressed_words = len(chunk['compressed_text'].split())
+        chunks.append({
+            'title': chunk['title'],
+            'category': chunk['category'],
+            'source': 'resolved_tickets.csv',
+            'source_key': f"tickets#{i + 1}",
+            'original_text': chunk['text'],
+            'compressed_text': chunk['compressed_text'],
+            'original_tokens': original_words,
+            'compressed_tokens': compressed_words,
+            'original_words': original_words,
+            'compressed_words': compressed_words,
+            'latency_ms': 0.0,
+            'parent_title': chunk['title'],
+            'section': '',
+            'chunk_index': 0,
+            'duplicate_count': 0
+        })
+    return chunks
+
+
+def _write_per_row(chunks: List[Dict]):
+    """Previous write path: one connection, INSERT and commit per row."""
+    sql = f"INSERT INTO kb_chunks ({', '.join(KB_CHUNK_COLUMNS)}) VALUES ({', '.join('?' * len(KB_CHUNK_COLUMNS))})"
+    for chunk in chunks:
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(sql, kb_chunk_row(chunk))
+        conn.commit()
+        conn.close()
+
+
+def _write_bulk(chunks: List[Dict], batch_size: int):
+    """Current write path."""
+    with BulkWriter("kb_chunks", KB_CHUNK_COLUMNS, batch_size) as writer:
+        for chunk in chunks:
+            writer.add(kb_chunk_row(chunk))
+
+
+def _time_writes(workdir: str, name: str, write, *args) -> Dict:
+    """Run a write path against a fresh database and time it."""
+    database.DB_PATH = os.path.join(workdir, f"{name}.db")
+    database.init_database()
+    
+    num_rows = len(args[0])
+    start = time.perf_counter()
+    write(*args)
+    seconds = time.perf_counter() - start
+    
+    conn = database.get_connection()
+    written = conn.execute("SELECT COUNT(*) FROM kb_chunks").fetchone()[0]
+    conn.close()
+    if written != num_rows:
+        raise RuntimeError(f"{name}: wrote {written} of {num_rows} rows")
+    
+    return {
+        'seconds': seconds,
+        'rows_per_second': num_rows / seconds if seconds else None,
+        'db_bytes': os.path.getsize(database.DB_PATH)
+    }
+
+
+def run_benchmark(
+    num_rows: int = DEFAULT_ROWS,
+    batch_sizes: List[int] = (BULK_BATCH_SIZE,),
+    per_row: bool = True,
+    seed: int = 0,
+    docs_dir: str = "data/docs",
+    tickets_csv: str = "data/resolved_tickets.csv"
+) -> Dict:
+    """
+    Time writing num_rows KB chunks with each write path.
+    
+    Returns:
+        Report dict (also what main() writes as JSON)
+    """
+    chunks = _ticket_chunks(num_rows, load_vocabulary(docs_dir, tickets_csv), seed)
+    
+    report = {
+        'benchmark': 'ingest',
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sqlite': database.sqlite3.sqlite_version,
+        'config': {'rows': num_rows, 'batch_sizes': list(batch_sizes), 'seed': seed},
+        'results': {}
+    }
+    
+    db_path = database.DB_PATH
+    workdir = tempfile.mkdtemp(prefix="kb-ingest-bench-")
+    try:
+        runs = [('per_row', _write_per_row, chunks)] if per_row else []
+        runs += [(f"bulk_{size}", _write_bulk, chunks, size) for size in batch_sizes]
+        
+        for name, write, *args in runs:
+            print(f"✍️  Writing {num_rows:,} rows ({name})...")
+            stats = _time_writes(workdir, name, write, *args)
+            report['results'][name] = stats
+            print(f"   {stats['seconds']:.2f}s, {stats['rows_per_second']:,.0f} rows/s")
+    finally:
+        database.DB_PATH = db_path
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    return report
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark KB chunk ingestion writes.")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="Rows to write per write path")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[BULK_BATCH_SIZE], help="BulkWriter batch sizes")
+    parser.add_argument("--skip-per-row", action="store_true", help="Only time the bulk write path")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON report path (default: storage/benchmarks/ingest-<timestamp>.json)")
+    args = parser.parse_args(argv)
+    
+    report = run_benchmark(
+        num_rows=args.rows,
+        batch_sizes=args.batch_sizes,
+        per_row=not args.skip_per_row,
+        seed=args.seed
+    )
+    
+    output = args.output or os.path.join(BENCHMARK_DIR, f"ingest-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    
+    print(f"✅ Benchmark report saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+KB chunk artifacts.
+Chunks are exported as JSON Lines (one compact record per line), optionally
+compressed with a stdlib codec chosen by file suffix, and written/read as a
+stream so neither side holds the whole KB in memory. An artifact is enough to
+rebuild the retrieval index without reloading kb_chunks or calling ScaleDown.
+"""
+
+import os
+import bz2
+import gzip
+import json
+import lzma
+import functools
+import itertools
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from src.chunk_store import ChunkStore
+from src.retriever import get_retriever
+
+
+ARTIFACT_PATH = "storage/kb_chunks.jsonl.gz"
+
+# First line of every artifact; readers reject other formats and newer versions
+ARTIFACT_FORMAT = "kb-chunks"
+ARTIFACT_VERSION = 1
+
+# Records packed into one columnar ChunkStore at a time when building an index
+ARTIFACT_BATCH_SIZE = 5000
+
+# gzip level: 6 is close to 9 in size on chunk text at a fraction of the time
+GZIP_LEVEL = 6
+
+# File suffix -> function(path, mode) opening a binary stream
+# (gzip ignores compresslevel when reading)
+CODECS = {
+    ".gz": functools.partial(gzip.open, compresslevel=GZIP_LEVEL),
+    ".bz2": bz2.open,
+    ".xz": lzma.open,
+    ".jsonl": open
+}
+
+try:
+    # Python 3.14+
+    from compression import zstd
+    CODECS[".zst"] = zstd.open
+except ImportError:
+    pass
+
+
+def _codec(path: str):
+    """Get the opener for an artifact path by its suffix."""
+    for suffix, opener in CODECS.items():
+        if path.endswith(suffix):
+            return opener
+    raise ValueError(f"Unsupported artifact type: {path} (expected one of {', '.join(CODECS)})")
+
+
+def staging_artifact_path(path: str = ARTIFACT_PATH) -> str:
+    """Path a new artifact is staged at (same directory and suffix) until it replaces path."""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".staging-{name}")
+
+
+def invalidate_artifact(path: str = ARTIFACT_PATH) -> bool:
+    """
+    Remove an artifact that no longer matches kb_chunks.
+    
+    Called after incremental changes (sync, ingest), so a stale artifact is
+    never used to rebuild the index; the next rebuild or build-index writes
+    a new one.
+    
+    Returns:
+        Whether an artifact was removed
+    """
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    print(f"🗑️  Removed out-of-date artifact {path} (the next rebuild or build-index re-exports it)")
+    return True
+
+
+def write_artifact(records: Iterable[Dict], path: str = ARTIFACT_PATH) -> int:
+    """
+    Stream records to a JSONL artifact.
+    
+    Records are written as they are produced, so a generator is consumed
+    without holding every record in memory. The artifact is written to a
+    temporary file and renamed into place, so readers never see a partial one.
+    
+    Args:
+        records: JSON-serialisable chunk dicts
+        path: Output path; the suffix picks the codec (.jsonl, .gz, .bz2, .xz,
+            and .zst on Python 3.14+)
+    
+    Returns:
+        Number of records written
+    """
+    opener = _codec(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    
+    count = 0
+    try:
+        with opener(tmp_path, "wb") as raw:
+            # Encode per line instead of wrapping raw in a TextIOWrapper, which some codecs do not support
+            header = {"format": ARTIFACT_FORMAT, "version": ARTIFACT_VERSION}
+            raw.write(json.dumps(header).encode('utf-8') + b"\n")
+            for record in records:
+                raw.write(json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str).encode('utf-8') + b"\n")
+                count += 1
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    
+    return count
+
+
+def iter_artifact(path: str = ARTIFACT_PATH) -> Iterator[Dict]:
+    """
+    Stream the records of an artifact written by write_artifact.
+    
+    Raises:
+        ValueError: If the file is not a KB chunk artifact this version can read
+    """
+    with _codec(path)(path, "rb") as raw:
+        header = json.loads(raw.readline() or b"{}")
+        if header.get("format") != ARTIFACT_FORMAT:
+            raise ValueError(f"{path} is not a KB chunk artifact")
+        if header.get("version", 0) > ARTIFACT_VERSION:
+            raise ValueError(f"{path} has artifact version {header['version']}; this reader supports {ARTIFACT_VERSION}")
+        
+        for line in raw:
+            if line.strip():
+                yield json.loads(line)
+
+
+def index_chunk(record: Dict) -> Dict:
+    """Get the retriever chunk (as load_chunks_from_db returns it) of an artifact record."""
+    return {
+        'id': record.get('id'),
+        'source_id': record['source'],
+        'title': record['title'],
+        'category': record['category'],
+        'text': record['original_text'],
+        'compressed_text': record['compressed_text'],
+        'parent_title': record.get('parent_title'),
+        'section': record.get('section'),
+        'chunk_index': record.get('chunk_index', 0)
+    }
+
+
+def load_index_chunks(records: Iterable[Dict], batch_size: int = ARTIFACT_BATCH_SIZE) -> List:
+    """
+    Pack a stream of artifact records into retriever chunks.
+    
+    Records are converted and packed into a columnar ChunkStore batch_size
+    at a time, so the KB is held as compact stores rather than one dict per
+    record; the returned chunks are views into those stores.
+    """
+    iterator = iter(records)
+    chunks = []
+    while True:
+        batch = [index_chunk(record) for record in itertools.islice(iterator, batch_size)]
+        if not batch:
+            return chunks
+        chunks.extend(ChunkStore.from_chunks(batch))
+
+
+def build_index_from_artifact(
+    path: str = ARTIFACT_PATH,
+    retriever=None,
+    publish_with: Optional[Callable] = None
+) -> Optional[int]:
+    """
+    Build and publish a retrieval index generation from an artifact.
+    
+    Chunk text comes from the artifact only; SQLite is used just to record the
+    new generation. Chunks keep their kb_chunks ids, so a lazy-text retriever
+    needs the matching kb_chunks rows to serve results; an inline-text one
+    does not.
+    
+    Args:
+        path: Artifact path
+        retriever: Retriever to build with (default: get_retriever())
+        publish_with: Function(cursor) run in the transaction that activates
+            the generation (see KBRetriever.build_index)
+    
+    Returns:
+        The new generation number, or None if the artifact has no chunks
+    """
+    chunks = load_index_chunks(iter_artifact(path))
+    return (retriever or get_retriever()).build_index(chunks, publish_with=publish_with)
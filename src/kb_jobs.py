@@ -0,0 +1,409 @@
+"""
+Background KB jobs.
+Rebuild requests are queued in the kb_jobs table and run by a worker thread
+(started by the Admin page) or a separate worker process; progress, ETA and
+throughput are written back to the row so any page can poll them.
+
+Usage:
+    python -m src.kb_jobs            # run a worker until interrupted
+    python -m src.kb_jobs --once     # run queued jobs, then exit
+"""
+
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+from typing import Callable, List, Dict, Optional
+from src.database import get_connection
+from src.kb_pipeline import rebuild_kb_index
+
+
+# Seconds an idle worker waits before looking for queued jobs again
+JOB_POLL_SECONDS = 2.0
+
+# Running jobs without a heartbeat for this long are treated as abandoned
+# (e.g. the Streamlit process stopped) and queued again
+JOB_STALE_SECONDS = int(os.getenv("KB_JOB_STALE_SECONDS", "900"))
+
+# Seconds between heartbeats of a running job, sent whether or not it reports progress
+JOB_HEARTBEAT_SECONDS = min(30.0, JOB_STALE_SECONDS / 3)
+
+# Runs of one job before an abandoned job is marked failed instead of requeued
+JOB_MAX_ATTEMPTS = 3
+
+# Minimum seconds between progress writes of a running job
+PROGRESS_WRITE_SECONDS = 1.0
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+def _merge_rebuild_params(queued: Dict, new: Dict) -> Dict:
+    """Combine two rebuild requests into one that covers both."""
+    return {
+        "md_files": queued["md_files"] + [path for path in new["md_files"] if path not in queued["md_files"]],
+        "csv_files": queued["csv_files"] + [path for path in new["csv_files"] if path not in queued["csv_files"]],
+        "include_existing_docs": queued["include_existing_docs"] or new["include_existing_docs"]
+    }
+
+
+def enqueue_rebuild(
+    md_files: Optional[List[str]] = None,
+    csv_files: Optional[List[str]] = None,
+    include_existing_docs: bool = True
+) -> int:
+    """
+    Queue a KB rebuild.
+    
+    A rebuild that is queued but not started yet absorbs the request (its
+    sources become the union of both), so repeated clicks cause one rebuild.
+    A request made while a rebuild is running queues one more, which picks up
+    whatever changed meanwhile.
+    
+    Args:
+        md_files: Paths of saved uploads (see save_uploaded_files)
+        csv_files: Paths of saved tickets CSVs
+        include_existing_docs: Whether to include docs from data/docs/
+    
+    Returns:
+        Id of the job that will carry out the request
+    """
+    params = {
+        "md_files": list(md_files or []),
+        "csv_files": list(csv_files or []),
+        "include_existing_docs": include_existing_docs
+    }
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    # Take the write lock up front so concurrent requests see each other's job
+    cursor.execute("BEGIN IMMEDIATE")
+    cursor.execute("""
+        SELECT id, params FROM kb_jobs
+        WHERE kind = 'rebuild' AND status = 'queued'
+        ORDER BY id LIMIT 1
+    """)
+    row = cursor.fetchone()
+    
+    if row:
+        job_id = row['id']
+        merged = _merge_rebuild_params(json.loads(row['params']), params)
+        cursor.execute(
+            "UPDATE kb_jobs SET params = ?, requests = requests + 1 WHERE id = ?",
+            (json.dumps(merged), job_id)
+        )
+    else:
+        cursor.execute(
+            "INSERT INTO kb_jobs (kind, params, message) VALUES ('rebuild', ?, 'Waiting for worker...')",
+            (json.dumps(params),)
+        )
+        job_id = cursor.lastrowid
+    
+    conn.commit()
+    conn.close()
+    return job_id
+
+
+def _requeue_stale_jobs(cursor):
+    """Queue abandoned running jobs again, or fail them after JOB_MAX_ATTEMPTS runs."""
+    cursor.execute(f"""
+        UPDATE kb_jobs
+        SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END,
+            error = 'Worker stopped responding',
+            worker = NULL,
+            finished_at = CASE WHEN attempts >= ? THEN CURRENT_TIMESTAMP END
+        WHERE status = 'running'
+          AND heartbeat_at < datetime('now', '-{JOB_STALE_SECONDS} seconds')
+    """, (JOB_MAX_ATTEMPTS, JOB_MAX_ATTEMPTS))
+
+
+def claim_job(worker: str) -> Optional[Dict]:
+    """
+    Claim the oldest queued job for a worker.
+    
+    Returns:
+        Job dict as claimed (params decoded, worker and attempts set), or
+        None if nothing is queued
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    _requeue_stale_jobs(cursor)
+    cursor.execute("SELECT * FROM kb_jobs WHERE status = 'queued' ORDER BY id LIMIT 1")
+    row = cursor.fetchone()
+    
+    if row is None:
+        conn.commit()
+        conn.close()
+        return None
+    
+    cursor.execute("""
+        UPDATE kb_jobs
+        SET status = 'running', worker = ?, attempts = attempts + 1, error = NULL,
+            started_at = CURRENT_TIMESTAMP, heartbeat_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    """, (worker, row['id']))
+    conn.commit()
+    conn.close()
+    
+    job = dict(row)
+    job.update(params=json.loads(job['params']), status='running', worker=worker, attempts=job['attempts'] + 1)
+    return job
+
+
+class JobAbandoned(Exception):
+    """The job was requeued or claimed by another worker while this run was going."""
+
+
+class JobProgress:
+    """
+    Progress callback (current, total, message) that writes to a job row.
+    
+    Writes are throttled to one per PROGRESS_WRITE_SECONDS (message changes
+    always go through). The ETA extrapolates the progress rate since the
+    first update; rows/s comes from the ingest counters in stats. Writes only
+    apply while this run still owns the job (same worker and attempt); a run
+    that lost it is stopped with JobAbandoned at its next write.
+    """
+    
+    def __init__(self, job_id: int, worker: str, attempt: int):
+        self.job_id = job_id
+        self.worker = worker
+        self.attempt = attempt
+        # Filled in place by rebuild_kb_index
+        self.stats = {}
+        self.first = None
+        self.last_write = 0.0
+        self.last_message = None
+    
+    def assert_owner(self, cursor):
+        """
+        Raise JobAbandoned unless this run still owns the job.
+        
+        Runners call it in the transaction that publishes their result, so a
+        run whose job was requeued as stale cannot publish over the new run.
+        """
+        cursor.execute(
+            "SELECT 1 FROM kb_jobs WHERE id = ? AND status = 'running' AND worker IS ? AND attempts = ?",
+            (self.job_id, self.worker, self.attempt)
+        )
+        if cursor.fetchone() is None:
+            raise JobAbandoned(f"Job {self.job_id} was taken over by another run")
+    
+    def __call__(self, current: float, total: float, message: str):
+        now = time.monotonic()
+        progress = current / total if total > 0 else 0.0
+        if self.first is None:
+            self.first = (now, progress)
+        if message == self.last_message and now - self.last_write < PROGRESS_WRITE_SECONDS:
+            return
+        
+        start_time, start_progress = self.first
+        eta = None
+        if progress > start_progress:
+            eta = (now - start_time) / (progress - start_progress) * (1.0 - progress)
+        
+        conn = get_connection()
+        cursor = conn.execute("""
+            UPDATE kb_jobs
+            SET progress = ?, message = ?, rows_done = ?, rows_per_second = ?,
+                eta_seconds = ?, heartbeat_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND worker IS ? AND attempts = ?
+        """, (
+            progress, message, self.stats.get('sources', 0),
+            self.stats.get('rows_per_second'), eta, self.job_id, self.worker, self.attempt
+        ))
+        owned = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        if not owned:
+            raise JobAbandoned(f"Job {self.job_id} was taken over by another run")
+        
+        self.last_write = now
+        self.last_message = message
+
+
+def _run_rebuild(params: Dict, progress: JobProgress) -> Dict:
+    return rebuild_kb_index(
+        md_files=params["md_files"],
+        csv_file=params["csv_files"],
+        include_existing_docs=params["include_existing_docs"],
+        progress_callback=progress,
+        stats=progress.stats,
+        publish_guard=progress.assert_owner
+    )
+
+
+# Job kind -> function(params, progress) returning a result dict with success
+JOB_RUNNERS: Dict[str, Callable] = {
+    "rebuild": _run_rebuild
+}
+
+
+def _send_heartbeats(progress: JobProgress, stop: threading.Event):
+    """Keep a running job's heartbeat fresh until stop is set, even while it reports no progress."""
+    while not stop.wait(JOB_HEARTBEAT_SECONDS):
+        try:
+            conn = get_connection()
+            conn.execute(
+                "UPDATE kb_jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE id = ? AND worker IS ? AND attempts = ?",
+                (progress.job_id, progress.worker, progress.attempt)
+            )
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"⚠️ Job {progress.job_id} heartbeat failed: {e}")
+
+
+def run_job(job: Dict) -> Dict:
+    """Run a claimed job and record its outcome."""
+    progress = JobProgress(job['id'], job['worker'], job['attempts'])
+    print(f"🛠️  Running {job['kind']} job {job['id']} (attempt {job['attempts']})")
+    
+    stop_heartbeats = threading.Event()
+    heartbeats = threading.Thread(
+        target=_send_heartbeats, args=(progress, stop_heartbeats),
+        name=f"kb-job-{job['id']}-heartbeat", daemon=True
+    )
+    heartbeats.start()
+    try:
+        result = JOB_RUNNERS[job['kind']](job['params'], progress)
+    except Exception as e:
+        result = {"success": False, "error": str(e), "errors": [str(e)]}
+    finally:
+        stop_heartbeats.set()
+        heartbeats.join()
+    
+    # An abandoned run leaves the job to the run that took it over
+    conn = get_connection()
+    cursor = conn.execute("""
+        UPDATE kb_jobs
+        SET status = ?, progress = CASE WHEN ? THEN 1.0 ELSE progress END,
+            message = ?, eta_seconds = NULL, result = ?, error = ?,
+            heartbeat_at = CURRENT_TIMESTAMP, finished_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND worker IS ? AND attempts = ?
+    """, (
+        "succeeded" if result.get("success") else "failed",
+        bool(result.get("success")),
+        "Complete!" if result.get("success") else "Failed",
+        json.dumps(result, default=str),
+        result.get("error"),
+        job['id'], progress.worker, progress.attempt
+    ))
+    owned = cursor.rowcount > 0
+    conn.commit()
+    conn.close()
+    
+    if not owned:
+        print(f"⚠️ {job['kind'].title()} job {job['id']} was taken over by another run; discarding this run's result")
+    elif result.get("success"):
+        print(f"✅ {job['kind'].title()} job {job['id']} finished")
+    else:
+        print(f"❌ {job['kind'].title()} job {job['id']} failed: {result.get('error')}")
+    return result
+
+
+def _decode_job(row) -> Dict:
+    job = dict(row)
+    job['params'] = json.loads(job['params'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+def get_job(job_id: int) -> Optional[Dict]:
+    """Get a job by id (params and result decoded)."""
+    conn = get_connection()
+    row = conn.execute("SELECT * FROM kb_jobs WHERE id = ?", (job_id,)).fetchone()
+    conn.close()
+    return _decode_job(row) if row else None
+
+
+def get_recent_jobs(limit: int = 10) -> List[Dict]:
+    """Get the most recent jobs, newest first."""
+    conn = get_connection()
+    rows = conn.execute("SELECT * FROM kb_jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    conn.close()
+    return [_decode_job(row) for row in rows]
+
+
+def get_active_jobs(kind: str = "rebuild") -> List[Dict]:
+    """Get queued and running jobs of a kind, oldest first."""
+    conn = get_connection()
+    rows = conn.execute(
+        f"SELECT * FROM kb_jobs WHERE kind = ? AND status IN ({','.join('?' * len(ACTIVE_STATUSES))}) ORDER BY id",
+        (kind, *ACTIVE_STATUSES)
+    ).fetchall()
+    conn.close()
+    return [_decode_job(row) for row in rows]
+
+
+class JobWorker(threading.Thread):
+    """Daemon thread that claims and runs queued jobs one at a time."""
+    
+    def __init__(self, poll_seconds: float = JOB_POLL_SECONDS):
+        super().__init__(name="kb-job-worker", daemon=True)
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{self.name}"
+        self._stop_event = threading.Event()
+    
+    def run_pending(self) -> int:
+        """Run queued jobs until none are left; returns how many ran."""
+        ran = 0
+        while not self._stop_event.is_set():
+            job = claim_job(self.worker_id)
+            if job is None:
+                break
+            run_job(job)
+            ran += 1
+        return ran
+    
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"⚠️ Job worker error: {e}")
+            self._stop_event.wait(self.poll_seconds)
+    
+    def stop(self):
+        """Stop after the current job."""
+        self._stop_event.set()
+
+
+# Global worker thread of this process
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def ensure_worker() -> JobWorker:
+    """Start this process's job worker thread if it is not running."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = JobWorker()
+            _worker.start()
+    return _worker
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point: run a job worker in this process."""
+    parser = argparse.ArgumentParser(description="Run queued KB jobs.")
+    parser.add_argument("--once", action="store_true", help="Run queued jobs, then exit")
+    parser.add_argument("--poll-seconds", type=float, default=JOB_POLL_SECONDS)
+    args = parser.parse_args(argv)
+    
+    worker = JobWorker(poll_seconds=args.poll_seconds)
+    if args.once:
+        print(f"✅ Ran {worker.run_pending()} job(s)")
+        return
+    
+    print(f"👷 KB job worker {worker.worker_id} waiting for jobs (Ctrl+C to stop)")
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()
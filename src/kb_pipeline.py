@@ -5,36 +5,80 @@ Supports multi-file upload and progress tracking.
 """
 
 import os
+import re
 import json
+import io
 import csv
-import pickle
-from typing import List, Dict, Optional, Callable
+import time
+import hashlib
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Callable, Iterable, Iterator
 from datetime import datetime
-from src.scaledown_client import compress_text
+from src.scaledown_client import compress_text_with_retry
+from src import compression_cache
+from src.bulk_writer import BulkWriter, BULK_BATCH_SIZE, KB_CHUNK_COLUMNS, kb_chunk_row
+from src.chunk_text import SQLITE_MAX_PARAMS
 from src.database import get_connection
+from src.dedupe import find_near_duplicates, NearDuplicateIndex
+from src.kb_artifact import (
+    ARTIFACT_PATH, build_index_from_artifact, invalidate_artifact, staging_artifact_path, write_artifact
+)
+from src.retriever import get_retriever, load_chunks_from_db, get_active_generation
+
+
+# Chunking defaults (tokens are whitespace-delimited words, matching ScaleDown's fallback count)
+CHUNK_TOKENS = 200
+CHUNK_OVERLAP_TOKENS = 30
+
+# Concurrent ScaleDown requests during a rebuild (the request rate is limited separately)
+COMPRESSION_WORKERS = int(os.getenv("SCALEDOWN_CONCURRENCY", "4"))
+
+# Source documents read, compressed and written per streaming ingest batch
+INGEST_BATCH_SIZE = 500
+
+# Millisecond timestamps, so rows touched by a resumed rebuild sort after its start
+SYNC_TIMESTAMP_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+HEADING_PATTERN = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
 
 
 def save_uploaded_files(md_files, csv_file) -> Dict:
-    """Save uploaded files to data/uploads/ directory."""
+    """
+    Save uploaded files to data/uploads/ directory (paths of files already saved are kept as they are).
+    
+    Args:
+        md_files: Uploaded markdown/text files or paths
+        csv_file: Uploaded tickets CSV or path, or a list of them
+    
+    Returns:
+        Dict with md_files and csv_files (lists of saved paths)
+    """
     upload_dir = "data/uploads"
     os.makedirs(upload_dir, exist_ok=True)
     
-    saved_files = {"md_files": [], "csv_file": None}
+    saved_files = {"md_files": [], "csv_files": []}
     
     # Save markdown/text files
     if md_files:
         for uploaded_file in md_files:
+            if isinstance(uploaded_file, str):
+                saved_files["md_files"].append(uploaded_file)
+                continue
             file_path = os.path.join(upload_dir, uploaded_file.name)
             with open(file_path, "wb") as f:
                 f.write(uploaded_file.getbuffer())
             saved_files["md_files"].append(file_path)
     
-    # Save CSV file
-    if csv_file:
-        file_path = os.path.join(upload_dir, csv_file.name)
-        with open(file_path, "wb") as f:
-            f.write(csv_file.getbuffer())
-        saved_files["csv_file"] = file_path
+    # Save CSV files
+    for uploaded_file in (csv_file if isinstance(csv_file, (list, tuple)) else [csv_file]):
+        if isinstance(uploaded_file, str):
+            saved_files["csv_files"].append(uploaded_file)
+        elif uploaded_file:
+            file_path = os.path.join(upload_dir, uploaded_file.name)
+            with open(file_path, "wb") as f:
+                f.write(uploaded_file.getbuffer())
+            saved_files["csv_files"].append(file_path)
     
     return saved_files
 
@@ -59,7 +103,8 @@ def load_documents_from_files(file_paths: List[str]) -> List[Dict]:
                     'title': title,
                     'content': content,
                     'category': category,
-                    'source': filename
+                    'source': filename,
+                    'source_key': os.path.normpath(filepath)
                 })
     
     return documents
@@ -88,7 +133,8 @@ def load_documents_from_directory(directory: str = "data/docs") -> List[Dict]:
                     'title': title,
                     'content': content,
                     'category': category,
-                    'source': filename
+                    'source': filename,
+                    'source_key': os.path.normpath(filepath)
                 })
     
     return documents
@@ -116,203 +162,1287 @@ def infer_category(filename: str) -> str:
         return "General"
 
 
-def load_tickets_from_csv(csv_path: str) -> List[Dict]:
-    """Load resolved tickets from CSV."""
-    tickets = []
+def iter_tickets_from_csv(csv_path: str, position: Optional[Dict] = None) -> Iterator[Dict]:
+    """
+    Stream resolved tickets from CSV one row at a time.
     
+    Args:
+        csv_path: Path to the tickets CSV
+        position: Optional dict kept updated with 'bytes' read and 'total' file size
+    """
     if not os.path.exists(csv_path):
-        return tickets
+        return
+    
+    if position is not None:
+        position.update({'bytes': 0, 'total': os.path.getsize(csv_path)})
     
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
+    with open(csv_path, 'rb') as raw:
+        reader = csv.DictReader(io.TextIOWrapper(raw, encoding='utf-8', newline=''))
+        for row_number, row in enumerate(reader, start=1):
             # Handle different CSV formats
             title = row.get('title', row.get('issue', 'Untitled'))
             content = row.get('resolution', row.get('description', ''))
             category = row.get('category', 'Other')
             
-            tickets.append({
+            if position is not None:
+                # Includes read-ahead buffering, which is close enough for progress
+                position['bytes'] = raw.tell()
+            
+            yield {
                 'title': title,
                 'content': content,
                 'category': category,
-                'source': 'resolved_tickets.csv'
+                'source': 'resolved_tickets.csv',
+                'source_key': f"tickets#{row.get('ticket_id') or row_number}"
+            }
+
+
+def load_tickets_from_csv(csv_path: str) -> List[Dict]:
+    """Load resolved tickets from CSV."""
+    return list(iter_tickets_from_csv(csv_path))
+
+
+def _split_markdown_sections(content: str) -> List[Dict]:
+    """
+    Split markdown into sections at headings.
+    
+    Headings inside fenced code blocks are ignored. Each section carries the
+    heading path leading to it (e.g. "Windows Performance Optimization > Free Up Disk Space").
+    """
+    sections = []
+    heading_stack = []
+    current_lines = []
+    in_fence = False
+    
+    def flush():
+        body = "\n".join(current_lines).strip()
+        if body:
+            # Skip the document-level heading unless it is the only one
+            path = [text for _, text in heading_stack]
+            sections.append({
+                'section': " > ".join(path[1:] or path),
+                'content': body
+            })
+    
+    for line in content.splitlines():
+        if line.strip().startswith("```"):
+            in_fence = not in_fence
+        
+        match = None if in_fence else HEADING_PATTERN.match(line)
+        if match:
+            flush()
+            current_lines = []
+            level = len(match.group(1))
+            while heading_stack and heading_stack[-1][0] >= level:
+                heading_stack.pop()
+            heading_stack.append((level, match.group(2)))
+        
+        current_lines.append(line)
+    
+    flush()
+    return sections
+
+
+def _split_paragraphs(content: str) -> List[str]:
+    """Split text on blank lines, keeping fenced code blocks intact."""
+    paragraphs = []
+    current = []
+    in_fence = False
+    
+    for line in content.splitlines():
+        if line.strip().startswith("```"):
+            in_fence = not in_fence
+        
+        if not line.strip() and not in_fence:
+            if current:
+                paragraphs.append("\n".join(current))
+                current = []
+        else:
+            current.append(line)
+    
+    if current:
+        paragraphs.append("\n".join(current))
+    
+    return paragraphs
+
+
+def _window_words(text: str, chunk_tokens: int, overlap_tokens: int) -> List[str]:
+    """Split an oversized block into overlapping word windows."""
+    words = text.split()
+    step = max(chunk_tokens - overlap_tokens, 1)
+    windows = []
+    
+    for start in range(0, len(words), step):
+        windows.append(" ".join(words[start:start + chunk_tokens]))
+        if start + chunk_tokens >= len(words):
+            break
+    
+    return windows
+
+
+def _tail_words(text: str, count: int) -> str:
+    """Return the last count words of text, keeping the original line breaks."""
+    if count <= 0:
+        return ""
+    starts = [match.start() for match in re.finditer(r'\S+', text)]
+    if not starts:
+        return ""
+    return text[starts[max(len(starts) - count, 0)]:]
+
+
+def _pack_sections(
+    sections: List[Dict],
+    chunk_tokens: int,
+    overlap_tokens: int
+) -> List[Dict]:
+    """Greedily pack sections and paragraphs into windows of at most chunk_tokens."""
+    pieces = []
+    
+    # Flatten sections into paragraph pieces, splitting anything larger than the window
+    for section in sections:
+        for paragraph in _split_paragraphs(section['content']):
+            if len(paragraph.split()) > chunk_tokens:
+                for window in _window_words(paragraph, chunk_tokens, overlap_tokens):
+                    pieces.append((section['section'], window))
+            else:
+                pieces.append((section['section'], paragraph))
+    
+    chunks = []
+    current = []
+    current_tokens = 0
+    
+    def flush():
+        # The first piece that is not carried-over overlap labels the chunk
+        label = next((section for section, _, carried in current if not carried), current[0][0])
+        chunks.append({
+            'section': label,
+            'content': "\n\n".join(piece for _, piece, _ in current)
+        })
+    
+    for section, piece in pieces:
+        piece_tokens = len(piece.split())
+        if current and current_tokens + piece_tokens > chunk_tokens:
+            flush()
+            
+            # Carry trailing words over so context spans the chunk boundary,
+            # leaving room for the incoming piece within chunk_tokens
+            last_section, last_piece, _ = current[-1]
+            tail = _tail_words(last_piece, min(overlap_tokens, chunk_tokens - piece_tokens))
+            current = [(last_section, tail, True)] if tail else []
+            current_tokens = len(tail.split())
+        
+        current.append((section, piece, False))
+        current_tokens += piece_tokens
+    
+    if current:
+        flush()
+    
+    return chunks
+
+
+def chunk_documents(
+    documents: List[Dict],
+    chunk_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS
+) -> List[Dict]:
+    """
+    Split documents into heading-aware sub-document chunks.
+    
+    Markdown is split on headings, then on paragraph boundaries, and packed into
+    windows of at most chunk_tokens words with overlap_tokens words carried over
+    between consecutive chunks. Documents that already fit in one window are kept whole.
+    
+    Args:
+        documents: Documents as returned by the load_* functions
+        chunk_tokens: Maximum words per chunk
+        overlap_tokens: Words repeated from the previous chunk
+        
+    Returns:
+        List of chunk documents with parent_title, section and chunk_index metadata
+    """
+    if overlap_tokens >= chunk_tokens:
+        raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+    
+    chunked = []
+    
+    for doc in documents:
+        if len(doc['content'].split()) <= chunk_tokens:
+            pieces = [{'section': '', 'content': doc['content']}]
+        else:
+            sections = _split_markdown_sections(doc['content'])
+            pieces = _pack_sections(sections, chunk_tokens, overlap_tokens)
+        
+        for i, piece in enumerate(pieces):
+            title = doc['title']
+            if piece['section'] and len(pieces) > 1:
+                title = f"{doc['title']} - {piece['section']}"
+            
+            chunked.append({
+                'title': title,
+                'content': piece['content'],
+                'category': doc['category'],
+                'source': doc['source'],
+                'source_key': doc.get('source_key'),
+                'parent_title': doc['title'],
+                'section': piece['section'],
+                'chunk_index': i
             })
     
-    return tickets
+    return chunked
+
+
+def deduplicate_documents(documents: List[Dict], duplicate_sources: Optional[set] = None) -> List[Dict]:
+    """
+    Collapse near-duplicate documents (e.g. repeated ticket resolutions) into one.
+    
+    The first document of each near-duplicate cluster is kept as the canonical
+    one, with duplicate_count set to the number of documents merged into it.
+    
+    Args:
+        documents: Documents or chunks with 'content'
+        duplicate_sources: Set filled with (source_key, canonical source_key)
+            pairs of chunks merged into a chunk of another source
+        
+    Returns:
+        Canonical documents, in their original order
+    """
+    canonical = find_near_duplicates([doc['content'] for doc in documents])
+    
+    duplicate_counts = {}
+    for i, root in enumerate(canonical):
+        if root != i:
+            duplicate_counts[root] = duplicate_counts.get(root, 0) + 1
+            member, owner = documents[i].get('source_key'), documents[root].get('source_key')
+            if duplicate_sources is not None and member != owner:
+                duplicate_sources.add((member, owner))
+    
+    return [
+        {**doc, 'duplicate_count': duplicate_counts.get(i, 0)}
+        for i, doc in enumerate(documents)
+        if canonical[i] == i
+    ]
+
+
+def _uncompressed_result(text: str) -> Dict:
+    """Compression result that keeps text as it is (for skip_compression)."""
+    words = len(text.split())
+    return {
+        "compressed_text": text,
+        "original_tokens": words,
+        "compressed_tokens": words,
+        "compression_ratio": 1.0,
+        "original_words": words,
+        "compressed_words": words,
+        "latency_ms": 0,
+        "success": True,
+        "error": None
+    }
 
 
 def compress_and_store_documents(
     documents: List[Dict],
-    progress_callback: Optional[Callable] = None
+    progress_callback: Optional[Callable] = None,
+    max_workers: int = COMPRESSION_WORKERS,
+    use_cache: bool = True,
+    batch_size: int = BULK_BATCH_SIZE,
+    table: str = "kb_chunks",
+    skip_compression: bool = False
 ) -> tuple:
     """
     Compress documents using ScaleDown and store in database.
-    Returns (chunks, errors).
+    
+    Texts already in the compression cache (same text, target model and
+    compressor version) are not sent to ScaleDown; identical texts are
+    compressed once. Up to max_workers ScaleDown requests run at once under
+    the shared rate limit, each retried on transient failures. Results are
+    stored and progress is reported in document order; the first document
+    that still fails stops the run and cancels the requests not yet started.
+    Rows are inserted into table in transactions of batch_size rows; chunks
+    before the failing document are still stored. With skip_compression,
+    ScaleDown and the cache are bypassed and chunks keep their original text.
+    
+    Returns (chunks, errors). Each chunk's 'cache_hit' tells whether its
+    compression came from the cache (None if compression was skipped).
     """
     chunks = []
     errors = []
+    # Compress using ScaleDown with gemini-2.5-flash model and auto rate
+    target_model = "gemini-2.5-flash"
     
-    for i, doc in enumerate(documents):
-        try:
-            if progress_callback:
-                progress_callback(i, len(documents), f"Compressing: {doc['title'][:40]}...")
-            
-            # Compress using ScaleDown with gemini-2.5-flash model and auto rate
-            result = compress_text(
-                doc['content'],
-                target_model="gemini-2.5-flash"
-            )
-            
-            if not result['success']:
-                error_msg = f"Failed to compress '{doc['title']}': {result.get('error', 'Unknown error')}"
+    keys = [compression_cache.cache_key(doc['content'], target_model) for doc in documents]
+    cached = compression_cache.get_cached(keys) if use_cache and not skip_compression else {}
+    
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="scaledown")
+    pending = {}
+    for key, doc in zip(keys, documents):
+        if not skip_compression and key not in cached and key not in pending:
+            pending[key] = executor.submit(compress_text_with_retry, doc['content'], target_model)
+    fresh = {}
+    
+    # Rows already added are written even if a later document fails
+    with BulkWriter(table, KB_CHUNK_COLUMNS, batch_size) as writer:
+        for i, (doc, key) in enumerate(zip(documents, keys)):
+            try:
+                if progress_callback:
+                    progress_callback(i, len(documents), f"Compressing: {doc['title'][:40]}...")
+                
+                if key in cached:
+                    result = cached[key]
+                elif skip_compression:
+                    result = _uncompressed_result(doc['content'])
+                else:
+                    result = pending[key].result()
+                    fresh[key] = result
+                
+                if not result['success']:
+                    error_msg = f"Failed to compress '{doc['title']}': {result.get('error', 'Unknown error')}"
+                    errors.append(error_msg)
+                    # Stop on ScaleDown failure
+                    raise Exception(error_msg)
+                
+                # Create chunk
+                chunk = {
+                    'title': doc['title'],
+                    'category': doc['category'],
+                    'source': doc['source'],
+                    'source_key': doc.get('source_key'),
+                    'original_text': doc['content'],
+                    'compressed_text': result['compressed_text'],
+                    'original_tokens': result['original_tokens'],
+                    'compressed_tokens': result['compressed_tokens'],
+                    'original_words': result['original_words'],
+                    'compressed_words': result['compressed_words'],
+                    'compression_ratio': result['compression_ratio'],
+                    'latency_ms': result['latency_ms'],
+                    'parent_title': doc.get('parent_title', doc['title']),
+                    'section': doc.get('section', ''),
+                    'chunk_index': doc.get('chunk_index', 0),
+                    'duplicate_count': doc.get('duplicate_count', 0),
+                    'cache_hit': None if skip_compression else key in cached,
+                    'created_at': datetime.now().isoformat()
+                }
+                
+                chunks.append(chunk)
+                writer.add(kb_chunk_row(chunk))
+                
+            except Exception as e:
+                error_msg = f"Error processing '{doc['title']}': {str(e)}"
                 errors.append(error_msg)
-                # Stop on ScaleDown failure
+                # Stop on error, keeping what was already compressed for the next run
+                executor.shutdown(wait=False, cancel_futures=True)
+                if use_cache:
+                    compression_cache.store(fresh, target_model)
                 raise Exception(error_msg)
-            
-            # Create chunk
-            chunk = {
-                'title': doc['title'],
-                'category': doc['category'],
-                'source': doc['source'],
-                'original_text': doc['content'],
-                'compressed_text': result['compressed_text'],
-                'original_tokens': result['original_tokens'],
-                'compressed_tokens': result['compressed_tokens'],
-                'original_words': result['original_words'],
-                'compressed_words': result['compressed_words'],
-                'compression_ratio': result['compression_ratio'],
-                'latency_ms': result['latency_ms'],
-                'created_at': datetime.now().isoformat()
-            }
-            
-            chunks.append(chunk)
-            
-            # Store in database
-            conn = get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT INTO kb_chunks (
-                    source_id, title, category, text, compressed_text,
-                    raw_words, compressed_words, original_tokens, compressed_tokens,
-                    scaledown_latency_ms
+    
+    executor.shutdown()
+    if use_cache:
+        compression_cache.store(fresh, target_model)
+    return chunks, errors
+
+
+def iter_sources(
+    md_files=None,
+    csv_file=None,
+    include_existing_docs=True,
+    progress_callback: Optional[Callable] = None,
+    position: Optional[Dict] = None
+) -> Iterator[Dict]:
+    """
+    Save uploads and stream every source document of a KB build.
+    
+    Sources are the uploaded files, data/docs/ (if include_existing_docs) and
+    the uploaded tickets CSVs (csv_file is one or a list), or
+    data/resolved_tickets.csv if none was uploaded. Documents are loaded up
+    front; tickets are streamed row by row, with the read position of the
+    current CSV tracked in position (see iter_tickets_from_csv).
+    """
+    # Save uploaded files
+    if md_files or csv_file:
+        if progress_callback:
+            progress_callback(0, 100, "Saving uploaded files...")
+        saved_files = save_uploaded_files(md_files, csv_file)
+    else:
+        saved_files = {"md_files": [], "csv_files": []}
+    
+    # Load documents from uploads
+    if saved_files["md_files"]:
+        if progress_callback:
+            progress_callback(10, 100, "Loading uploaded documents...")
+        yield from load_documents_from_files(saved_files["md_files"])
+    
+    # Load documents from data/docs/
+    if include_existing_docs:
+        if progress_callback:
+            progress_callback(20, 100, "Loading existing documents...")
+        yield from load_documents_from_directory("data/docs")
+    
+    # Load tickets from CSV
+    for csv_path in saved_files["csv_files"] or ["data/resolved_tickets.csv"]:
+        if os.path.exists(csv_path):
+            if progress_callback:
+                progress_callback(30, 100, f"Loading tickets from {os.path.basename(csv_path)}...")
+            yield from iter_tickets_from_csv(csv_path, position)
+
+
+def source_fingerprint(doc: Dict, compressed: bool = True) -> str:
+    """
+    Hash of everything about a source document that ends up in its chunks.
+    
+    Sources stored uncompressed (skip_compression) get a different hash, so
+    a later run with compression sees them as changed and compresses them.
+    """
+    digest = hashlib.sha256()
+    for part in (doc['title'], doc['category'], doc['source'], doc['content']):
+        digest.update(part.encode('utf-8'))
+        digest.update(b"\0")
+    if not compressed:
+        digest.update(b"uncompressed\0")
+    return digest.hexdigest()
+
+
+def _record_sources(cursor, documents: List[Dict], table: str = "kb_sources", compressed: bool = True):
+    """Insert or update the fingerprints of source documents (kb_sources or its staging copy)."""
+    cursor.executemany(f"""
+        INSERT OR REPLACE INTO {table} (source_key, content_hash, synced_at)
+        VALUES (?, ?, {SYNC_TIMESTAMP_SQL})
+    """, [(doc['source_key'], source_fingerprint(doc, compressed)) for doc in documents])
+
+
+def _stored_fingerprints(cursor, source_keys: List[str], table: str = "kb_sources") -> Dict[str, str]:
+    """Get the stored fingerprints of the given sources that have one."""
+    stored = {}
+    for key_batch in _batched(source_keys, SQLITE_MAX_PARAMS):
+        cursor.execute(
+            f"SELECT source_key, content_hash FROM {table} WHERE source_key IN ({','.join('?' * len(key_batch))})",
+            key_batch
+        )
+        stored.update((row['source_key'], row['content_hash']) for row in cursor.fetchall())
+    return stored
+
+
+def _batched(items: Iterable, size: int) -> Iterator[List]:
+    """Split an iterable into lists of at most size items."""
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class DuplicateSources:
+    """
+    Bookkeeping of sources whose chunks were merged into chunks of another source.
+    
+    A member source of a near-duplicate cluster relies on the canonical
+    chunks of another source (stored as (source_key, canonical_key) pairs).
+    When the canonical source is re-ingested or deleted, its members lose
+    that content: members whose document is at hand are re-ingested along
+    with it, and the others are released (their fingerprint is dropped, so
+    they keep their chunks until their next sync or ingest re-ingests them).
+    """
+    
+    def __init__(self, table: str = "kb_duplicate_sources", sources_table: str = "kb_sources"):
+        self.table = table
+        self.sources_table = sources_table
+    
+    def find(self, cursor, removed_keys: List[str], is_available: Callable[[str], bool]) -> tuple:
+        """
+        Find the member sources of the clusters of sources whose chunks are removed.
+        
+        Members are followed transitively through the available ones, since
+        re-ingesting them removes their old chunks too, which affects their
+        own members.
+        
+        Returns:
+            (source_keys of available members, source_keys of the others)
+        """
+        seen = set(removed_keys)
+        available = []
+        unavailable = []
+        frontier = list(removed_keys)
+        
+        while frontier:
+            found = []
+            for key_batch in _batched(frontier, SQLITE_MAX_PARAMS):
+                cursor.execute(
+                    f"SELECT DISTINCT source_key FROM {self.table} WHERE canonical_key IN ({','.join('?' * len(key_batch))})",
+                    key_batch
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                doc['source'], chunk['title'], chunk['category'],
-                chunk['original_text'], chunk['compressed_text'],
-                chunk['original_words'], chunk['compressed_words'],
-                chunk['original_tokens'], chunk['compressed_tokens'],
-                chunk['latency_ms']
-            ))
+                found.extend(row['source_key'] for row in cursor.fetchall() if row['source_key'] not in seen)
+            found = list(dict.fromkeys(found))
+            seen.update(found)
             
-            conn.commit()
-            conn.close()
+            frontier = []
+            for key in found:
+                (frontier if is_available(key) else unavailable).append(key)
+            available.extend(frontier)
+        
+        return available, unavailable
+    
+    def members(
+        self,
+        cursor,
+        removed_keys: List[str],
+        documents: Dict[str, Dict],
+        deleted_keys: Iterable[str] = ()
+    ) -> tuple:
+        """
+        Find the sources to re-ingest along with sources whose chunks are removed.
+        
+        A member (see find) is at hand if it is in documents or is a document
+        file on disk (read now) that is not being deleted.
+        
+        Args:
+            removed_keys: Sources whose chunks are being removed
+            documents: source_key -> current document of the sources at hand
+            deleted_keys: Sources being deleted (never re-read from disk)
+        
+        Returns:
+            (member documents to re-ingest now, source_keys of released members)
+        """
+        deleted = set(deleted_keys)
+        reingest, released = self.find(
+            cursor,
+            removed_keys,
+            lambda key: key in documents or (key not in deleted and os.path.isfile(key))
+        )
+        
+        loaded = {doc['source_key']: doc for doc in load_documents_from_files([key for key in reingest if key not in documents])}
+        found_docs = [documents.get(key) or loaded.get(key) for key in reingest]
+        # Files that could not be read are released too
+        released += [key for key, doc in zip(reingest, found_docs) if doc is None]
+        return [doc for doc in found_docs if doc is not None], released
+    
+    def update(self, cursor, removed_keys: List[str], pairs: Iterable[tuple], released: List[str]):
+        """
+        Record the clusters of newly stored chunks.
+        
+        Args:
+            removed_keys: Sources whose chunks were re-ingested or deleted; their
+                old memberships (either side) are dropped
+            pairs: (source_key, canonical source_key) pairs of chunks merged
+                across sources (see deduplicate_documents)
+            released: Members released by members(); their fingerprints are dropped
+        """
+        cursor.executemany(f"DELETE FROM {self.sources_table} WHERE source_key = ?", [(key,) for key in released])
+        for key_batch in _batched(removed_keys, SQLITE_MAX_PARAMS // 2):
+            placeholders = ','.join('?' * len(key_batch))
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE source_key IN ({placeholders}) OR canonical_key IN ({placeholders})",
+                key_batch + key_batch
+            )
+        cursor.executemany(
+            f"INSERT OR IGNORE INTO {self.table} (source_key, canonical_key) VALUES (?, ?)",
+            list(pairs)
+        )
+
+
+def _chunk_ids_for_sources(cursor, source_keys: List[str], table: str = "kb_chunks") -> List[int]:
+    """Get ids of the chunk rows built from the given sources."""
+    chunk_ids = []
+    for start in range(0, len(source_keys), SQLITE_MAX_PARAMS):
+        batch = source_keys[start:start + SQLITE_MAX_PARAMS]
+        cursor.execute(
+            f"SELECT id FROM {table} WHERE source_key IN ({','.join('?' * len(batch))})",
+            batch
+        )
+        chunk_ids.extend(row['id'] for row in cursor.fetchall())
+    return chunk_ids
+
+
+def ingest_stream(
+    documents: Iterable[Dict],
+    stats: Dict,
+    batch_size: int = INGEST_BATCH_SIZE,
+    progress_callback: Optional[Callable] = None,
+    position: Optional[Dict] = None,
+    chunk_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    compression_workers: int = COMPRESSION_WORKERS,
+    upsert: bool = False,
+    chunks_table: str = "kb_chunks",
+    sources_table: str = "kb_sources",
+    duplicates_table: str = "kb_duplicate_sources",
+    skip_compression: bool = False
+) -> Iterator[Dict]:
+    """
+    Stream source documents into the KB in bounded batches.
+    
+    Each batch is chunked, deduplicated against a bounded window of earlier
+    canonical chunks, compressed, written and fingerprinted before the next
+    batch is read from documents, so memory stays flat for any input size and
+    a slow stage holds back reading (backpressure).
+    
+    Args:
+        documents: Source documents (e.g. from iter_sources)
+        stats: Dict filled with sources, unchanged, chunks_seen, chunks, chunks_removed,
+            duplicates_removed, members_released, cache_hits, cache_misses, errors,
+            seconds and rows_per_second
+        batch_size: Source documents per batch
+        progress_callback: Function(current, total, message) to call with progress
+        position: Read position of the underlying file (see iter_tickets_from_csv)
+        chunk_tokens: Maximum words per KB chunk
+        overlap_tokens: Words shared between consecutive chunks of a document
+        compression_workers: Concurrent ScaleDown requests
+        upsert: Skip sources whose fingerprint is unchanged (marking them as
+            seen) and replace the chunks of sources already stored (otherwise
+            the tables are assumed empty). Unchanged near-duplicate members of
+            a replaced source are re-ingested with it if they are in the same
+            batch or are document files; otherwise their fingerprint is
+            dropped (members_released) so their next sync or ingest
+            re-ingests them.
+        chunks_table: Table chunks are written to
+        sources_table: Table source fingerprints are written to (one
+            checkpoint per source, committed with its batch)
+        duplicates_table: Table near-duplicate memberships are written to
+        skip_compression: Store chunks uncompressed, without calling ScaleDown
+    
+    Yields:
+        Stored chunks, batch by batch
+    """
+    stats.update({
+        "sources": 0, "unchanged": 0, "chunks_seen": 0, "chunks": 0, "chunks_removed": 0,
+        "duplicates_removed": 0, "members_released": 0, "cache_hits": 0, "cache_misses": 0, "errors": [],
+        "seconds": 0.0, "rows_per_second": 0.0
+    })
+    window = NearDuplicateIndex()
+    duplicates = DuplicateSources(duplicates_table, sources_table)
+    start = time.monotonic()
+    
+    for batch in _batched(documents, batch_size):
+        stats["sources"] += len(batch)
+        
+        conn = get_connection()
+        cursor = conn.cursor()
+        old_ids = []
+        released = []
+        if upsert:
+            keys = [doc['source_key'] for doc in batch]
+            stored = _stored_fingerprints(cursor, keys, sources_table)
+            # A run skipping compression keeps sources already stored compressed
+            replaced = [
+                doc['source_key'] for doc in batch
+                if stored.get(doc['source_key']) != source_fingerprint(doc)
+                and not (skip_compression and stored.get(doc['source_key']) == source_fingerprint(doc, compressed=False))
+            ]
             
-        except Exception as e:
-            error_msg = f"Error processing '{doc['title']}': {str(e)}"
-            errors.append(error_msg)
-            # Stop on error
-            raise Exception(error_msg)
+            # Members of replaced sources' clusters lose their canonical chunks
+            members, released = duplicates.members(cursor, replaced, {doc['source_key']: doc for doc in batch})
+            batch_keys = set(keys)
+            batch = batch + [doc for doc in members if doc['source_key'] not in batch_keys]
+            replaced = set(replaced).union(doc['source_key'] for doc in members)
+            updated = [doc for doc in batch if doc['source_key'] in replaced]
+            unchanged = [doc['source_key'] for doc in batch if doc['source_key'] not in replaced]
+            stats["unchanged"] += len(unchanged)
+            stats["members_released"] += len(released)
+            cursor.executemany(
+                f"UPDATE {sources_table} SET synced_at = {SYNC_TIMESTAMP_SQL} WHERE source_key = ?",
+                [(key,) for key in unchanged]
+            )
+            conn.commit()
+            batch = updated
+            old_ids = _chunk_ids_for_sources(cursor, [doc['source_key'] for doc in batch], chunks_table)
+        conn.close()
+        
+        # Keep one chunk per near-duplicate; duplicates of earlier batches bump the stored count
+        pieces = chunk_documents(batch, chunk_tokens, overlap_tokens)
+        # Window keys are (sequence number, source_key, chunk_index); source keys may repeat
+        keys = [
+            (stats["chunks_seen"] + i, piece['source_key'], piece['chunk_index'])
+            for i, piece in enumerate(pieces)
+        ]
+        stats["chunks_seen"] += len(pieces)
+        matches = window.add_many(keys, [piece['content'] for piece in pieces])
+        canonical = {}
+        earlier = {}
+        duplicate_sources = set()
+        for key, piece, match in zip(keys, pieces, matches):
+            if match is None:
+                piece['duplicate_count'] = 0
+                canonical[key] = piece
+                continue
+            if match in canonical:
+                canonical[match]['duplicate_count'] += 1
+            else:
+                earlier[match] = earlier.get(match, 0) + 1
+            if match[1] != key[1]:
+                duplicate_sources.add((key[1], match[1]))
+        stats["duplicates_removed"] += len(pieces) - len(canonical)
+        
+        # Progress within the run: share of the input file read so far, if known
+        done = position['bytes'] / position['total'] if position and position.get('total') else 0.0
+        percent = 40 + int(done * 40)
+        
+        def batch_progress(current, total, message):
+            if progress_callback:
+                progress_callback(percent, 100, message)
+        
+        chunks, compress_errors = compress_and_store_documents(
+            list(canonical.values()),
+            progress_callback=batch_progress,
+            max_workers=compression_workers,
+            table=chunks_table,
+            skip_compression=skip_compression
+        )
+        stats["errors"].extend(compress_errors)
+        
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.executemany(
+            f"UPDATE {chunks_table} SET duplicate_count = duplicate_count + ? WHERE source_key = ? AND chunk_index = ?",
+            [(count, key[1], key[2]) for key, count in earlier.items()]
+        )
+        cursor.executemany(f"DELETE FROM {chunks_table} WHERE id = ?", [(chunk_id,) for chunk_id in old_ids])
+        # Released members keep their chunks until they are re-ingested
+        duplicates.update(cursor, [doc['source_key'] for doc in batch] if upsert else [], duplicate_sources, released)
+        _record_sources(cursor, batch, sources_table, compressed=not skip_compression)
+        conn.commit()
+        conn.close()
+        
+        stats["chunks"] += len(chunks)
+        stats["chunks_removed"] += len(old_ids)
+        stats["cache_hits"] += sum(1 for chunk in chunks if chunk['cache_hit'])
+        stats["cache_misses"] += sum(1 for chunk in chunks if chunk['cache_hit'] is False)
+        stats["seconds"] = time.monotonic() - start
+        stats["rows_per_second"] = stats["sources"] / stats["seconds"] if stats["seconds"] else 0.0
+        if progress_callback:
+            progress_callback(
+                percent, 100,
+                f"Ingested {stats['sources']:,} sources into {stats['chunks']:,} chunks "
+                f"({stats['rows_per_second']:,.0f} rows/s)"
+            )
+        
+        yield from chunks
+
+
+def _cache_summary(stats: Dict) -> Dict:
+    """Compression cache hits, misses and hit rate of an ingest run (chunks stored uncompressed are skipped)."""
+    looked_up = stats["cache_hits"] + stats["cache_misses"]
+    return {
+        "hits": stats["cache_hits"],
+        "misses": stats["cache_misses"],
+        "skipped": stats["chunks"] - looked_up,
+        "hit_rate": stats["cache_hits"] / looked_up if looked_up else 0.0
+    }
+
+
+def _ingest_upsert(
+    sources: Iterable[Dict],
+    position: Optional[Dict],
+    batch_size: int,
+    progress_callback: Optional[Callable],
+    chunk_tokens: int,
+    overlap_tokens: int,
+    compression_workers: int,
+    skip_compression: bool,
+    update_index: bool
+) -> Dict:
+    """Stream sources into the existing KB (see ingest_tickets_csv)."""
+    stats = {}
     
-    return chunks, errors
+    try:
+        for _ in ingest_stream(
+            sources,
+            stats,
+            batch_size=batch_size,
+            progress_callback=progress_callback,
+            position=position,
+            chunk_tokens=chunk_tokens,
+            overlap_tokens=overlap_tokens,
+            compression_workers=compression_workers,
+            upsert=True,
+            skip_compression=skip_compression
+        ):
+            pass
+        
+        if stats["chunks"] or stats["chunks_removed"]:
+            invalidate_artifact(ARTIFACT_PATH)
+        
+        # Publish a new index generation; running retrievers swap to it
+        generation = None
+        changed = stats["chunks"] or stats["chunks_removed"] or get_active_generation() is None
+        if update_index and changed:
+            if progress_callback:
+                progress_callback(90, 100, "Building retrieval index...")
+            generation = get_retriever().build_index(load_chunks_from_db())
+        
+        if progress_callback:
+            progress_callback(100, 100, "Complete!")
+        
+        return {
+            "success": True,
+            "documents_count": stats["sources"],
+            "unchanged": stats["unchanged"],
+            "chunks_count": stats["chunks"],
+            "chunks_removed": stats["chunks_removed"],
+            "duplicates_removed": stats["duplicates_removed"],
+            "compression_cache": _cache_summary(stats),
+            "rows_per_second": stats["rows_per_second"],
+            "generation": generation,
+            "errors": stats["errors"]
+        }
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "chunks_count": stats.get("chunks", 0),
+            "errors": stats.get("errors", []) + [str(e)]
+        }
 
 
-def save_chunks_to_json(chunks: List[Dict], filepath: str = "storage/kb_chunks.json"):
-    """Save chunks to JSON file."""
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+def ingest_tickets_csv(
+    csv_path: str,
+    batch_size: int = INGEST_BATCH_SIZE,
+    progress_callback: Optional[Callable] = None,
+    chunk_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    compression_workers: int = COMPRESSION_WORKERS,
+    skip_compression: bool = False,
+    update_index: bool = True
+) -> Dict:
+    """
+    Stream a (possibly very large) tickets CSV into the existing KB.
+    
+    New and changed tickets are added or replace their previous chunks;
+    unchanged tickets are skipped. Tickets missing from the file are kept
+    (use sync_kb_index to also apply deletions). The retrieval index is
+    rebuilt once after the stream if anything changed: folding every batch
+    into the index would merge a new generation every MAX_DELTA_CHUNKS chunks.
     
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(chunks, f, indent=2, ensure_ascii=False)
+    Args:
+        skip_compression: Store chunks uncompressed, without calling ScaleDown
+        update_index: Rebuild the retrieval index afterwards (off to ingest
+            several inputs and build the index once)
+        Others as rebuild_kb_index
+    
+    Returns:
+        Dict with success, documents_count, unchanged, chunks_count,
+        chunks_removed, duplicates_removed, compression_cache,
+        rows_per_second, generation, errors
+    """
+    position = {}
+    return _ingest_upsert(
+        iter_tickets_from_csv(csv_path, position), position, batch_size, progress_callback,
+        chunk_tokens, overlap_tokens, compression_workers, skip_compression, update_index
+    )
 
 
-def build_tfidf_index(chunks: List[Dict]) -> tuple:
-    """Build TF-IDF index from chunks."""
-    from sklearn.feature_extraction.text import TfidfVectorizer
+def ingest_documents(
+    paths: List[str],
+    batch_size: int = INGEST_BATCH_SIZE,
+    progress_callback: Optional[Callable] = None,
+    chunk_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    compression_workers: int = COMPRESSION_WORKERS,
+    skip_compression: bool = False,
+    update_index: bool = True
+) -> Dict:
+    """
+    Ingest .md/.txt documents (files, or every document of a directory) into the existing KB.
     
-    if not chunks:
-        return None, None
+    Works like ingest_tickets_csv: new and changed documents are added or
+    replace their previous chunks, unchanged ones are skipped.
     
-    # Combine title and compressed text for indexing
-    texts = [f"{chunk['title']} {chunk['compressed_text']}" for chunk in chunks]
+    Returns:
+        Same as ingest_tickets_csv
+    """
+    def documents():
+        for path in paths:
+            if os.path.isdir(path):
+                yield from load_documents_from_directory(path)
+            else:
+                yield from load_documents_from_files([path])
     
-    # Create TF-IDF vectorizer
-    vectorizer = TfidfVectorizer(
-        max_features=1000,
-        stop_words='english',
-        ngram_range=(1, 2)
+    return _ingest_upsert(
+        documents(), None, batch_size, progress_callback,
+        chunk_tokens, overlap_tokens, compression_workers, skip_compression, update_index
     )
+
+
+def _begin_rebuild(settings: str) -> Dict:
+    """
+    Start or resume a staged rebuild.
+    
+    A rebuild left unfinished with the same settings is resumed: its staged
+    sources are kept as checkpoints. Otherwise the staging tables are cleared.
+    
+    Returns:
+        Dict with attempts and started_at (millisecond timestamp of this attempt)
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT settings, attempts FROM kb_rebuild_state WHERE id = 1")
+    row = cursor.fetchone()
+    
+    if row and row['settings'] == settings:
+        cursor.execute(f"""
+            UPDATE kb_rebuild_state
+            SET attempts = attempts + 1, started_at = {SYNC_TIMESTAMP_SQL}
+            WHERE id = 1
+        """)
+    else:
+        cursor.execute("DELETE FROM kb_chunks_staging")
+        cursor.execute("DELETE FROM kb_sources_staging")
+        cursor.execute("DELETE FROM kb_duplicate_sources_staging")
+        cursor.execute("DELETE FROM kb_rebuild_state")
+        cursor.execute(f"""
+            INSERT INTO kb_rebuild_state (id, settings, attempts, started_at)
+            VALUES (1, ?, 1, {SYNC_TIMESTAMP_SQL})
+        """, (settings,))
+    conn.commit()
     
-    # Fit and transform
-    tfidf_matrix = vectorizer.fit_transform(texts)
+    cursor.execute("SELECT attempts, started_at FROM kb_rebuild_state WHERE id = 1")
+    state = dict(cursor.fetchone())
+    conn.close()
+    return state
+
+
+def _prune_staging(started_at: str) -> int:
+    """
+    Drop staged sources not seen by the current attempt, and chunks without a checkpoint.
+    
+    Near-duplicate members of dropped sources are dropped too, since their
+    content was merged into the dropped chunks; the next sync re-ingests them.
+    
+    Returns:
+        Number of staged chunks left
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    while True:
+        cursor.execute("""
+            DELETE FROM kb_sources_staging
+            WHERE synced_at >= ? AND source_key IN (
+                SELECT source_key FROM kb_duplicate_sources_staging
+                WHERE canonical_key NOT IN (
+                    SELECT source_key FROM kb_sources_staging WHERE synced_at >= ?
+                )
+            )
+        """, (started_at, started_at))
+        if not cursor.rowcount:
+            break
+    cursor.execute("""
+        DELETE FROM kb_chunks_staging
+        WHERE source_key NOT IN (
+            SELECT source_key FROM kb_sources_staging WHERE synced_at >= ?
+        )
+    """, (started_at,))
+    cursor.execute("DELETE FROM kb_sources_staging WHERE synced_at < ?", (started_at,))
+    cursor.execute("""
+        DELETE FROM kb_duplicate_sources_staging
+        WHERE source_key NOT IN (SELECT source_key FROM kb_sources_staging)
+           OR canonical_key NOT IN (SELECT source_key FROM kb_sources_staging)
+    """)
+    conn.commit()
     
-    return vectorizer, tfidf_matrix
+    cursor.execute("SELECT COUNT(*) FROM kb_chunks_staging")
+    staged = cursor.fetchone()[0]
+    conn.close()
+    return staged
 
 
-def save_tfidf_index(vectorizer, tfidf_matrix):
-    """Save TF-IDF index to disk."""
-    os.makedirs("storage", exist_ok=True)
+def _last_live_id(cursor) -> int:
+    """Highest kb_chunks id ever assigned; staged ids are shifted past it so ids are never reused."""
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'kb_chunks'")
+    row = cursor.fetchone()
+    if row:
+        return row['seq']
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM kb_chunks")
+    return cursor.fetchone()[0]
+
+
+def _swap_staging(last_live_id: int, offset: int, guard: Optional[Callable] = None) -> Callable:
+    """
+    Get a publish_with callback that replaces the live KB with the staged one.
     
-    with open("storage/tfidf_vectorizer.pkl", 'wb') as f:
-        pickle.dump(vectorizer, f)
+    It runs in the transaction activating the new index generation, so
+    readers see either the old KB and index or the new ones.
     
-    with open("storage/tfidf_matrix.pkl", 'wb') as f:
-        pickle.dump(tfidf_matrix, f)
+    Args:
+        last_live_id: _last_live_id() the staged ids were shifted against
+        offset: Added to staged ids to get their kb_chunks ids
+        guard: Function(cursor) that raises if the swap must not happen
+    """
+    columns = ", ".join(KB_CHUNK_COLUMNS)
+    
+    def swap(cursor):
+        # The first write takes the database write lock, so the checks below
+        # cannot be invalidated before the transaction commits
+        cursor.execute("DELETE FROM kb_chunks")
+        if _last_live_id(cursor) != last_live_id:
+            raise RuntimeError("kb_chunks changed during the rebuild; run it again")
+        if guard:
+            guard(cursor)
+        cursor.execute(f"""
+            INSERT INTO kb_chunks (id, {columns}, created_at)
+            SELECT id + ?, {columns}, created_at FROM kb_chunks_staging
+        """, (offset,))
+        cursor.execute("DELETE FROM kb_sources")
+        cursor.execute("""
+            INSERT INTO kb_sources (source_key, content_hash, synced_at)
+            SELECT source_key, content_hash, synced_at FROM kb_sources_staging
+        """)
+        cursor.execute("DELETE FROM kb_duplicate_sources")
+        cursor.execute("""
+            INSERT INTO kb_duplicate_sources (source_key, canonical_key)
+            SELECT source_key, canonical_key FROM kb_duplicate_sources_staging
+        """)
+        cursor.execute("DELETE FROM kb_chunks_staging")
+        cursor.execute("DELETE FROM kb_sources_staging")
+        cursor.execute("DELETE FROM kb_duplicate_sources_staging")
+        cursor.execute("DELETE FROM kb_rebuild_state")
+    
+    return swap
+
+
+def iter_kb_chunks(batch_size: int = BULK_BATCH_SIZE, table: str = "kb_chunks", id_offset: int = 0) -> Iterator[Dict]:
+    """
+    Stream chunk rows as artifact records (see kb_artifact).
+    
+    Args:
+        batch_size: Rows read per query
+        table: Table to read (kb_chunks, or kb_chunks_staging during a rebuild)
+        id_offset: Added to every id (staged rows get their live ids when swapped in)
+    """
+    last_id = 0
+    while True:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM {table} WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size))
+        rows = cursor.fetchall()
+        conn.close()
+        if not rows:
+            return
+        
+        for row in rows:
+            yield {
+                'id': row['id'] + id_offset,
+                'title': row['title'],
+                'category': row['category'],
+                'source': row['source_id'],
+                'source_key': row['source_key'],
+                'original_text': row['text'],
+                'compressed_text': row['compressed_text'],
+                'original_tokens': row['original_tokens'],
+                'compressed_tokens': row['compressed_tokens'],
+                'original_words': row['raw_words'],
+                'compressed_words': row['compressed_words'],
+                'compression_ratio': row['original_tokens'] / max(row['compressed_tokens'], 1),
+                'latency_ms': row['scaledown_latency_ms'],
+                'parent_title': row['parent_title'],
+                'section': row['section'],
+                'chunk_index': row['chunk_index'],
+                'duplicate_count': row['duplicate_count'],
+                'created_at': row['created_at']
+            }
+        last_id = rows[-1]['id']
 
 
 def rebuild_kb_index(
     md_files=None,
     csv_file=None,
     include_existing_docs=True,
-    progress_callback: Optional[Callable] = None
+    progress_callback: Optional[Callable] = None,
+    chunk_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    compression_workers: int = COMPRESSION_WORKERS,
+    batch_size: int = INGEST_BATCH_SIZE,
+    stats: Optional[Dict] = None,
+    skip_compression: bool = False,
+    publish_guard: Optional[Callable] = None
 ) -> Dict:
     """
     Rebuild entire KB index.
     
+    Sources are streamed through chunking, near-duplicate removal,
+    compression and the staging tables in batches of batch_size documents;
+    the live KB keeps serving queries meanwhile. Each source is checkpointed
+    with its batch, so a failed rebuild run again with the same chunk
+    settings resumes where it stopped. When every source is staged, the new
+    index generation and the staged tables are published in one transaction.
+    
     Args:
         md_files: List of uploaded markdown/text files
-        csv_file: Uploaded CSV file with resolved tickets
+        csv_file: Uploaded CSV file with resolved tickets (or a list of them)
         include_existing_docs: Whether to include docs from data/docs/
         progress_callback: Function(current, total, message) to call with progress
+        chunk_tokens: Maximum words per KB chunk
+        overlap_tokens: Words shared between consecutive chunks of a document
+        compression_workers: Concurrent ScaleDown requests
+        batch_size: Source documents per ingest batch
+        stats: Dict updated in place with running ingest counters (see
+            ingest_stream), for callers reporting throughput
+        skip_compression: Store chunks uncompressed, without calling ScaleDown
+        publish_guard: Function(cursor) run in the publishing transaction; if
+            it raises, the rebuild is not published (e.g. a job run that was
+            taken over by another worker)
     
     Returns:
-        Dict with success, chunks_count, errors
+        Dict with success, documents_count, chunks_count, duplicates_removed,
+        compression_cache (hits, misses, hit_rate), rows_per_second,
+        generation, resumed, attempts, sources_skipped, errors
     """
-    all_documents = []
-    errors = []
+    stats = {} if stats is None else stats
+    position = {}
     
     try:
-        # Save uploaded files
+        sources = iter_sources(md_files, csv_file, include_existing_docs, progress_callback, position)
+        first = next(sources, None)
+        
+        if first is None:
+            return {
+                "success": False,
+                "error": "No documents found to process",
+                "chunks_count": 0,
+                "errors": []
+            }
+        
+        settings = json.dumps(
+            {"chunk_tokens": chunk_tokens, "overlap_tokens": overlap_tokens, "skip_compression": skip_compression},
+            sort_keys=True
+        )
+        state = _begin_rebuild(settings)
+        if progress_callback:
+            message = f"Resuming rebuild (attempt {state['attempts']})..." if state['attempts'] > 1 else "Staging new KB..."
+            progress_callback(35, 100, message)
+        
+        # Chunk, deduplicate, compress and stage in bounded batches;
+        # sources already staged by an earlier attempt are skipped
+        if progress_callback:
+            progress_callback(40, 100, "Compressing documents...")
+        for _ in ingest_stream(
+            itertools.chain([first], sources),
+            stats,
+            batch_size=batch_size,
+            progress_callback=progress_callback,
+            position=position,
+            chunk_tokens=chunk_tokens,
+            overlap_tokens=overlap_tokens,
+            compression_workers=compression_workers,
+            upsert=True,
+            chunks_table="kb_chunks_staging",
+            sources_table="kb_sources_staging",
+            duplicates_table="kb_duplicate_sources_staging",
+            skip_compression=skip_compression
+        ):
+            pass
+        
+        staged = _prune_staging(state['started_at'])
+        if not staged:
+            return {
+                "success": False,
+                "error": "No chunks created. Check errors.",
+                "chunks_count": 0,
+                "errors": stats["errors"]
+            }
+        
+        # Publish a new index generation together with the staged tables;
+        # running retrievers swap to it
+        if progress_callback:
+            progress_callback(90, 100, "Building retrieval index...")
+        conn = get_connection()
+        cursor = conn.cursor()
+        last_live_id = _last_live_id(cursor)
+        cursor.execute("SELECT MIN(id) FROM kb_chunks_staging")
+        offset = last_live_id - cursor.fetchone()[0] + 1
+        conn.close()
+        
+        # Stream the staged chunks (with their live ids) into a staging artifact
+        # and build the generation from it; the artifact goes live with it
+        staged_artifact = staging_artifact_path(ARTIFACT_PATH)
+        try:
+            write_artifact(iter_kb_chunks(table="kb_chunks_staging", id_offset=offset), staged_artifact)
+            generation = build_index_from_artifact(
+                staged_artifact,
+                get_retriever(),
+                publish_with=_swap_staging(last_live_id, offset, publish_guard)
+            )
+        except BaseException:
+            if os.path.exists(staged_artifact):
+                os.remove(staged_artifact)
+            raise
+        os.replace(staged_artifact, ARTIFACT_PATH)
+        
+        if progress_callback:
+            progress_callback(100, 100, "Complete!")
+        
+        return {
+            "success": True,
+            "documents_count": stats["sources"],
+            "chunks_count": staged,
+            "duplicates_removed": stats["duplicates_removed"],
+            "compression_cache": _cache_summary(stats),
+            "rows_per_second": stats["rows_per_second"],
+            "generation": generation,
+            "resumed": state['attempts'] > 1,
+            "attempts": state['attempts'],
+            "sources_skipped": stats["unchanged"],
+            "errors": stats["errors"]
+        }
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "chunks_count": 0,
+            "errors": stats.get("errors", []) + [str(e)]
+        }
+
+
+def sync_kb_index(
+    md_files=None,
+    csv_file=None,
+    include_existing_docs=True,
+    progress_callback: Optional[Callable] = None,
+    chunk_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    compression_workers: int = COMPRESSION_WORKERS
+) -> Dict:
+    """
+    Incrementally sync the KB with its sources.
+    
+    Sources are streamed (see iter_sources) and each one (a document file
+    path, or a ticket id of the tickets CSV) is fingerprinted and compared
+    with the fingerprint stored by the last rebuild or sync as it is read, so
+    only new and changed sources are held in memory. Sources stored before
+    but no longer present are deleted. Unchanged near-duplicate members of
+    changed or deleted sources that are not document files (tickets) are
+    picked up in a second pass over the sources. See sync_kb_sources.
+    
+    Args:
+        Same as rebuild_kb_index
+    
+    Returns:
+        Same as sync_kb_sources
+    """
+    try:
+        # Save uploads once, so the sources can be streamed again from the saved paths
         if md_files or csv_file:
-            if progress_callback:
-                progress_callback(0, 100, "Saving uploaded files...")
             saved_files = save_uploaded_files(md_files, csv_file)
         else:
-            saved_files = {"md_files": [], "csv_file": None}
+            saved_files = {"md_files": [], "csv_files": []}
         
-        # Load documents from uploads
-        if saved_files["md_files"]:
-            if progress_callback:
-                progress_callback(10, 100, "Loading uploaded documents...")
-            uploaded_docs = load_documents_from_files(saved_files["md_files"])
-            all_documents.extend(uploaded_docs)
-        
-        # Load documents from data/docs/
-        if include_existing_docs:
-            if progress_callback:
-                progress_callback(20, 100, "Loading existing documents...")
-            existing_docs = load_documents_from_directory("data/docs")
-            all_documents.extend(existing_docs)
+        def sources():
+            return iter_sources(saved_files["md_files"], saved_files["csv_files"], include_existing_docs, progress_callback)
         
-        # Load tickets from CSV
-        csv_path = saved_files["csv_file"] if saved_files["csv_file"] else "data/resolved_tickets.csv"
-        if os.path.exists(csv_path):
-            if progress_callback:
-                progress_callback(30, 100, "Loading tickets...")
-            tickets = load_tickets_from_csv(csv_path)
-            all_documents.extend(tickets)
+        conn = get_connection()
+        cursor = conn.cursor()
+        seen = set()
+        updated = []
+        unchanged = 0
+        for batch in _batched(sources(), SQLITE_MAX_PARAMS):
+            stored = _stored_fingerprints(cursor, [doc['source_key'] for doc in batch])
+            for doc in batch:
+                seen.add(doc['source_key'])
+                if stored.get(doc['source_key']) == source_fingerprint(doc):
+                    unchanged += 1
+                else:
+                    updated.append(doc)
         
-        if not all_documents:
+        if not seen:
+            conn.close()
             return {
                 "success": False,
                 "error": "No documents found to process",
@@ -320,60 +1450,217 @@ def rebuild_kb_index(
                 "errors": []
             }
         
-        # Clear existing KB
+        cursor.execute("SELECT source_key FROM kb_sources")
+        deleted = [row['source_key'] for row in cursor.fetchall() if row['source_key'] not in seen]
+        
+        # sync_kb_sources reads member document files itself; other members are re-read here
+        updated_keys = {doc['source_key'] for doc in updated}
+        members, _ = DuplicateSources().find(
+            cursor,
+            list(updated_keys) + deleted,
+            lambda key: key in seen or os.path.isfile(key)
+        )
+        conn.close()
+        wanted = {key for key in members if key in seen and key not in updated_keys and not os.path.isfile(key)}
+        member_docs = [doc for doc in sources() if doc['source_key'] in wanted] if wanted else []
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "chunks_count": 0,
+            "errors": [str(e)]
+        }
+    
+    result = sync_kb_sources(
+        updated + member_docs,
+        deleted,
+        progress_callback=progress_callback,
+        chunk_tokens=chunk_tokens,
+        overlap_tokens=overlap_tokens,
+        compression_workers=compression_workers
+    )
+    if result["success"]:
+        # Members re-read in the second pass are counted as re-ingested
+        result["unchanged"] += unchanged - len(member_docs)
+    return result
+
+
+def sync_kb_sources(
+    documents: List[Dict],
+    deleted_keys: Optional[List[str]] = None,
+    progress_callback: Optional[Callable] = None,
+    chunk_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+    compression_workers: int = COMPRESSION_WORKERS,
+    publish: bool = False
+) -> Dict:
+    """
+    Apply changes of some sources to the KB and the live index.
+    
+    Only the given sources are looked at: documents whose fingerprint differs
+    from the stored one (or that are new) are chunked, compressed and
+    inserted, and the chunks of their old versions and of deleted_keys are
+    removed. The same additions and removals are applied to this process's
+    retriever, which serves them right away from its delta segment; they
+    reach other processes once the delta is merged into a new generation
+    (past MAX_DELTA_CHUNKS) or the background refit publishes one.
+    
+    Near-duplicates are only merged among the added and changed sources;
+    a full rebuild re-clusters the whole KB. Sources whose chunks were merged
+    into chunks of a changed or deleted source are re-ingested with it, from
+    documents or (for document files) from disk; others have their
+    fingerprint dropped, keeping their chunks until their next sync
+    re-ingests them (members_pending).
+    
+    Args:
+        documents: Current versions of the sources to check (with source_key)
+        deleted_keys: source_keys of sources that no longer exist
+        progress_callback: Function(current, total, message) to call with progress
+        chunk_tokens: Maximum words per KB chunk
+        overlap_tokens: Words shared between consecutive chunks of a document
+        compression_workers: Concurrent ScaleDown requests
+        publish: Merge the changes into a new generation right away, for
+            processes that do not serve queries themselves
+    
+    Returns:
+        Dict with success, added, changed, deleted, reingested, members_pending,
+        unchanged (source counts), chunks_added, chunks_removed,
+        duplicates_removed, compression_cache, generation, errors
+    """
+    errors = []
+    
+    try:
+        # Diff source fingerprints against the last rebuild or sync
+        if progress_callback:
+            progress_callback(35, 100, "Comparing source fingerprints...")
+        current = {doc['source_key']: doc for doc in documents}
+        
+        conn = get_connection()
+        stored = _stored_fingerprints(conn.cursor(), list(current) + list(deleted_keys or []))
+        conn.close()
+        
+        added = [key for key in current if key not in stored]
+        changed = [key for key in current if key in stored and stored[key] != source_fingerprint(current[key])]
+        deleted = [key for key in dict.fromkeys(deleted_keys or []) if key in stored and key not in current]
+        
+        # Near-duplicate members of changed and deleted sources lose their canonical chunks
+        duplicates = DuplicateSources()
+        conn = get_connection()
+        members, pending = duplicates.members(conn.cursor(), added + changed + deleted, current, deleted)
+        conn.close()
+        reingested = [doc['source_key'] for doc in members]
+        unchanged = len(current) - len(added) - len(changed) - sum(1 for key in reingested if key in current)
+        current.update((doc['source_key'], doc) for doc in members)
+        
+        result = {
+            "success": True,
+            "added": len(added),
+            "changed": len(changed),
+            "deleted": len(deleted),
+            "reingested": len(reingested),
+            "members_pending": len(pending),
+            "unchanged": unchanged,
+            "chunks_added": 0,
+            "chunks_removed": 0,
+            "duplicates_removed": 0,
+            "generation": None,
+            "errors": errors
+        }
+        if not (added or changed or deleted):
+            if progress_callback:
+                progress_callback(100, 100, "KB is up to date")
+            return result
+        
+        # Chunk and deduplicate only the new versions of sources
         if progress_callback:
-            progress_callback(40, 100, "Clearing existing KB...")
+            progress_callback(38, 100, "Chunking changed documents...")
+        updated_keys = added + changed + reingested
+        updated = [current[key] for key in updated_keys]
+        new_chunks = chunk_documents(updated, chunk_tokens, overlap_tokens)
+        chunked_count = len(new_chunks)
+        duplicate_sources = set()
+        new_chunks = deduplicate_documents(new_chunks, duplicate_sources)
+        result["duplicates_removed"] = chunked_count - len(new_chunks)
+        
         conn = get_connection()
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM kb_chunks")
-        conn.commit()
+        # Added sources may still have chunks if their fingerprint was dropped as a pending member
+        old_ids = _chunk_ids_for_sources(cursor, updated_keys + deleted)
+        cursor.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM kb_chunks")
+        max_id = cursor.fetchone()['max_id']
         conn.close()
         
-        # Compress and store documents
+        # Insert new chunks first; old ones are only removed once all new ones are stored
         if progress_callback:
-            progress_callback(50, 100, "Compressing documents...")
+            progress_callback(40, 100, f"Compressing {len(new_chunks)} chunks...")
         
         def compress_progress(current, total, message):
-            # Map compression progress to 50-80% range
-            progress = 50 + int((current / total) * 30)
+            # Map compression progress to 40-80% range
+            progress = 40 + int((current / total) * 40)
             if progress_callback:
                 progress_callback(progress, 100, message)
         
-        chunks, compress_errors = compress_and_store_documents(
-            all_documents,
-            progress_callback=compress_progress
-        )
+        try:
+            chunks, compress_errors = compress_and_store_documents(
+                new_chunks,
+                progress_callback=compress_progress,
+                max_workers=compression_workers
+            )
+        except Exception:
+            # Roll back the chunks this sync already inserted
+            conn = get_connection()
+            conn.execute("DELETE FROM kb_chunks WHERE id > ?", (max_id,))
+            conn.commit()
+            conn.close()
+            raise
         errors.extend(compress_errors)
         
-        if not chunks:
-            return {
-                "success": False,
-                "error": "No chunks created. Check errors.",
-                "chunks_count": 0,
-                "errors": errors
-            }
-        
-        # Save chunks to JSON
         if progress_callback:
-            progress_callback(80, 100, "Saving chunks to JSON...")
-        save_chunks_to_json(chunks, "storage/kb_chunks.json")
+            progress_callback(80, 100, "Removing outdated chunks...")
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.executemany("DELETE FROM kb_chunks WHERE id = ?", [(chunk_id,) for chunk_id in old_ids])
+        # Pending members keep their chunks until their next sync re-ingests them
+        cursor.executemany("DELETE FROM kb_sources WHERE source_key = ?", [(key,) for key in deleted])
+        duplicates.update(cursor, updated_keys + deleted, duplicate_sources, pending)
+        _record_sources(cursor, updated)
+        conn.commit()
+        conn.close()
+        if chunks or old_ids:
+            invalidate_artifact(ARTIFACT_PATH)
         
-        # Build and save TF-IDF index
-        if progress_callback:
-            progress_callback(90, 100, "Building TF-IDF index...")
-        vectorizer, tfidf_matrix = build_tfidf_index(chunks)
+        cache_hits = sum(1 for chunk in chunks if chunk['cache_hit'])
+        result.update({
+            "chunks_added": len(chunks),
+            "chunks_removed": len(old_ids),
+            "compression_cache": {
+                "hits": cache_hits,
+                "misses": len(chunks) - cache_hits,
+                "hit_rate": cache_hits / len(chunks) if chunks else 0.0
+            }
+        })
         
-        if vectorizer and tfidf_matrix is not None:
-            save_tfidf_index(vectorizer, tfidf_matrix)
+        # Apply the same changes to the served index
+        if progress_callback:
+            progress_callback(90, 100, "Updating retrieval index...")
+        retriever = get_retriever()
+        if get_active_generation() is None:
+            result["generation"] = retriever.build_index(load_chunks_from_db())
+        else:
+            # Sharded retrievers publish through their local retriever
+            index = getattr(retriever, 'local', retriever)
+            index.remove_chunks(old_ids)
+            index.add_chunks(load_chunks_from_db(source_keys=updated_keys))
+            # Shard workers only serve published generations, not deltas
+            if publish or index is not retriever:
+                index.merge_segments()
+            result["generation"] = index.generation
         
         if progress_callback:
             progress_callback(100, 100, "Complete!")
         
-        return {
-            "success": True,
-            "chunks_count": len(chunks),
-            "errors": errors
-        }
+        return result
         
     except Exception as e:
         return {
@@ -395,6 +1682,7 @@ def get_kb_stats() -> Dict:
             COUNT(DISTINCT category) as total_categories,
             SUM(original_tokens) as total_original_tokens,
             SUM(compressed_tokens) as total_compressed_tokens,
+            SUM(duplicate_count) as total_duplicates,
             AVG(CAST(original_tokens AS FLOAT) / CAST(compressed_tokens AS FLOAT)) as avg_compression_ratio
         FROM kb_chunks
     """)
@@ -0,0 +1,243 @@
+"""
+Watcher for KB documents.
+Polls data/docs for added, modified and deleted .md/.txt files, waits until
+edits settle (debounce), then syncs only those files into the KB and the live
+retrieval index, so a doc edit is searchable within seconds without a rebuild.
+Inside the app the changes are served from the retriever's delta segment; a
+standalone watcher publishes a new index generation per sync instead.
+
+Usage:
+    python -m src.kb_watcher                 # watch data/docs until interrupted
+    python -m src.kb_watcher --dir my/docs   # watch another directory
+
+Set KB_WATCH_DOCS=1 to run the watcher inside the Streamlit app instead.
+"""
+
+import os
+import time
+import argparse
+import threading
+from typing import List, Dict, Optional, Tuple
+from src.database import get_connection, init_database
+from src.kb_jobs import get_active_jobs
+from src.kb_pipeline import load_documents_from_files, sync_kb_sources
+
+
+WATCH_DIR = "data/docs"
+WATCH_EXTENSIONS = ('.md', '.txt')
+
+# Start a watcher thread inside the Streamlit app
+WATCH_DOCS = os.getenv("KB_WATCH_DOCS", "").lower() in ("1", "true", "yes")
+
+# Seconds between directory scans
+WATCH_POLL_SECONDS = float(os.getenv("KB_WATCH_POLL_SECONDS", "1.0"))
+
+# Changes are synced once no further change was seen for this long...
+WATCH_DEBOUNCE_SECONDS = float(os.getenv("KB_WATCH_DEBOUNCE_SECONDS", "2.0"))
+
+# ...or at the latest this long after the first pending change
+WATCH_MAX_DELAY_SECONDS = 30.0
+
+# Wait before retrying a failed sync (e.g. ScaleDown unavailable)
+WATCH_RETRY_SECONDS = 30.0
+
+
+def scan_directory(directory: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Get the watched files of a directory.
+    
+    Returns:
+        Dict of normalized file path (the documents' source_key) -> (mtime_ns, size)
+    """
+    files = {}
+    if not os.path.isdir(directory):
+        return files
+    
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith(WATCH_EXTENSIONS):
+            stat = entry.stat()
+            files[os.path.normpath(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def diff_scans(old: Dict, new: Dict) -> Tuple[List[str], List[str]]:
+    """
+    Compare two scans.
+    
+    Returns:
+        (added or modified paths, deleted paths)
+    """
+    changed = [path for path, stat in new.items() if old.get(path) != stat]
+    deleted = [path for path in old if path not in new]
+    return changed, deleted
+
+
+class DocsWatcher(threading.Thread):
+    """
+    Daemon thread syncing a directory of KB documents incrementally.
+    
+    Change events are batched: a sync runs once the directory has been quiet
+    for debounce_seconds (or max_delay_seconds after the first change) and
+    covers every file changed or deleted since the last sync. Syncs wait while
+    a KB rebuild job is queued or running, since a rebuild reads the
+    directory itself. With publish, every sync is merged into a new index
+    generation (see sync_kb_sources), for watchers running outside the app.
+    """
+    
+    def __init__(
+        self,
+        directory: str = WATCH_DIR,
+        poll_seconds: float = WATCH_POLL_SECONDS,
+        debounce_seconds: float = WATCH_DEBOUNCE_SECONDS,
+        max_delay_seconds: float = WATCH_MAX_DELAY_SECONDS,
+        publish: bool = False
+    ):
+        super().__init__(name="kb-docs-watcher", daemon=True)
+        self.directory = directory
+        self.publish = publish
+        self.poll_seconds = poll_seconds
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.files = {}
+        # Pending path -> True if it exists (sync it), False if deleted
+        self.pending = {}
+        self.first_change = None
+        self.last_change = None
+        self.retry_at = 0.0
+        self.last_result = None
+        self._stop_event = threading.Event()
+    
+    def poll(self) -> Optional[Dict]:
+        """
+        Scan once and sync pending changes if they have settled.
+        
+        Returns:
+            The sync result if a sync ran, else None
+        """
+        files = scan_directory(self.directory)
+        changed, deleted = diff_scans(self.files, files)
+        self.files = files
+        
+        now = time.monotonic()
+        if changed or deleted:
+            self.pending.update({path: True for path in changed})
+            self.pending.update({path: False for path in deleted})
+            self.first_change = self.first_change or now
+            self.last_change = now
+        
+        if not self.pending:
+            return None
+        settled = now - self.last_change >= self.debounce_seconds
+        overdue = now - self.first_change >= self.max_delay_seconds
+        if not (settled or overdue) or now < self.retry_at or get_active_jobs("rebuild"):
+            return None
+        return self.sync_pending()
+    
+    def sync_pending(self) -> Dict:
+        """Sync every pending change into the KB and the live index."""
+        pending = self.pending
+        self.pending = {}
+        self.first_change = self.last_change = None
+        
+        # A file may have been removed again since it was seen
+        paths = [path for path, exists in pending.items() if exists and os.path.exists(path)]
+        deleted = [path for path in pending if path not in paths]
+        print(f"👀 Syncing {len(paths)} changed and {len(deleted)} deleted document(s) from {self.directory}")
+        
+        try:
+            result = sync_kb_sources(load_documents_from_files(paths), deleted, publish=self.publish)
+        except Exception as e:
+            result = {"success": False, "error": str(e), "errors": [str(e)]}
+        
+        if result["success"]:
+            print(
+                f"✅ Docs synced: {result['added']} added, {result['changed']} changed, "
+                f"{result['deleted']} deleted, {result['reingested']} near-duplicates re-ingested "
+                f"(+{result['chunks_added']} / -{result['chunks_removed']} chunks)"
+            )
+        else:
+            # Keep the changes (newer events win) and retry later
+            print(f"❌ Docs sync failed, retrying in {WATCH_RETRY_SECONDS:.0f}s: {result['error']}")
+            self.pending = {**pending, **self.pending}
+            self.first_change = self.last_change = time.monotonic()
+            self.retry_at = self.last_change + WATCH_RETRY_SECONDS
+        
+        self.last_result = result
+        return result
+    
+    def catch_up(self):
+        """
+        Queue edits made while no watcher was running.
+        
+        Every file is queued (the sync skips those whose fingerprint is
+        unchanged), as is every stored source of the directory whose file is gone.
+        """
+        self.files = scan_directory(self.directory)
+        
+        prefix = os.path.normpath(self.directory) + os.sep
+        conn = get_connection()
+        rows = conn.execute(
+            "SELECT source_key FROM kb_sources WHERE substr(source_key, 1, ?) = ?",
+            (len(prefix), prefix)
+        ).fetchall()
+        conn.close()
+        
+        # Only direct children are watched
+        stored = [row['source_key'] for row in rows if os.sep not in row['source_key'][len(prefix):]]
+        self.pending = {path: False for path in stored if path not in self.files}
+        self.pending.update({path: True for path in self.files})
+        self.first_change = self.last_change = time.monotonic() - self.debounce_seconds
+    
+    def run(self):
+        try:
+            self.catch_up()
+        except Exception as e:
+            print(f"⚠️ Docs watcher could not catch up: {e}")
+        
+        while not self._stop_event.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"⚠️ Docs watcher error: {e}")
+            self._stop_event.wait(self.poll_seconds)
+    
+    def stop(self):
+        """Stop after the current poll."""
+        self._stop_event.set()
+
+
+# Global watcher thread of this process
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def ensure_watcher(directory: str = WATCH_DIR) -> DocsWatcher:
+    """Start this process's docs watcher thread if it is not running."""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None or not _watcher.is_alive():
+            _watcher = DocsWatcher(directory)
+            _watcher.start()
+    return _watcher
+
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point: watch a directory in this process."""
+    parser = argparse.ArgumentParser(description="Sync edited KB documents into the live index.")
+    parser.add_argument("--dir", default=WATCH_DIR, help="Directory of .md/.txt documents")
+    parser.add_argument("--poll-seconds", type=float, default=WATCH_POLL_SECONDS)
+    parser.add_argument("--debounce-seconds", type=float, default=WATCH_DEBOUNCE_SECONDS)
+    args = parser.parse_args(argv)
+    
+    init_database()
+    # Queries are served by other processes, which only see published generations
+    watcher = DocsWatcher(args.dir, poll_seconds=args.poll_seconds, debounce_seconds=args.debounce_seconds, publish=True)
+    print(f"👀 Watching {args.dir} for document changes (Ctrl+C to stop)")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+if __name__ == "__main__":
+    main()
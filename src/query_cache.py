@@ -0,0 +1,77 @@
+"""
+Bounded LRU cache with TTL for retrieval results.
+Helpdesk questions repeat a lot, so a cached result skips vectorizing and scoring.
+"""
+
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for cache lookups (case and whitespace insensitive)."""
+    return re.sub(r'\s+', ' ', query).strip().lower()
+
+
+def normalize_category(category) -> Optional[tuple]:
+    """Normalize a category filter (None, "All", a name or a list of names) to a hashable key."""
+    if not category or category == "All":
+        return None
+    if isinstance(category, str):
+        return (category,)
+    return tuple(sorted(set(category)))
+
+
+class QueryCache:
+    """Thread-safe LRU cache whose entries also expire after ttl_seconds."""
+    
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Hashable):
+        """Get a cached value, or None on a miss (expired entries count as misses)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if time.monotonic() - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+    
+    def put(self, key: Hashable, value):
+        """Store a value, evicting the least recently used entries beyond max_entries."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Drop all entries (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict:
+        """Get hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries
+            }
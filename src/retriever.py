@@ -1,91 +1,701 @@
 """
-TF-IDF based retrieval for KB chunks.
+TF-IDF and BM25 based retrieval for KB chunks.
+Indexes are published as numbered generations and hot-swapped by running retrievers;
+small changes go to an in-memory delta segment until they are merged.
 """
 
 import os
-import pickle
-from typing import List, Dict, Optional
+import time
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
+from scipy.sparse import csr_matrix, hstack
 from src.database import get_connection
+from src.bm25_index import BM25Index
+from src.dense_index import DenseIndex
+from src import index_store
+from src.chunk_store import ChunkStore, hydrate_views
+from src.chunk_text import get_text_cache, SQLITE_MAX_PARAMS
+from src.query_cache import QueryCache, normalize_query, normalize_category
 
 
 STORAGE_DIR = "storage"
-INDEX_FILE = os.path.join(STORAGE_DIR, "kb_index.pkl")
+INDEX_DIR = os.path.join(STORAGE_DIR, "kb_index")
+
+RETRIEVAL_MODES = ("tfidf", "bm25", "dense", "hybrid")
+
+# Queries densified at once when scoring a batch
+SCORE_BLOCK_ROWS = 256
+
+# How often a running retriever looks for a newer index generation
+GENERATION_CHECK_SECONDS = 2.0
+
+# Retired generation directories kept on disk for readers that still map them
+KEEP_RETIRED_GENERATIONS = 1
+
+# Incremental updates: delta size / deleted fraction that trigger a merge into a new generation
+MAX_DELTA_CHUNKS = 500
+MAX_TOMBSTONE_FRACTION = 0.2
+
+# How often the background refit thread of the global retriever checks for pending incremental changes
+REFIT_INTERVAL_SECONDS = float(os.getenv("KB_REFIT_INTERVAL_SECONDS", "600"))
+
+# Query result cache (entries are also dropped whenever the served index changes)
+QUERY_CACHE_SIZE = int(os.getenv("KB_QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("KB_QUERY_CACHE_TTL", "300"))
+
+# Hybrid mode: reciprocal rank fusion constant (tie-breaks), candidates fetched
+# per result from each scorer, and the lexical share of the calibrated score
+RRF_K = 60
+HYBRID_CANDIDATES_PER_K = 5
+HYBRID_LEXICAL_WEIGHT = 0.5
+
+# Minimum average retrieval score for answering from the KB, per mode.
+# Scores differ in scale between modes (cosine vs normalized BM25 vs calibrated
+# hybrid), so each mode gets its own cut-off. Only tfidf's 0.20 comes from the
+# original app; the others are provisional defaults picked by spot-checking a
+# few sample queries, not from a labelled evaluation, and should be re-tuned
+# once one exists.
+CONFIDENCE_THRESHOLDS = {"tfidf": 0.20, "bm25": 0.40, "dense": 0.35, "hybrid": 0.40}
+
+# Shared pool running the hybrid scorers side by side
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    Get indices of the top-k scores per row, highest first.
+    
+    Uses argpartition so only the k selected entries are sorted.
+    """
+    k = min(top_k, scores.shape[-1])
+    if k <= 0:
+        return np.zeros(scores.shape[:-1] + (0,), dtype=np.int64)
+    
+    top = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=-1), axis=-1, kind='stable')
+    return np.take_along_axis(top, order, axis=-1)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Get the shared scorer thread pool."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="kb-retrieval")
+        return _executor
+
+
+def fuse_rankings(lexical_hits: List[tuple], dense_hits: List[tuple], top_k: int) -> List[tuple]:
+    """
+    Fuse two ranked candidate lists into one ranking with a calibrated score.
+    
+    'score' is a confidence in [0, 1]: the weighted mean of the normalized
+    BM25 score (BM25 / query upper bound) and the dense cosine similarity,
+    with 0 for a scorer that did not return the candidate. Candidates are
+    ranked by it, so the displayed scores fall monotonically and the Chat
+    confidence check sees the best hits. Reciprocal rank fusion (sum of
+    1 / (RRF_K + rank)) breaks ties and is kept as 'rrf_score'.
+    
+    Args:
+        lexical_hits: (normalized BM25 score, key, payload) tuples, best first
+        dense_hits: (cosine similarity, key, payload) tuples, best first
+        top_k: Number of candidates to return
+    
+    Returns:
+        (payload, scores) pairs, best first, where scores holds score,
+        rrf_score, lexical_score and dense_score
+    """
+    fused = {}
+    for weight, hits, field in (
+        (HYBRID_LEXICAL_WEIGHT, lexical_hits, 'lexical_score'),
+        (1.0 - HYBRID_LEXICAL_WEIGHT, dense_hits, 'dense_score')
+    ):
+        for rank, (score, key, payload) in enumerate(hits, start=1):
+            if key not in fused:
+                fused[key] = (payload, {'score': 0.0, 'rrf_score': 0.0, 'lexical_score': 0.0, 'dense_score': 0.0})
+            scores = fused[key][1]
+            scores['rrf_score'] += 1.0 / (RRF_K + rank)
+            scores['score'] += weight * score
+            scores[field] = score
+    
+    ranked = sorted(fused.values(), key=lambda entry: (entry[1]['score'], entry[1]['rrf_score']), reverse=True)
+    return ranked[:top_k]
+
+
+def _build_segment_data(
+    chunks: List[Dict],
+    reference: Optional["IndexSegment"] = None,
+    lazy_text: bool = False
+) -> Dict:
+    """
+    Vectorize chunks into segment data (TF-IDF matrix, BM25 postings, LSA vectors,
+    category ranges and a columnar ChunkStore).
+    
+    Without a reference the vocabulary and IDF weights are fitted on chunks.
+    With one, its frozen vocabulary and weights are reused so the new rows
+    live in the same feature space as the reference segment; words the
+    reference corpus never contained are added to the vocabulary (see
+    BM25Index.build), and 'base_columns' maps the reference's TF-IDF columns
+    into the extended one. With lazy_text the ChunkStore keeps no text for
+    chunks that have a kb_chunks id.
+    """
+    # Stable sort keeps the original order within each category
+    chunks = sorted(chunks, key=lambda chunk: chunk['category'])
+    texts = [chunk['text'] for chunk in chunks]
+    
+    bm25 = BM25Index()
+    base_columns = None
+    if reference is None:
+        # Build TF-IDF matrix
+        tfidf = TfidfVectorizer(
+            max_features=1000,
+            stop_words='english',
+            ngram_range=(1, 2)
+        )
+        tfidf_matrix = tfidf.fit_transform(texts)
+        vectorizer = index_store.QueryVectorizer.from_tfidf(tfidf)
+        bm25.build(texts)
+    else:
+        bm25.build(texts, reference=reference.bm25)
+        vectorizer = reference.vectorizer
+        if bm25.terms is not reference.bm25.terms:
+            # Words new to the corpus extend the TF-IDF vocabulary as well
+            new_words = np.setdiff1d(bm25.terms, reference.bm25.terms)
+            vectorizer, base_columns = vectorizer.extended(new_words, texts, bm25.num_docs + len(texts))
+        tfidf_matrix = vectorizer.transform(texts)
+    
+    dense_reference = reference.dense if reference is not None else None
+    if base_columns is not None:
+        dense_reference = dense_reference.expanded(base_columns, len(vectorizer.terms))
+    dense = DenseIndex()
+    dense.build(tfidf_matrix, reference=dense_reference)
+    
+    category_ranges = {}
+    for row, chunk in enumerate(chunks):
+        start, _ = category_ranges.get(chunk['category'], (row, row))
+        category_ranges[chunk['category']] = (start, row + 1)
+    
+    return {
+        'vectorizer': vectorizer,
+        'tfidf_matrix': tfidf_matrix,
+        'bm25': bm25,
+        'dense': dense,
+        'chunks': ChunkStore.from_chunks(chunks, lazy_text=lazy_text),
+        'category_ranges': category_ranges,
+        'base_columns': base_columns
+    }
+
+
+class IndexSegment:
+    """
+    Immutable group of indexed chunks: TF-IDF rows, BM25 postings and category partitions.
+    
+    The base segment of a generation is memory-mapped from disk; delta segments
+    added by add_chunks() live in memory and share the base vocabulary, plus
+    any words new to the corpus (base_columns then maps base TF-IDF columns
+    to delta columns).
+    """
+    
+    def __init__(self, data: Dict):
+        self.vectorizer = data['vectorizer']
+        self.base_columns = data.get('base_columns')
+        self.tfidf_matrix = data['tfidf_matrix']
+        self.bm25 = data['bm25']
+        self.dense = data['dense']
+        self.chunks = data['chunks']
+        self._ids = None
+        
+        # Lazy-text stores read result text from kb_chunks through the hot cache
+        if self.chunks.lazy_text and self.chunks.text_loader is None:
+            self.chunks.text_loader = get_text_cache().get_many
+        
+        # Category partitions: chunks are stored sorted by category so each
+        # category owns a contiguous row range with a cached zero-copy matrix view
+        self.category_ranges = data['category_ranges']
+        self.category_views = {}
+        matrix = self.tfidf_matrix
+        for category, (start, end) in self.category_ranges.items():
+            # Slice CSR arrays directly: data and indices are views of the full matrix
+            lo, hi = matrix.indptr[start], matrix.indptr[end]
+            self.category_views[category] = csr_matrix(
+                (matrix.data[lo:hi], matrix.indices[lo:hi], matrix.indptr[start:end + 1] - lo),
+                shape=(end - start, matrix.shape[1]),
+                copy=False
+            )
+    
+    def select_partitions(self, category) -> Optional[List[str]]:
+        """
+        Resolve a category filter to partition names.
+        
+        Accepts a single category or a list of categories (matched as a union).
+        Returns None when no filter applies.
+        """
+        if not category or category == "All":
+            return None
+        categories = [category] if isinstance(category, str) else list(category)
+        return [c for c in dict.fromkeys(categories) if c in self.category_ranges]
+    
+    def rows_for_ids(self, chunk_ids: List[int]) -> np.ndarray:
+        """Get the rows holding the given kb_chunks ids (unknown ids are skipped)."""
+        if self._ids is None:
+            ids = np.array([-1 if i is None else i for i in self.chunks.column('id')], dtype=np.int64)
+            order = np.argsort(ids, kind='stable')
+            self._ids = (ids[order], order)
+        
+        sorted_ids, order = self._ids
+        wanted = np.asarray(list(chunk_ids), dtype=np.int64)
+        if not len(wanted) or not len(sorted_ids):
+            return np.zeros(0, dtype=np.int64)
+        
+        pos = np.minimum(np.searchsorted(sorted_ids, wanted), len(sorted_ids) - 1)
+        return order[pos[sorted_ids[pos] == wanted]]
+    
+    def tfidf_scores(self, query_vecs, category) -> Optional[tuple]:
+        """
+        Score query vectors against this segment.
+        
+        Returns:
+            (rows, similarities) with one sparse column per row, or None if the
+            category filter matches nothing in this segment
+        """
+        partitions = self.select_partitions(category)
+        if partitions == []:
+            return None
+        
+        # TF-IDF rows are L2-normalised, so a dot product is the cosine similarity
+        if partitions is None:
+            return np.arange(len(self.chunks)), (query_vecs @ self.tfidf_matrix.T).tocsr()
+        
+        rows = np.concatenate([np.arange(*self.category_ranges[c]) for c in partitions])
+        similarities = hstack([query_vecs @ self.category_views[c].T for c in partitions]).tocsr()
+        return rows, similarities
+    
+    def bm25_search(self, query: str, top_k: int, category) -> tuple:
+        """Run a BM25 search restricted to the category filter; returns (rows, scores)."""
+        partitions = self.select_partitions(category)
+        if partitions == []:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        
+        # Postings are doc-sorted, so category row ranges become postings slices
+        ranges = None if partitions is None else sorted(self.category_ranges[c] for c in partitions)
+        return self.bm25.search(query, top_k=top_k, ranges=ranges)
+    
+    def dense_search(self, vector: np.ndarray, top_k: int, category) -> tuple:
+        """Run an LSA vector search restricted to the category filter; returns (rows, similarities)."""
+        partitions = self.select_partitions(category)
+        if partitions == []:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        
+        ranges = None if partitions is None else sorted(self.category_ranges[c] for c in partitions)
+        return self.dense.search(vector, top_k=top_k, ranges=ranges)
+
+
+class IndexSnapshot:
+    """
+    One served state of the index: a base segment, an optional in-memory delta
+    segment and a tombstone mask over the base rows.
+    
+    Queries grab a snapshot reference once and use it throughout, so swapping
+    in a new generation or applying add/remove never mixes old and new data in
+    an in-flight query. Snapshots are never modified, only replaced.
+    """
+    
+    def __init__(
+        self,
+        base: IndexSegment,
+        generation: int = 0,
+        delta: Optional[IndexSegment] = None,
+        deleted: Optional[np.ndarray] = None
+    ):
+        self.base = base
+        self.generation = generation
+        self.delta = delta
+        self.deleted = deleted if deleted is not None else np.zeros(len(base.chunks), dtype=bool)
+    
+    @property
+    def chunks(self):
+        """Chunks of the base segment (including tombstoned rows)."""
+        return self.base.chunks
+    
+    @property
+    def size(self) -> int:
+        """Number of live chunks."""
+        delta_size = len(self.delta.chunks) if self.delta else 0
+        return len(self.base.chunks) - int(self.deleted.sum()) + delta_size
+    
+    @property
+    def has_changes(self) -> bool:
+        """Whether incremental changes are pending a merge or refit."""
+        return self.delta is not None or bool(self.deleted.any())
+    
+    @property
+    def category_ranges(self) -> Dict:
+        """Category ranges of the base segment."""
+        return self.base.category_ranges
+    
+    def categories(self) -> List[str]:
+        """Categories present in any segment."""
+        names = set(self.base.category_ranges)
+        if self.delta:
+            names.update(self.delta.category_ranges)
+        return sorted(names)
+    
+    def segments(self) -> List[tuple]:
+        """(segment, deleted mask or None) pairs to search, base first."""
+        segments = [(self.base, self.deleted if self.deleted.any() else None)]
+        if self.delta:
+            segments.append((self.delta, None))
+        return segments
+    
+    def tfidf_queries(self, queries: List[str]) -> List[tuple]:
+        """
+        Vectorize queries for every segment: (segment, deleted mask or None, query rows).
+        
+        Queries are vectorized once in the newest feature space (the delta's,
+        if it added words) and L2-normalised over it; the base segment gets the
+        columns of its own vocabulary, so similarities stay comparable.
+        """
+        segments = self.segments()
+        if self.delta is None or self.delta.base_columns is None:
+            query_vecs = self.base.vectorizer.transform(queries)
+            return [(segment, deleted, query_vecs) for segment, deleted in segments]
+        
+        query_vecs = self.delta.vectorizer.transform(queries)
+        base_vecs = query_vecs[:, self.delta.base_columns]
+        return [(segment, deleted, base_vecs if segment is self.base else query_vecs) for segment, deleted in segments]
+    
+    def bm25_upper_bound(self, query: str) -> float:
+        """Highest BM25 score any chunk of any segment could reach for query."""
+        bounds = self.base.bm25.term_bounds(query)
+        if self.delta:
+            for term, bound in self.delta.bm25.term_bounds(query).items():
+                bounds[term] = max(bounds.get(term, 0.0), bound)
+        return float(sum(bounds.values()))
+    
+    def live_chunks(self):
+        """Iterate over all live chunks as dicts (base rows first, then delta)."""
+        for row, chunk in enumerate(self.base.chunks):
+            if not self.deleted[row]:
+                yield chunk
+        if self.delta:
+            yield from self.delta.chunks
 
 
 class KBRetriever:
-    """TF-IDF based retriever for KB chunks."""
+    """
+    Retriever for KB chunks with TF-IDF (cosine), BM25 (inverted index),
+    dense LSA (LSH) or hybrid BM25 + dense (reciprocal rank fusion) scoring.
+    """
     
-    def __init__(self):
-        self.vectorizer = None
-        self.tfidf_matrix = None
-        self.chunks = []
+    def __init__(self, mode: str = "tfidf", lazy_text: bool = False):
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {RETRIEVAL_MODES}")
+        
+        self.mode = mode
+        # Publish generations without chunk text; results are hydrated from SQLite
+        self.lazy_text = lazy_text
+        self.snapshot = None
         self.loaded = False
+        self._reload_lock = threading.Lock()
+        self._last_generation_check = 0.0
+        
+        # Serialises add/remove/merge; queries never take it
+        self._write_lock = threading.RLock()
+        self._pending_changes = None
+        self._refit_thread = None
+        self._refit_stop = None
+        
+        self.cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS)
+    
+    @property
+    def chunks(self):
+        """Base-segment chunks of the currently served index generation."""
+        return self.snapshot.chunks if self.snapshot else []
+    
+    @property
+    def generation(self) -> int:
+        """Currently served index generation (0 if none)."""
+        return self.snapshot.generation if self.snapshot else 0
     
-    def build_index(self, chunks: List[Dict]):
-        """Build TF-IDF index from chunks."""
+    def build_index(
+        self,
+        chunks: List[Dict],
+        reference: Optional[IndexSegment] = None,
+        publish_with: Optional[Callable] = None
+    ) -> Optional[int]:
+        """
+        Build an index from chunks and publish it as a new generation.
+        
+        The index is written to a staging directory, renamed into place and
+        recorded as the active generation in SQLite. This retriever swaps to it
+        immediately; other retrievers pick it up on their next generation check.
+        
+        Args:
+            chunks: Chunk dicts to index
+            reference: Segment whose vocabulary and IDF weights are reused
+                (frozen feature space); fitted from scratch when None
+            publish_with: Function(cursor) run in the transaction that activates
+                the generation, e.g. to swap in the chunk rows it was built from;
+                if it raises, the generation is not published
+        
+        Returns:
+            The new generation number, or None if there was nothing to index
+        """
         if not chunks:
             print("⚠️  No chunks to index")
-            return
+            return None
         
-        self.chunks = chunks
-        texts = [chunk['text'] for chunk in chunks]
+        data = _build_segment_data(chunks, reference, lazy_text=self.lazy_text)
         
-        # Build TF-IDF matrix
-        self.vectorizer = TfidfVectorizer(
-            max_features=1000,
-            stop_words='english',
-            ngram_range=(1, 2)
-        )
-        self.tfidf_matrix = self.vectorizer.fit_transform(texts)
+        generation = _begin_generation()
+        staging_dir = os.path.join(INDEX_DIR, f".staging-{generation:06d}")
+        generation_dir = _generation_dir(generation)
         
-        # Save index
-        os.makedirs(STORAGE_DIR, exist_ok=True)
-        with open(INDEX_FILE, 'wb') as f:
-            pickle.dump({
-                'vectorizer': self.vectorizer,
-                'tfidf_matrix': self.tfidf_matrix,
-                'chunks': self.chunks
-            }, f)
+        try:
+            index_store.save_index(
+                staging_dir,
+                data['chunks'],
+                data['vectorizer'],
+                data['tfidf_matrix'],
+                data['bm25'],
+                data['dense'],
+                data['category_ranges']
+            )
+            os.rename(staging_dir, generation_dir)
+            _activate_generation(generation, generation_dir, len(data['chunks']), publish_with)
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            shutil.rmtree(generation_dir, ignore_errors=True)
+            _fail_generation(generation)
+            raise
         
-        self.loaded = True
-        print(f"✅ Built TF-IDF index for {len(chunks)} chunks")
+        # Serve the new generation from the memory-mapped files
+        self._swap(IndexSnapshot(IndexSegment(index_store.load_index(generation_dir)), generation))
+        _cleanup_generations()
+        
+        print(f"✅ Built TF-IDF, BM25 and dense indexes for {len(chunks)} chunks (generation {generation})")
+        return generation
     
     def load_index(self):
-        """Load pre-built index from disk."""
-        if not os.path.exists(INDEX_FILE):
+        """Load the active index generation from disk (memory-mapped, no unpickling)."""
+        active = get_active_generation()
+        data = index_store.load_index(active['path']) if active else None
+        
+        if data is None:
             # Build from database
             print("📚 Index not found, building from database...")
-            chunks = self._load_chunks_from_db()
+            chunks = load_chunks_from_db()
             if chunks:
                 self.build_index(chunks)
             return
         
-        with open(INDEX_FILE, 'rb') as f:
-            data = pickle.load(f)
-            self.vectorizer = data['vectorizer']
-            self.tfidf_matrix = data['tfidf_matrix']
-            self.chunks = data['chunks']
+        self._swap(IndexSnapshot(IndexSegment(data), active['generation']))
+        print(f"✅ Loaded TF-IDF index with {len(self.chunks)} chunks (generation {self.generation})")
+    
+    def refresh(self) -> bool:
+        """
+        Swap to the active index generation if it is newer than the one served.
         
+        Only one thread reloads at a time; queries keep using the old snapshot
+        until the new one is ready. Unmerged add/remove changes are dropped,
+        since a newer generation is built from the database they were written to.
+        If no generation is active any more (the KB was cleared), the served
+        snapshot is dropped.
+        
+        Returns:
+            True if a new generation was swapped in
+        """
+        self._last_generation_check = time.monotonic()
+        active = get_active_generation()
+        if not active and self.snapshot is not None:
+            with self._write_lock:
+                self._swap(None)
+            print("🔄 No active index generation, stopped serving the cleared KB")
+            return False
+        if not active or active['generation'] <= self.generation:
+            return False
+        
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            if active['generation'] <= self.generation:
+                return False
+            data = index_store.load_index(active['path'])
+            if data is None:
+                return False
+            self._swap(IndexSnapshot(IndexSegment(data), active['generation']))
+            print(f"🔄 Swapped to index generation {self.generation}")
+            return True
+        finally:
+            self._reload_lock.release()
+    
+    def _swap(self, snapshot: IndexSnapshot):
+        """Replace the served snapshot with a single reference assignment."""
+        self.snapshot = snapshot
         self.loaded = True
-        print(f"✅ Loaded TF-IDF index with {len(self.chunks)} chunks")
+        # Cached results belong to the previous index state
+        self.cache.clear()
     
-    def _load_chunks_from_db(self) -> List[Dict]:
-        """Load chunks from database."""
-        conn = get_connection()
-        cursor = conn.cursor()
+    def _current_snapshot(self) -> Optional[IndexSnapshot]:
+        """Get the snapshot to serve a query from, loading or refreshing as needed."""
+        if not self.loaded:
+            self.load_index()
+        elif time.monotonic() - self._last_generation_check >= GENERATION_CHECK_SECONDS:
+            self.refresh()
+        return self.snapshot
+    
+    def add_chunks(self, chunks: List[Dict]):
+        """
+        Add or replace chunks without refitting the index.
         
-        cursor.execute("""
-            SELECT source_id, title, category, text, compressed_text
-            FROM kb_chunks
-        """)
+        New chunks are vectorized with the frozen vocabulary and IDF weights of
+        the served generation, extended with any words the generation has never
+        seen, and kept in an in-memory delta segment. A chunk
+        whose 'id' is already indexed replaces the old version. Once the delta
+        grows past MAX_DELTA_CHUNKS it is merged into a new generation.
         
-        rows = cursor.fetchall()
-        conn.close()
+        Args:
+            chunks: Chunk dicts (with kb_chunks 'id' where available)
+        """
+        if not chunks:
+            return
         
-        return [dict(row) for row in rows]
+        with self._write_lock:
+            snapshot = self._current_snapshot()
+            if snapshot is None:
+                self.build_index(chunks)
+                return
+            
+            if self._pending_changes is not None:
+                self._pending_changes.append(('add', chunks))
+            
+            replaced = [chunk['id'] for chunk in chunks if chunk.get('id') is not None]
+            snapshot = self._tombstone(snapshot, replaced)
+            
+            delta_chunks = list(snapshot.delta.chunks) if snapshot.delta else []
+            delta = IndexSegment(_build_segment_data(delta_chunks + list(chunks), snapshot.base))
+            self._swap(IndexSnapshot(snapshot.base, snapshot.generation, delta, snapshot.deleted))
+            
+            if len(delta.chunks) > MAX_DELTA_CHUNKS:
+                self.merge_segments()
+    
+    def remove_chunks(self, chunk_ids: List[int]):
+        """
+        Remove chunks by kb_chunks id.
+        
+        Base rows are tombstoned (filtered out of results) until the next merge
+        or refit; delta rows are dropped right away.
+        """
+        if not chunk_ids:
+            return
+        
+        with self._write_lock:
+            snapshot = self._current_snapshot()
+            if snapshot is None:
+                return
+            
+            if self._pending_changes is not None:
+                self._pending_changes.append(('remove', list(chunk_ids)))
+            
+            self._swap(self._tombstone(snapshot, chunk_ids))
+            
+            if self.snapshot.deleted.mean() > MAX_TOMBSTONE_FRACTION:
+                self.merge_segments()
+    
+    def _tombstone(self, snapshot: IndexSnapshot, chunk_ids: List[int]) -> IndexSnapshot:
+        """Get a copy of snapshot with the given chunk ids removed."""
+        if not chunk_ids:
+            return snapshot
+        
+        deleted = snapshot.deleted
+        rows = snapshot.base.rows_for_ids(chunk_ids)
+        if len(rows):
+            deleted = deleted.copy()
+            deleted[rows] = True
+        
+        delta = snapshot.delta
+        if delta is not None:
+            gone = set(chunk_ids)
+            kept = [chunk for chunk in delta.chunks if chunk.get('id') not in gone]
+            if len(kept) != len(delta.chunks):
+                delta = IndexSegment(_build_segment_data(kept, snapshot.base)) if kept else None
+        
+        return IndexSnapshot(snapshot.base, snapshot.generation, delta, deleted)
+    
+    def merge_segments(self) -> Optional[int]:
+        """
+        Fold the delta segment and tombstones into a new generation.
+        
+        The frozen vocabulary and IDF weights are kept, so this is much cheaper
+        than a refit; refit() re-learns them from the database.
+        
+        Returns:
+            The new generation number, or None if there was nothing to merge
+        """
+        with self._write_lock:
+            snapshot = self.snapshot
+            if snapshot is None or not snapshot.has_changes:
+                return None
+            return self.build_index(list(snapshot.live_chunks()), reference=snapshot.base)
+    
+    def refit(self) -> Optional[int]:
+        """
+        Rebuild the index from the database with a freshly fitted vocabulary.
+        
+        add_chunks/remove_chunks calls made while the rebuild runs are replayed
+        onto the new generation, so they are not lost.
+        
+        Returns:
+            The new generation number
+        """
+        with self._write_lock:
+            self._pending_changes = []
+        
+        try:
+            generation = self.build_index(load_chunks_from_db())
+        finally:
+            with self._write_lock:
+                pending, self._pending_changes = self._pending_changes, None
+                for operation, payload in pending:
+                    if operation == 'add':
+                        self.add_chunks(payload)
+                    else:
+                        self.remove_chunks(payload)
+        
+        return generation
+    
+    def start_background_refit(self, interval_seconds: float = REFIT_INTERVAL_SECONDS):
+        """Periodically refit in a daemon thread whenever incremental changes are pending."""
+        if self._refit_thread and self._refit_thread.is_alive():
+            return
+        
+        self._refit_stop = threading.Event()
+        
+        def run():
+            while not self._refit_stop.wait(interval_seconds):
+                snapshot = self.snapshot
+                if snapshot is not None and snapshot.has_changes:
+                    try:
+                        self.refit()
+                    except Exception as e:
+                        print(f"⚠️  Background index refit failed: {e}")
+        
+        self._refit_thread = threading.Thread(target=run, name="kb-index-refit", daemon=True)
+        self._refit_thread.start()
+    
+    def stop_background_refit(self):
+        """Stop the background refit thread."""
+        if self._refit_stop:
+            self._refit_stop.set()
+        if self._refit_thread:
+            self._refit_thread.join()
+            self._refit_thread = None
     
     def retrieve(
         self,
@@ -99,78 +709,474 @@ class KBRetriever:
         Args:
             query: User query
             top_k: Number of chunks to retrieve
-            category: Optional category filter
-            
+            category: Optional category filter (a name or a list of names)
+        
         Returns:
             List of relevant chunks with scores
         """
-        if not self.loaded:
-            self.load_index()
+        return self.retrieve_many([query], top_k=top_k, category=category)[0]
+    
+    def retrieve_many(
+        self,
+        queries: List[str],
+        top_k: int = 3,
+        category: Optional[str] = None
+    ) -> List[List[Dict]]:
+        """
+        Retrieve top-k relevant chunks for many queries at once.
+        
+        TF-IDF mode vectorizes all queries in one transform and scores them with
+        one sparse matrix product. BM25 mode runs each query against the
+        inverted index, which only touches that query's postings anyway.
+        Results are cached per normalized query, category filter, top_k and
+        index generation; the cache is cleared whenever the index changes.
+        Each caller gets its own result lists; the ChunkViews in them are
+        read-only and may be shared with other callers.
+        
+        Args:
+            queries: User queries
+            top_k: Number of chunks to retrieve per query
+            category: Optional category filter (a name or a list of names)
         
-        if not self.chunks:
-            return []
-        
-        # Filter by category if specified
-        if category and category != "All":
-            filtered_indices = [
-                i for i, chunk in enumerate(self.chunks)
-                if chunk['category'] == category
-            ]
-            if not filtered_indices:
-                return []
+        Returns:
+            One list of relevant chunks with scores per query
+        """
+        snapshot = self._current_snapshot()
+        
+        if snapshot is None or not snapshot.size or not queries:
+            return [[] for _ in queries]
+        
+        # Repeated questions are answered from the cache without scoring
+        category_key = normalize_category(category)
+        keys = [
+            (normalize_query(query), category_key, top_k, self.mode, snapshot.generation)
+            for query in queries
+        ]
+        results = [self.cache.get(key) for key in keys]
+        
+        # Score each distinct missing query once
+        missing = {}
+        for i, key in enumerate(keys):
+            if results[i] is None:
+                missing.setdefault(key, []).append(i)
+        
+        if missing:
+            misses = [queries[positions[0]] for positions in missing.values()]
+            scored = self.search_snapshot(snapshot, misses, top_k, category)
             
-            filtered_chunks = [self.chunks[i] for i in filtered_indices]
-            filtered_matrix = self.tfidf_matrix[filtered_indices]
+            # Skip storing if add/remove or a reload replaced the snapshot meanwhile
+            store = self.snapshot is snapshot
+            for (key, positions), hits in zip(missing.items(), scored):
+                if store:
+                    self.cache.put(key, hits)
+                for i in positions:
+                    results[i] = hits
+        
+        # Callers may reorder or extend their lists without touching the cache
+        return [list(hits) for hits in results]
+    
+    def search_snapshot(
+        self,
+        snapshot: IndexSnapshot,
+        queries: List[str],
+        top_k: int,
+        category: Optional[str]
+    ) -> List[List[Dict]]:
+        """
+        Score queries against a given snapshot with this retriever's mode (no caching).
+        
+        Text of lazy-text results is loaded for the whole batch in one query.
+        """
+        if self.mode == "bm25":
+            results = [self._retrieve_bm25(snapshot, query, top_k, category) for query in queries]
+        elif self.mode == "dense":
+            results = self._retrieve_dense(snapshot, queries, top_k, category)
+        elif self.mode == "hybrid":
+            results = self._retrieve_hybrid(snapshot, queries, top_k, category)
         else:
-            filtered_chunks = self.chunks
-            filtered_matrix = self.tfidf_matrix
-            filtered_indices = list(range(len(self.chunks)))
+            results = self._retrieve_tfidf(snapshot, queries, top_k, category)
+        
+        hydrate_views(chunk for hits in results for chunk in hits)
+        return results
+    
+    @property
+    def confidence_threshold(self) -> float:
+        """Minimum average 'score' of retrieved chunks to answer from the KB in this mode."""
+        return CONFIDENCE_THRESHOLDS[self.mode]
+    
+    def cache_stats(self) -> Dict:
+        """Get query cache hit/miss counters."""
+        return self.cache.stats()
+    
+    def _retrieve_tfidf(
+        self,
+        snapshot: IndexSnapshot,
+        queries: List[str],
+        top_k: int,
+        category: Optional[str]
+    ) -> List[List[Dict]]:
+        """Score a batch of queries against the TF-IDF rows of every segment."""
+        # Columns of the score matrix map back to (segment, row)
+        parts = []
+        for segment, deleted, query_vecs in snapshot.tfidf_queries(queries):
+            scored = segment.tfidf_scores(query_vecs, category)
+            if scored is not None:
+                rows, similarities = scored
+                dead = deleted[rows] if deleted is not None else None
+                parts.append((segment, rows, similarities, dead))
+        
+        if not parts:
+            return [[] for _ in queries]
+        
+        # Columns of each part start at its offset; only top-k columns are mapped back
+        offsets = np.cumsum([0] + [len(rows) for _, rows, _, _ in parts])
+        
+        results = []
+        for start in range(0, len(queries), SCORE_BLOCK_ROWS):
+            # Densify a block of queries at a time to bound memory
+            blocks = []
+            for _, _, similarities, dead in parts:
+                block = similarities[start:start + SCORE_BLOCK_ROWS].toarray()
+                if dead is not None:
+                    block[:, dead] = -np.inf
+                blocks.append(block)
+            block = np.hstack(blocks)
+            # Chunks sharing no term with the query are not matches
+            block[block <= 0] = -np.inf
+            top_indices = _top_k_indices(block, top_k)
+            top_parts = np.searchsorted(offsets, top_indices, side='right') - 1
+            
+            for scores, indices, owners in zip(block, top_indices, top_parts):
+                hits = []
+                for idx, part in zip(indices, owners):
+                    if scores[idx] == -np.inf:
+                        continue
+                    segment, rows, _, _ = parts[part]
+                    chunk = segment.chunks[int(rows[idx - offsets[part]])]
+                    hits.append(chunk.with_values({'score': float(scores[idx])}))
+                results.append(hits)
+        
+        return results
+    
+    def _bm25_candidates(
+        self,
+        snapshot: IndexSnapshot,
+        query: str,
+        top_k: int,
+        category: Optional[str]
+    ) -> List[tuple]:
+        """Get the top-k live (bm25_score, segment, row) matches across segments, best first."""
+        candidates = []
+        for segment, deleted in snapshot.segments():
+            # Over-fetch by the tombstone count so deleted rows cannot crowd out live ones
+            extra = int(deleted.sum()) if deleted is not None else 0
+            rows, scores = segment.bm25_search(query, top_k + extra, category)
+            for row, score in zip(rows, scores):
+                if deleted is None or not deleted[row]:
+                    candidates.append((float(score), segment, int(row)))
+        
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return candidates[:top_k]
+    
+    def _dense_candidates(
+        self,
+        snapshot: IndexSnapshot,
+        vector: np.ndarray,
+        top_k: int,
+        category: Optional[str]
+    ) -> List[tuple]:
+        """Get the top-k live (similarity, segment, row) matches across segments, best first."""
+        candidates = []
+        for segment, deleted in snapshot.segments():
+            extra = int(deleted.sum()) if deleted is not None else 0
+            rows, scores = segment.dense_search(vector, top_k + extra, category)
+            for row, score in zip(rows, scores):
+                # Orthogonal or opposite vectors are not matches
+                if score > 0 and (deleted is None or not deleted[row]):
+                    candidates.append((float(score), segment, int(row)))
+        
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return candidates[:top_k]
+    
+    def _retrieve_bm25(
+        self,
+        snapshot: IndexSnapshot,
+        query: str,
+        top_k: int,
+        category: Optional[str]
+    ) -> List[Dict]:
+        """
+        Retrieve top-k chunks with BM25 over the inverted index.
+        
+        'score' is BM25 divided by the query's upper bound so it stays in [0, 1]
+        like the cosine scores; the raw value is kept as 'bm25_score'.
+        """
+        upper_bound = snapshot.bm25_upper_bound(query) or 1.0
+        
+        results = []
+        for score, segment, row in self._bm25_candidates(snapshot, query, top_k, category):
+            results.append(segment.chunks[row].with_values({'score': score / upper_bound, 'bm25_score': score}))
+        
+        return results
+    
+    def _retrieve_dense(
+        self,
+        snapshot: IndexSnapshot,
+        queries: List[str],
+        top_k: int,
+        category: Optional[str]
+    ) -> List[List[Dict]]:
+        """
+        Retrieve top-k chunks by cosine similarity of LSA vectors.
+        
+        Queries are projected with the base segment's SVD components, which
+        delta segments share, so similarities are comparable across segments.
+        """
+        vectors = snapshot.base.dense.project(snapshot.base.vectorizer.transform(queries))
+        
+        results = []
+        for vector in vectors:
+            hits = []
+            for score, segment, row in self._dense_candidates(snapshot, vector, top_k, category):
+                hits.append(segment.chunks[row].with_values({'score': score}))
+            results.append(hits)
         
-        # Vectorize query
-        query_vec = self.vectorizer.transform([query])
+        return results
+    
+    def hybrid_candidates(
+        self,
+        snapshot: IndexSnapshot,
+        queries: List[str],
+        depth: int,
+        category: Optional[str]
+    ) -> tuple:
+        """
+        Run the BM25 and dense scorers side by side on the shared thread pool.
         
-        # Compute similarity
-        similarities = cosine_similarity(query_vec, filtered_matrix).flatten()
+        Returns:
+            (lexical_lists, dense_lists): per query, up to depth
+            (raw score, segment, row) candidates from each scorer, best first
+        """
+        def lexical():
+            return [self._bm25_candidates(snapshot, query, depth, category) for query in queries]
         
-        # Get top-k indices
-        top_indices = np.argsort(similarities)[-top_k:][::-1]
+        def dense():
+            vectors = snapshot.base.dense.project(snapshot.base.vectorizer.transform(queries))
+            return [self._dense_candidates(snapshot, vector, depth, category) for vector in vectors]
+        
+        executor = _get_executor()
+        lexical_future = executor.submit(lexical)
+        dense_future = executor.submit(dense)
+        return lexical_future.result(), dense_future.result()
+    
+    def _retrieve_hybrid(
+        self,
+        snapshot: IndexSnapshot,
+        queries: List[str],
+        top_k: int,
+        category: Optional[str]
+    ) -> List[List[Dict]]:
+        """
+        Retrieve top-k chunks by fusing BM25 and dense rankings.
+        
+        Each scorer returns HYBRID_CANDIDATES_PER_K * top_k candidates, which
+        are fused with fuse_rankings().
+        """
+        depth = max(top_k * HYBRID_CANDIDATES_PER_K, top_k)
+        lexical_lists, dense_lists = self.hybrid_candidates(snapshot, queries, depth, category)
         
-        # Return chunks with scores
         results = []
-        for idx in top_indices:
-            chunk = filtered_chunks[idx].copy()
-            chunk['score'] = float(similarities[idx])
-            results.append(chunk)
+        for query, lexical_hits, dense_hits in zip(queries, lexical_lists, dense_lists):
+            upper_bound = snapshot.bm25_upper_bound(query) or 1.0
+            lexical_hits = [(score / upper_bound, (id(segment), row), (segment, row)) for score, segment, row in lexical_hits]
+            dense_hits = [(score, (id(segment), row), (segment, row)) for score, segment, row in dense_hits]
+            
+            fused = fuse_rankings(lexical_hits, dense_hits, top_k)
+            results.append([segment.chunks[row].with_values(scores) for (segment, row), scores in fused])
         
         return results
     
     def get_all_categories(self) -> List[str]:
         """Get all unique categories."""
-        if not self.loaded:
-            self.load_index()
-        
-        categories = set(chunk['category'] for chunk in self.chunks)
-        return sorted(list(categories))
+        snapshot = self._current_snapshot()
+        return snapshot.categories() if snapshot else []
+
+
+def load_chunks_from_db(source_keys: Optional[List[str]] = None, table: str = "kb_chunks") -> List[Dict]:
+    """
+    Load chunks from database.
+    
+    Args:
+        source_keys: Only load chunks built from these sources (default: all)
+        table: Table to read (kb_chunks, or kb_chunks_staging during a rebuild)
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    query = f"""
+        SELECT id, source_id, title, category, text, compressed_text,
+               parent_title, section, chunk_index
+        FROM {table}
+    """
+    if source_keys is None:
+        cursor.execute(query)
+        rows = cursor.fetchall()
+    else:
+        rows = []
+        for start in range(0, len(source_keys), SQLITE_MAX_PARAMS):
+            batch = source_keys[start:start + SQLITE_MAX_PARAMS]
+            cursor.execute(f"{query} WHERE source_key IN ({','.join('?' * len(batch))})", batch)
+            rows.extend(cursor.fetchall())
+    conn.close()
+    
+    return [dict(row) for row in rows]
+
+
+def _generation_dir(generation: int) -> str:
+    """Directory holding one index generation."""
+    return os.path.join(INDEX_DIR, f"gen-{generation:06d}")
+
+
+def get_active_generation() -> Optional[Dict]:
+    """Get the active index generation (generation, path, chunks_count), if any."""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT generation, path, chunks_count, created_at
+            FROM index_generations
+            WHERE status = 'active'
+            ORDER BY generation DESC
+            LIMIT 1
+        """)
+        row = cursor.fetchone()
+        conn.close()
+    except sqlite3.OperationalError:
+        # Database not initialized yet
+        return None
+    
+    return dict(row) if row else None
+
+
+def _begin_generation() -> int:
+    """Reserve the next generation number."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO index_generations (path, status) VALUES ('', 'building')")
+    generation = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return generation
+
+
+def _activate_generation(generation: int, path: str, chunks_count: int, publish_with: Optional[Callable] = None):
+    """
+    Mark a generation active and retire older ones in one transaction.
+    
+    A build that finishes after a newer generation was activated is retired
+    straight away instead of replacing it. publish_with(cursor), if given,
+    runs in the same transaction.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    if publish_with:
+        try:
+            publish_with(cursor)
+        except Exception:
+            conn.rollback()
+            conn.close()
+            raise
+    cursor.execute("""
+        UPDATE index_generations
+        SET path = ?, chunks_count = ?,
+            status = CASE WHEN EXISTS (
+                SELECT 1 FROM index_generations WHERE status = 'active' AND generation > ?
+            ) THEN 'retired' ELSE 'active' END
+        WHERE generation = ?
+    """, (path, chunks_count, generation, generation))
+    cursor.execute("""
+        UPDATE index_generations
+        SET status = 'retired'
+        WHERE status = 'active' AND generation < ?
+    """, (generation,))
+    conn.commit()
+    conn.close()
+
+
+def _fail_generation(generation: int):
+    """Mark a generation whose build did not complete."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("UPDATE index_generations SET status = 'failed' WHERE generation = ?", (generation,))
+    conn.commit()
+    conn.close()
+
+
+def _cleanup_generations():
+    """Delete directories of old retired or failed generations."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT generation, path FROM index_generations
+        WHERE status IN ('retired', 'failed')
+        ORDER BY generation DESC
+    """)
+    stale = [dict(row) for row in cursor.fetchall()][KEEP_RETIRED_GENERATIONS:]
+    
+    for row in stale:
+        if row['path']:
+            shutil.rmtree(row['path'], ignore_errors=True)
+        cursor.execute("UPDATE index_generations SET status = 'deleted' WHERE generation = ?", (row['generation'],))
+    
+    conn.commit()
+    conn.close()
 
 
 # Global retriever instance
 _retriever = None
 
+# Scoring engine for the global retriever (one of RETRIEVAL_MODES)
+RETRIEVAL_MODE = os.getenv("KB_RETRIEVAL_MODE", "tfidf")
+
+# Keep chunk text out of the index and load result text from SQLite on demand
+LAZY_TEXT = os.getenv("KB_LAZY_TEXT", "0").lower() in ("1", "true", "yes")
+
+# Shard worker processes for the global retriever (1 = single in-process index)
+RETRIEVAL_SHARDS = int(os.getenv("KB_RETRIEVAL_SHARDS", "1"))
+
+
+def index_exists() -> bool:
+    """Check whether an active, current-format index generation exists."""
+    active = get_active_generation()
+    return bool(active) and index_store.read_manifest(active['path']) is not None
+
 
 def get_retriever() -> KBRetriever:
-    """Get global retriever instance."""
+    """
+    Get global retriever instance (a ShardedRetriever when KB_RETRIEVAL_SHARDS > 1).
+    
+    Its background refit thread folds incremental changes (see
+    sync_kb_sources) into a freshly fitted generation every
+    REFIT_INTERVAL_SECONDS.
+    """
     global _retriever
     if _retriever is None:
-        _retriever = KBRetriever()
+        if RETRIEVAL_SHARDS > 1:
+            from src.sharded_retriever import ShardedRetriever
+            _retriever = ShardedRetriever(num_shards=RETRIEVAL_SHARDS, mode=RETRIEVAL_MODE, lazy_text=LAZY_TEXT)
+        else:
+            _retriever = KBRetriever(mode=RETRIEVAL_MODE, lazy_text=LAZY_TEXT)
+        # Sharded retrievers publish through their local retriever
+        getattr(_retriever, 'local', _retriever).start_background_refit()
     return _retriever
 
 
 if __name__ == "__main__":
     from src.database import init_database
-    from src.kb_pipeline import build_kb_index
+    from src.kb_pipeline import rebuild_kb_index
     
     init_database()
-    build_kb_index()
+    rebuild_kb_index()
     
     # Test retrieval
     retriever = get_retriever()
@@ -6,6 +6,7 @@ Compresses text targeting gemini-2.5-flash model.
 import os
 import requests
 import time
+import threading
 from typing import Dict, Optional
 from dotenv import load_dotenv
 
@@ -14,6 +15,55 @@ load_dotenv()
 SCALEDOWN_API_URL = "https://api.scaledown.xyz/compress/raw/"
 SCALEDOWN_API_KEY = os.getenv("SCALEDOWN_API_KEY")
 
+# Request quota shared by all threads (requests per second and burst size; 0 disables)
+SCALEDOWN_RATE_LIMIT = float(os.getenv("SCALEDOWN_RATE_LIMIT", "5"))
+SCALEDOWN_BURST = int(os.getenv("SCALEDOWN_BURST", "5"))
+
+# Attempts per text and base delay of the exponential backoff between them
+SCALEDOWN_MAX_ATTEMPTS = 3
+SCALEDOWN_RETRY_DELAY_SECONDS = 1.0
+
+
+class TokenBucket:
+    """Thread-safe token bucket: acquire() blocks until a request may be sent."""
+    
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Take one token, waiting for the bucket to refill if it is empty."""
+        if self.rate <= 0:
+            return
+        
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# Global rate limiter instance
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> TokenBucket:
+    """Get the process-wide ScaleDown rate limiter."""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = TokenBucket(SCALEDOWN_RATE_LIMIT, SCALEDOWN_BURST)
+    return _rate_limiter
+
 
 def compress_text(text: str, target_model: str = "gemini-2.5-flash") -> Dict:
     """
@@ -117,6 +167,44 @@ def compress_text(text: str, target_model: str = "gemini-2.5-flash") -> Dict:
         }
 
 
+def _is_retryable(result: Dict) -> bool:
+    """Whether a failed compression may succeed when sent again."""
+    error = result.get("error") or ""
+    if not SCALEDOWN_API_KEY:
+        return False
+    # Client errors other than rate limiting will fail the same way again
+    if error.startswith("API error: 4") and not error.startswith("API error: 429"):
+        return False
+    return True
+
+
+def compress_text_with_retry(
+    text: str,
+    target_model: str = "gemini-2.5-flash",
+    max_attempts: int = SCALEDOWN_MAX_ATTEMPTS
+) -> Dict:
+    """
+    Compress text under the shared rate limit, retrying transient failures.
+    
+    Timeouts, connection errors, 429 and 5xx responses are retried with
+    exponential backoff; every attempt takes a token from the rate limiter.
+    
+    Returns:
+        Result of the last attempt (see compress_text), with 'attempts' added
+    """
+    limiter = get_rate_limiter()
+    
+    for attempt in range(1, max_attempts + 1):
+        limiter.acquire()
+        result = compress_text(text, target_model=target_model)
+        result["attempts"] = attempt
+        if result["success"] or attempt == max_attempts or not _is_retryable(result):
+            return result
+        time.sleep(SCALEDOWN_RETRY_DELAY_SECONDS * 2 ** (attempt - 1))
+    
+    return result
+
+
 if __name__ == "__main__":
     # Test compression
     test_text = """
@@ -0,0 +1,341 @@
+"""
+Sharded multi-process retrieval for very large knowledge bases.
+Chunks of the active index generation are split across worker processes, each
+serving its own memory-mapped shard; queries are scattered to every shard and
+the per-shard top-k lists are merged.
+"""
+
+import os
+import shutil
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Dict, Optional
+from src import index_store
+from src.chunk_store import hydrate_views
+from src.query_cache import QueryCache, normalize_query, normalize_category
+from src.retriever import (
+    KBRetriever,
+    IndexSegment,
+    IndexSnapshot,
+    HYBRID_CANDIDATES_PER_K,
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_TTL_SECONDS,
+    _build_segment_data,
+    _generation_dir,
+    fuse_rankings
+)
+
+
+# Default number of shard worker processes
+DEFAULT_NUM_SHARDS = max(1, min(4, os.cpu_count() or 1))
+
+# State of the shard served by this worker process
+_worker = {}
+
+
+def _shard_dir(generation_dir: str, num_shards: int, shard: int) -> str:
+    """Directory holding one shard of a generation split num_shards ways."""
+    return os.path.join(generation_dir, f"shards-{num_shards}", f"shard-{shard:03d}")
+
+
+def _build_shard(generation_dir: str, shard_dir: str, shard: int, num_shards: int):
+    """
+    Write one shard of a generation unless it already exists.
+    
+    Every num_shards-th chunk goes to the shard. The generation's vocabulary,
+    IDF weights, BM25 statistics and LSA components are reused as the
+    reference, so scores from different shards are directly comparable.
+    """
+    if index_store.read_manifest(shard_dir) is not None:
+        return
+    
+    reference = IndexSegment(index_store.load_index(generation_dir))
+    chunks = [reference.chunks[row] for row in range(shard, len(reference.chunks), num_shards)]
+    hydrate_views(chunks)
+    data = _build_segment_data(chunks, reference, lazy_text=reference.chunks.lazy_text)
+    
+    # Another process may build the same shard concurrently; the first rename wins
+    staging_dir = f"{shard_dir}.staging-{os.getpid()}"
+    index_store.save_index(
+        staging_dir,
+        data['chunks'],
+        data['vectorizer'],
+        data['tfidf_matrix'],
+        data['bm25'],
+        data['dense'],
+        data['category_ranges']
+    )
+    try:
+        os.rename(staging_dir, shard_dir)
+    except OSError:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def _init_worker(generation_dir: str, shard: int, num_shards: int, generation: int, mode: str):
+    """Process initializer: build (if needed) and memory-map this worker's shard."""
+    shard_dir = _shard_dir(generation_dir, num_shards, shard)
+    _build_shard(generation_dir, shard_dir, shard, num_shards)
+    
+    _worker['retriever'] = KBRetriever(mode)
+    _worker['snapshot'] = IndexSnapshot(IndexSegment(index_store.load_index(shard_dir)), generation)
+
+
+def _ping() -> bool:
+    """No-op task used to start a worker and wait for its initializer."""
+    return True
+
+
+def _search_shard(queries: List[str], top_k: int, category, depth: int):
+    """
+    Score queries against this worker's shard.
+    
+    Returns:
+        Per-query result lists, or for hybrid mode a (lexical, dense) pair of
+        per-query (raw score, row, chunk) candidate lists
+    """
+    retriever = _worker['retriever']
+    snapshot = _worker['snapshot']
+    
+    # Chunk views reference the memory-mapped store, so plain dicts are sent back
+    if retriever.mode != "hybrid":
+        return [
+            [chunk.to_dict() for chunk in hits]
+            for hits in retriever.search_snapshot(snapshot, queries, top_k, category)
+        ]
+    
+    lexical_lists, dense_lists = retriever.hybrid_candidates(snapshot, queries, depth, category)
+    views = {}
+    for lists in (lexical_lists, dense_lists):
+        for hits in lists:
+            for _, segment, row in hits:
+                views.setdefault((id(segment), row), segment.chunks[row])
+    hydrate_views(views.values())
+    
+    return tuple(
+        [[(score, row, views[(id(segment), row)].to_dict()) for score, segment, row in hits] for hits in lists]
+        for lists in (lexical_lists, dense_lists)
+    )
+
+
+class ShardedRetriever:
+    """
+    Retriever that scatters queries to one worker process per shard.
+    
+    Shards are derived from the active index generation and stored next to it
+    (gen-NNNNNN/shards-N/shard-XXX), so they are cleaned up with the generation.
+    A local KBRetriever keeps the generation memory-mapped for global BM25
+    upper bounds, categories and publishing new generations. Incremental
+    add/remove deltas are not served; shards follow published generations only.
+    """
+    
+    def __init__(self, num_shards: int = DEFAULT_NUM_SHARDS, mode: str = "tfidf", lazy_text: bool = False):
+        self.num_shards = max(1, num_shards)
+        self.local = KBRetriever(mode, lazy_text=lazy_text)
+        self.mode = mode
+        self.cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS)
+        self.pools = []
+        self._pool_generation = 0
+        self._pool_lock = threading.Lock()
+    
+    @property
+    def loaded(self) -> bool:
+        return self.local.loaded
+    
+    @property
+    def generation(self) -> int:
+        """Generation served by the shard workers (0 if none)."""
+        return self._pool_generation
+    
+    @property
+    def confidence_threshold(self) -> float:
+        return self.local.confidence_threshold
+    
+    def load_index(self):
+        """Load the active generation and start the shard workers."""
+        self.local.load_index()
+        self._current_snapshot()
+    
+    def build_index(self, chunks: List[Dict], publish_with: Optional[Callable] = None) -> Optional[int]:
+        """Publish a new generation; shard workers switch to it on the next query."""
+        return self.local.build_index(chunks, publish_with=publish_with)
+    
+    def _start_pools(self, snapshot: IndexSnapshot):
+        """Start one single-process pool per shard for the snapshot's generation."""
+        generation_dir = os.path.abspath(_generation_dir(snapshot.generation))
+        num_shards = min(self.num_shards, len(snapshot.chunks))
+        os.makedirs(os.path.join(generation_dir, f"shards-{num_shards}"), exist_ok=True)
+        
+        # Spawned (not forked) workers: the parent may run Streamlit and scorer threads
+        context = multiprocessing.get_context("spawn")
+        pools = [
+            ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(generation_dir, shard, num_shards, snapshot.generation, self.mode)
+            )
+            for shard in range(num_shards)
+        ]
+        
+        # Start all workers at once so shards are built in parallel
+        for future in [pool.submit(_ping) for pool in pools]:
+            future.result()
+        
+        old_pools = self.pools
+        self.pools = pools
+        self._pool_generation = snapshot.generation
+        self.cache.clear()
+        for pool in old_pools:
+            # In-flight queries on the old shards still complete
+            pool.shutdown(wait=False)
+        
+        print(f"✅ Started {num_shards} shard workers for index generation {snapshot.generation}")
+    
+    def _current_snapshot(self) -> Optional[IndexSnapshot]:
+        """Get the global snapshot, (re)starting shard workers when the generation changes."""
+        snapshot = self.local._current_snapshot()
+        if snapshot is None or not len(snapshot.chunks):
+            return None
+        
+        if snapshot.generation != self._pool_generation:
+            with self._pool_lock:
+                if snapshot.generation != self._pool_generation:
+                    self._start_pools(snapshot)
+        return snapshot
+    
+    def retrieve(
+        self,
+        query: str,
+        top_k: int = 3,
+        category: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Retrieve top-k relevant chunks for query across all shards.
+        
+        Args:
+            query: User query
+            top_k: Number of chunks to retrieve
+            category: Optional category filter (a name or a list of names)
+        
+        Returns:
+            List of relevant chunks with scores
+        """
+        return self.retrieve_many([query], top_k=top_k, category=category)[0]
+    
+    def retrieve_many(
+        self,
+        queries: List[str],
+        top_k: int = 3,
+        category: Optional[str] = None
+    ) -> List[List[Dict]]:
+        """
+        Retrieve top-k relevant chunks for many queries across all shards.
+        
+        The batch is sent to every shard worker at once and each shard's top-k
+        lists are merged. Scores match a single unsharded index because all
+        shards share the generation's vocabulary and IDF statistics. Hits are
+        plain dicts, so each caller gets its own copies of the cached ones.
+        
+        Args:
+            queries: User queries
+            top_k: Number of chunks to retrieve per query
+            category: Optional category filter (a name or a list of names)
+        
+        Returns:
+            One list of relevant chunks with scores per query
+        """
+        snapshot = self._current_snapshot()
+        if snapshot is None or not queries:
+            return [[] for _ in queries]
+        
+        category_key = normalize_category(category)
+        keys = [
+            (normalize_query(query), category_key, top_k, self.mode, snapshot.generation)
+            for query in queries
+        ]
+        results = [self.cache.get(key) for key in keys]
+        
+        missing = {}
+        for i, key in enumerate(keys):
+            if results[i] is None:
+                missing.setdefault(key, []).append(i)
+        
+        if missing:
+            misses = [queries[positions[0]] for positions in missing.values()]
+            pools = self.pools
+            depth = max(top_k * HYBRID_CANDIDATES_PER_K, top_k)
+            
+            # Scatter to every shard, then gather in shard order
+            futures = [pool.submit(_search_shard, misses, top_k, category, depth) for pool in pools]
+            shard_results = [future.result() for future in futures]
+            scored = self._merge(snapshot, misses, shard_results, top_k, depth)
+            
+            for (key, positions), hits in zip(missing.items(), scored):
+                self.cache.put(key, hits)
+                for i in positions:
+                    results[i] = hits
+        
+        return [[dict(chunk) for chunk in hits] for hits in results]
+    
+    def _merge(
+        self,
+        snapshot: IndexSnapshot,
+        queries: List[str],
+        shard_results: List,
+        top_k: int,
+        depth: int
+    ) -> List[List[Dict]]:
+        """Merge per-shard results into global top-k lists."""
+        bm25 = snapshot.base.bm25
+        merged = []
+        
+        for q, query in enumerate(queries):
+            if self.mode == "hybrid":
+                # Re-rank each scorer's candidates globally before fusing
+                upper_bound = bm25.upper_bound(query) or 1.0
+                ranked = []
+                for which, normalizer in ((0, upper_bound), (1, 1.0)):
+                    candidates = [
+                        (score / normalizer, (shard, row), chunk)
+                        for shard, lists in enumerate(shard_results)
+                        for score, row, chunk in lists[which][q]
+                    ]
+                    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+                    ranked.append(candidates[:depth])
+                
+                hits = []
+                for chunk, scores in fuse_rankings(ranked[0], ranked[1], top_k):
+                    chunk = dict(chunk)
+                    chunk.update(scores)
+                    hits.append(chunk)
+                merged.append(hits)
+                continue
+            
+            hits = [chunk for lists in shard_results for chunk in lists[q]]
+            if self.mode == "bm25":
+                # Shards normalize by their own upper bound; use the global one instead
+                upper_bound = bm25.upper_bound(query) or 1.0
+                hits.sort(key=lambda chunk: chunk['bm25_score'], reverse=True)
+                for chunk in hits:
+                    chunk['score'] = chunk['bm25_score'] / upper_bound
+            else:
+                hits.sort(key=lambda chunk: chunk['score'], reverse=True)
+            merged.append(hits[:top_k])
+        
+        return merged
+    
+    def get_all_categories(self) -> List[str]:
+        """Get all unique categories."""
+        return self.local.get_all_categories()
+    
+    def cache_stats(self) -> Dict:
+        """Get query cache hit/miss counters."""
+        return self.cache.stats()
+    
+    def close(self):
+        """Shut down the shard worker processes."""
+        for pool in self.pools:
+            pool.shutdown(wait=True)
+        self.pools = []
+        self._pool_generation = 0
@@ -0,0 +1,86 @@
+"""
+Shared fixtures: every test runs in its own directory with a fresh SQLite
+database, and ScaleDown is replaced by a local fake that returns the text as
+it is (counting calls).
+"""
+
+import os
+import csv
+import pytest
+from src import database, retriever, chunk_text, scaledown_client
+
+
+class FakeScaleDown:
+    """Stand-in for scaledown_client.compress_text that keeps text unchanged."""
+    
+    def __init__(self):
+        self.calls = 0
+        # Texts containing this marker fail with a retryable error
+        self.fail_marker = None
+    
+    def __call__(self, text: str, target_model: str = "gemini-2.5-flash") -> dict:
+        self.calls += 1
+        if self.fail_marker and self.fail_marker in text:
+            return {"success": False, "error": "API error: 503 - unavailable"}
+        words = len(text.split())
+        return {
+            "compressed_text": text,
+            "original_tokens": words,
+            "compressed_tokens": words,
+            "compression_ratio": 1.0,
+            "original_words": words,
+            "compressed_words": words,
+            "latency_ms": 1.0,
+            "success": True,
+            "error": None
+        }
+
+
+def _reset_globals():
+    """Drop process-wide singletons that point at another test's database."""
+    if retriever._retriever is not None:
+        local = getattr(retriever._retriever, 'local', retriever._retriever)
+        local.stop_background_refit()
+        if hasattr(retriever._retriever, 'close'):
+            retriever._retriever.close()
+    retriever._retriever = None
+    chunk_text._text_cache = None
+
+
+@pytest.fixture
+def fake_scaledown(monkeypatch) -> FakeScaleDown:
+    """Replace ScaleDown with FakeScaleDown and disable the rate limit and retry delays."""
+    fake = FakeScaleDown()
+    monkeypatch.setattr(scaledown_client, "compress_text", fake)
+    monkeypatch.setattr(scaledown_client, "SCALEDOWN_API_KEY", "test-key")
+    monkeypatch.setattr(scaledown_client, "SCALEDOWN_RETRY_DELAY_SECONDS", 0.0)
+    monkeypatch.setattr(scaledown_client, "_rate_limiter", scaledown_client.TokenBucket(0, 1))
+    return fake
+
+
+@pytest.fixture
+def kb_env(tmp_path, monkeypatch, fake_scaledown):
+    """Empty KB in a temporary working directory (helpdesk.db, data/docs, storage)."""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data/docs")
+    _reset_globals()
+    database.init_database()
+    yield tmp_path
+    _reset_globals()
+
+
+def write_doc(name: str, content: str, directory: str = "data/docs") -> str:
+    """Write a KB document and return its source_key."""
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return os.path.normpath(path)
+
+
+def write_tickets(rows: list, path: str = "data/resolved_tickets.csv") -> str:
+    """Write a resolved-tickets CSV from (ticket_id, title, category, resolution) rows."""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["ticket_id", "title", "category", "resolution"])
+        writer.writerows(rows)
+    return path
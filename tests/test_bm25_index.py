@@ -0,0 +1,107 @@
+"""Tests for the BM25 inverted index: MaxScore pruning must rank like exhaustive scoring."""
+
+import random
+import numpy as np
+import pytest
+from src.bm25_index import BM25Index
+
+
+VOCABULARY = [f"term{i}" for i in range(60)]
+
+
+def _corpus(rng: random.Random, size: int) -> list:
+    # Zipf-like term choice so some postings lists are long and some short
+    weights = [1.0 / (i + 1) for i in range(len(VOCABULARY))]
+    return [" ".join(rng.choices(VOCABULARY, weights, k=rng.randint(5, 60))) for _ in range(size)]
+
+
+def _brute_force(index: BM25Index, query: str, ranges=None) -> np.ndarray:
+    """Score every document by summing the impacts of every query term."""
+    scores = np.zeros(int(index.doc_ids.max()) + 1 if len(index.doc_ids) else 0, dtype=np.float64)
+    for term_id, weight in index._query_terms(query):
+        start, end = index.offsets[term_id], index.offsets[term_id + 1]
+        np.add.at(scores, index.doc_ids[start:end], index.impacts[start:end] * weight)
+    if ranges is not None:
+        allowed = np.zeros(len(scores), dtype=bool)
+        for lo, hi in ranges:
+            allowed[lo:hi] = True
+        scores[~allowed] = 0.0
+    return scores
+
+
+def _assert_same_ranking(index: BM25Index, query: str, top_k: int, ranges=None):
+    docs, scores = index.search(query, top_k=top_k, ranges=ranges)
+    expected = _brute_force(index, query, ranges)
+    matching = np.flatnonzero(expected > 0)
+    best = matching[np.argsort(-expected[matching], kind='stable')][:top_k]
+    
+    assert len(docs) == len(best)
+    np.testing.assert_allclose(scores, expected[best], rtol=1e-5)
+    # Documents may only differ where scores tie
+    np.testing.assert_allclose(expected[docs], expected[best], rtol=1e-5)
+    if ranges is not None:
+        assert all(any(lo <= doc < hi for lo, hi in ranges) for doc in docs)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_maxscore_matches_brute_force(seed):
+    rng = random.Random(seed)
+    index = BM25Index()
+    index.build(_corpus(rng, 400))
+    
+    for _ in range(30):
+        query = " ".join(rng.sample(VOCABULARY, rng.randint(1, 6)))
+        for top_k in (1, 3, 10, 50):
+            _assert_same_ranking(index, query, top_k)
+
+
+def test_maxscore_matches_brute_force_within_ranges():
+    rng = random.Random(7)
+    index = BM25Index()
+    index.build(_corpus(rng, 300))
+    
+    for ranges in ([(0, 50)], [(10, 40), (120, 200)], [(250, 300)]):
+        for _ in range(10):
+            query = " ".join(rng.sample(VOCABULARY, 4))
+            _assert_same_ranking(index, query, 5, ranges)
+
+
+def test_reference_build_reuses_vocabulary_and_idf():
+    rng = random.Random(3)
+    base = BM25Index()
+    base.build(_corpus(rng, 100))
+    delta = BM25Index()
+    delta.build(["term1 term2", "term3"], reference=base)
+    
+    assert delta.terms is base.terms
+    assert delta.idf is base.idf
+    docs, _ = delta.search("term1", top_k=5)
+    assert docs.tolist() == [0]
+
+
+def test_reference_build_adds_new_words():
+    rng = random.Random(3)
+    base = BM25Index()
+    base.build(_corpus(rng, 100))
+    delta = BM25Index()
+    delta.build(["term1 term2 unknownword", "term3", "unknownword zebra"], reference=base)
+    
+    assert set(delta.terms) == set(base.terms) | {"unknownword", "zebra"}
+    assert list(delta.terms) == sorted(delta.terms)
+    # Known words keep the reference weights; new words get positive ones
+    shared = np.searchsorted(delta.terms, base.terms)
+    np.testing.assert_array_equal(delta.idf[shared], base.idf)
+    assert delta.idf[np.searchsorted(delta.terms, "zebra")] > delta.idf[np.searchsorted(delta.terms, "unknownword")] > 0
+    
+    docs, _ = delta.search("unknownword", top_k=5)
+    assert sorted(docs.tolist()) == [0, 2]
+    _assert_same_ranking(delta, "term1 unknownword zebra", 3)
+
+
+def test_unknown_query_returns_nothing():
+    index = BM25Index()
+    index.build(["printer driver", "vpn token"])
+    
+    docs, scores = index.search("zebra", top_k=3)
+    assert len(docs) == 0 and len(scores) == 0
+    assert index.upper_bound("zebra") == 0.0
@@ -0,0 +1,71 @@
+"""Tests for heading-aware chunking (kb_pipeline.chunk_documents)."""
+
+import random
+import pytest
+from src.kb_pipeline import chunk_documents
+
+
+def _random_markdown(rng: random.Random) -> str:
+    """Markdown with nested headings, short and oversized paragraphs and code fences."""
+    words = ["printer", "driver", "queue", "reset", "vpn", "token", "update", "cache", "restart", "network"]
+    lines = ["# Guide"]
+    for section in range(rng.randint(1, 6)):
+        lines.append(f"{'#' * rng.randint(2, 4)} Step {section}")
+        for _ in range(rng.randint(1, 4)):
+            lines.append("")
+            length = rng.choice([3, 20, 80, 250, 600])
+            lines.append(" ".join(rng.choice(words) for _ in range(length)))
+        if rng.random() < 0.3:
+            lines += ["", "```", "# not a heading", "ipconfig /flushdns", "```"]
+        lines.append("")
+    return "\n".join(lines)
+
+
+def _doc(content: str) -> dict:
+    return {'title': 'Guide', 'content': content, 'category': 'General', 'source': 'guide.md', 'source_key': 'guide.md'}
+
+
+@pytest.mark.parametrize("chunk_tokens,overlap_tokens", [(200, 30), (50, 10), (20, 19), (8, 0)])
+def test_chunks_never_exceed_chunk_tokens(chunk_tokens, overlap_tokens):
+    rng = random.Random(chunk_tokens * 100 + overlap_tokens)
+    for _ in range(40):
+        chunks = chunk_documents([_doc(_random_markdown(rng))], chunk_tokens, overlap_tokens)
+        assert chunks
+        for chunk in chunks:
+            assert len(chunk['content'].split()) <= chunk_tokens
+
+
+def test_small_document_is_kept_whole():
+    content = "# VPN\n\nConnect with the client and sign in."
+    chunks = chunk_documents([_doc(content)], chunk_tokens=200, overlap_tokens=30)
+    
+    assert len(chunks) == 1
+    assert chunks[0]['content'] == content
+    assert chunks[0]['title'] == 'Guide'
+    assert chunks[0]['chunk_index'] == 0
+
+
+def test_consecutive_chunks_share_overlap():
+    paragraphs = [" ".join(f"w{p}_{i}" for i in range(40)) for p in range(5)]
+    content = "# Guide\n\n## Part\n\n" + "\n\n".join(paragraphs)
+    chunks = chunk_documents([_doc(content)], chunk_tokens=60, overlap_tokens=10)
+    
+    assert len(chunks) > 1
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current['content'].split()[0] in previous['content'].split()
+    assert [chunk['chunk_index'] for chunk in chunks] == list(range(len(chunks)))
+    assert all(chunk['title'] == 'Guide - Part' for chunk in chunks[1:])
+
+
+def test_headings_in_code_fences_do_not_split_sections():
+    body = " ".join(["word"] * 30)
+    content = f"# Guide\n\n## Real\n\n{body}\n\n```\n# comment\n```\n\n{body}"
+    chunks = chunk_documents([_doc(content)], chunk_tokens=40, overlap_tokens=5)
+    
+    assert {chunk['section'] for chunk in chunks} <= {'Guide', 'Real'}
+    assert any('# comment' in chunk['content'] for chunk in chunks)
+
+
+def test_overlap_must_be_smaller_than_chunk():
+    with pytest.raises(ValueError):
+        chunk_documents([_doc("text")], chunk_tokens=10, overlap_tokens=10)
@@ -0,0 +1,37 @@
+"""Tests for hybrid rank fusion (retriever.fuse_rankings)."""
+
+import random
+from src.retriever import fuse_rankings, HYBRID_LEXICAL_WEIGHT
+
+
+def test_results_are_ordered_by_calibrated_score():
+    rng = random.Random(1)
+    for _ in range(50):
+        lexical = sorted(((rng.random(), f"d{i}", f"d{i}") for i in rng.sample(range(30), 12)), reverse=True)
+        dense = sorted(((rng.random(), f"d{i}", f"d{i}") for i in rng.sample(range(30), 12)), reverse=True)
+        fused = fuse_rankings(lexical, dense, top_k=8)
+        
+        scores = [scores['score'] for _, scores in fused]
+        assert scores == sorted(scores, reverse=True)
+        
+        # Nothing left out scores higher than the last returned hit
+        returned = {payload for payload, _ in fused}
+        everything = fuse_rankings(lexical, dense, top_k=100)
+        assert all(s['score'] <= scores[-1] for payload, s in everything if payload not in returned)
+
+
+def test_calibrated_score_is_weighted_mean_of_both_scorers():
+    fused = dict(fuse_rankings([(0.8, "a", "a"), (0.4, "b", "b")], [(0.6, "b", "b")], top_k=2))
+    
+    assert fused["a"]['score'] == HYBRID_LEXICAL_WEIGHT * 0.8
+    assert fused["b"]['score'] == HYBRID_LEXICAL_WEIGHT * 0.4 + (1 - HYBRID_LEXICAL_WEIGHT) * 0.6
+    assert fused["a"]['dense_score'] == 0.0
+    assert fused["b"]['rrf_score'] > fused["a"]['rrf_score']
+
+
+def test_reciprocal_rank_breaks_ties():
+    # a and b both score 0.3; a ranks first in its list, b second in its
+    fused = fuse_rankings([(0.6, "a", "a")], [(0.7, "c", "c"), (0.6, "b", "b")], top_k=3)
+    
+    assert [payload for payload, _ in fused] == ["c", "a", "b"]
+    assert fused[1][1]['score'] == fused[2][1]['score']
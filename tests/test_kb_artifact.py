@@ -0,0 +1,99 @@
+"""Tests for the JSONL chunk artifact: round-trips, builds from it, and keeping it in step with kb_chunks."""
+
+import os
+import gzip
+import json
+import pytest
+from src.database import get_connection
+from src.retriever import KBRetriever
+from src.kb_artifact import ARTIFACT_PATH, write_artifact, iter_artifact, build_index_from_artifact, load_index_chunks
+from src.kb_pipeline import rebuild_kb_index, sync_kb_sources, load_documents_from_files, iter_kb_chunks
+from tests.conftest import write_doc, write_tickets
+
+
+def _record(chunk_id: int, text: str) -> dict:
+    return {
+        'id': chunk_id,
+        'title': f"Guide {chunk_id}",
+        'category': 'Network',
+        'source': 'guide.md',
+        'source_key': 'data/docs/guide.md',
+        'original_text': text,
+        'compressed_text': text,
+        'parent_title': 'Guide',
+        'section': 'Steps',
+        'chunk_index': chunk_id - 1
+    }
+
+
+def _artifact_ids(path: str = ARTIFACT_PATH) -> set:
+    return {record['id'] for record in iter_artifact(path)}
+
+
+def _chunk_ids() -> set:
+    conn = get_connection()
+    ids = {row['id'] for row in conn.execute("SELECT id FROM kb_chunks")}
+    conn.close()
+    return ids
+
+
+def test_gzip_artifact_round_trip(tmp_path):
+    path = str(tmp_path / "chunks.jsonl.gz")
+    records = [_record(1, "Reconnect the VPN — ünïcode ✓"), _record(2, "Restart the print spooler")]
+    
+    assert write_artifact(iter(records), path) == 2
+    assert list(iter_artifact(path)) == records
+    # A real gzip file whose first line is the header; no staging file is left behind
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        assert json.loads(f.readline())['format'] == "kb-chunks"
+    assert os.listdir(tmp_path) == ["chunks.jsonl.gz"]
+
+
+def test_unknown_file_is_rejected(tmp_path):
+    path = str(tmp_path / "other.jsonl.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write('{"format": "something-else"}\n')
+    
+    with pytest.raises(ValueError):
+        list(iter_artifact(path))
+
+
+def test_index_built_from_artifact_serves_its_chunks(kb_env):
+    records = [_record(1, "vpn token reconnect tunnel"), _record(2, "printer spooler driver reinstall")]
+    write_artifact(records, "chunks.jsonl.gz")
+    
+    chunks = load_index_chunks(iter_artifact("chunks.jsonl.gz"), batch_size=1)
+    assert [chunk['id'] for chunk in chunks] == [1, 2]
+    
+    retriever = KBRetriever("tfidf")
+    assert build_index_from_artifact("chunks.jsonl.gz", retriever) is not None
+    hits = retriever.retrieve("printer driver", top_k=1)
+    assert hits[0]['id'] == 2
+    assert hits[0]['text'] == "printer spooler driver reinstall"
+
+
+def test_rebuild_publishes_artifact_matching_kb_chunks(kb_env):
+    write_tickets([("T1", "VPN", "Network", "Reconnect the VPN tunnel"), ("T2", "Printer", "Hardware", "Restart the spooler")])
+    assert rebuild_kb_index(include_existing_docs=False, compression_workers=1)["success"]
+    assert _artifact_ids() == _chunk_ids()
+    
+    # A second rebuild appends new ids; the artifact follows them
+    previous = _chunk_ids()
+    assert rebuild_kb_index(include_existing_docs=False, compression_workers=1)["success"]
+    assert _artifact_ids() == _chunk_ids() != previous
+    assert not [name for name in os.listdir("storage") if name.startswith(".staging-")]
+    assert list(iter_artifact(ARTIFACT_PATH)) == list(iter_kb_chunks())
+
+
+def test_sync_removes_out_of_date_artifact(kb_env):
+    write_tickets([("T1", "VPN", "Network", "Reconnect the VPN tunnel")])
+    rebuild_kb_index(include_existing_docs=False, compression_workers=1)
+    assert os.path.exists(ARTIFACT_PATH)
+    
+    # Nothing changed: the artifact still matches kb_chunks
+    sync_kb_sources([])
+    assert os.path.exists(ARTIFACT_PATH)
+    
+    guide = write_doc("printer_guide.md", "# Printer\n\nRestart the print spooler.")
+    assert sync_kb_sources(load_documents_from_files([guide]))["success"]
+    assert not os.path.exists(ARTIFACT_PATH)
@@ -0,0 +1,116 @@
+"""Tests for background KB jobs: request coalescing, heartbeats and run ownership."""
+
+import time
+import pytest
+from src import kb_jobs
+from src.database import get_connection
+from src.kb_jobs import JobAbandoned, JobProgress, claim_job, enqueue_rebuild, get_job, run_job
+from src.kb_pipeline import rebuild_kb_index
+from src.retriever import get_active_generation
+from tests.conftest import write_tickets
+
+
+def _age_heartbeat(job_id: int, seconds: int):
+    """Pretend the job's last heartbeat was seconds ago."""
+    conn = get_connection()
+    conn.execute(f"UPDATE kb_jobs SET heartbeat_at = datetime('now', '-{seconds} seconds') WHERE id = ?", (job_id,))
+    conn.commit()
+    conn.close()
+
+
+def _take_over(job_id: int) -> dict:
+    """Let another worker claim a running job after it went stale."""
+    _age_heartbeat(job_id, kb_jobs.JOB_STALE_SECONDS + 60)
+    job = claim_job("other-worker")
+    assert job['id'] == job_id
+    return job
+
+
+def test_queued_rebuilds_absorb_new_requests(kb_env):
+    first = enqueue_rebuild(csv_files=["a.csv"], include_existing_docs=False)
+    second = enqueue_rebuild(md_files=["x.md"], csv_files=["b.csv", "a.csv"], include_existing_docs=True)
+    
+    assert second == first
+    job = get_job(first)
+    assert job['requests'] == 2
+    assert job['params'] == {"md_files": ["x.md"], "csv_files": ["a.csv", "b.csv"], "include_existing_docs": True}
+
+
+def test_request_during_a_run_queues_another_rebuild(kb_env):
+    running = enqueue_rebuild()
+    assert claim_job("worker")['id'] == running
+    
+    queued = enqueue_rebuild()
+    assert queued != running
+    assert enqueue_rebuild() == queued
+    assert [job['id'] for job in kb_jobs.get_active_jobs()] == [running, queued]
+
+
+def test_stale_job_is_requeued_then_failed_after_max_attempts(kb_env, monkeypatch):
+    monkeypatch.setattr(kb_jobs, "JOB_MAX_ATTEMPTS", 2)
+    job_id = enqueue_rebuild()
+    claim_job("worker-1")
+    
+    assert _take_over(job_id)['attempts'] == 2
+    _age_heartbeat(job_id, kb_jobs.JOB_STALE_SECONDS + 60)
+    assert claim_job("worker-3") is None
+    job = get_job(job_id)
+    assert job['status'] == 'failed' and job['error'] == 'Worker stopped responding'
+
+
+def test_heartbeats_keep_a_quiet_job_alive(kb_env, monkeypatch):
+    monkeypatch.setattr(kb_jobs, "JOB_HEARTBEAT_SECONDS", 0.05)
+    
+    def quiet_runner(params, progress):
+        # Report nothing while the heartbeat thread refreshes the row
+        _age_heartbeat(progress.job_id, kb_jobs.JOB_STALE_SECONDS + 60)
+        time.sleep(0.3)
+        conn = get_connection()
+        fresh = conn.execute(
+            f"SELECT heartbeat_at > datetime('now', '-{kb_jobs.JOB_STALE_SECONDS} seconds') FROM kb_jobs WHERE id = ?",
+            (progress.job_id,)
+        ).fetchone()[0]
+        conn.close()
+        return {"success": bool(fresh)}
+    
+    monkeypatch.setitem(kb_jobs.JOB_RUNNERS, "rebuild", quiet_runner)
+    job_id = enqueue_rebuild()
+    result = run_job(claim_job("worker"))
+    
+    assert result["success"]
+    assert get_job(job_id)['status'] == 'succeeded'
+
+
+def test_abandoned_run_is_stopped_and_cannot_record_its_result(kb_env, monkeypatch):
+    def runner(params, progress):
+        progress(10, 100, "Working...")
+        _take_over(progress.job_id)
+        with pytest.raises(JobAbandoned):
+            progress(20, 100, "Still working...")
+        return {"success": True}
+    
+    monkeypatch.setitem(kb_jobs.JOB_RUNNERS, "rebuild", runner)
+    job_id = enqueue_rebuild()
+    run_job(claim_job("worker"))
+    
+    # The run that took over still owns the job
+    job = get_job(job_id)
+    assert (job['status'], job['worker'], job['attempts']) == ('running', 'other-worker', 2)
+    assert job['result'] is None
+
+
+def test_abandoned_rebuild_is_not_published(kb_env):
+    write_tickets([("T1", "VPN", "Network", "Reconnect the VPN client.")])
+    job_id = enqueue_rebuild(include_existing_docs=False)
+    job = claim_job("worker")
+    progress = JobProgress(job_id, job['worker'], job['attempts'])
+    _take_over(job_id)
+    
+    result = rebuild_kb_index(include_existing_docs=False, publish_guard=progress.assert_owner)
+    assert not result["success"]
+    assert get_active_generation() is None
+    conn = get_connection()
+    counts = [conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ("kb_chunks", "kb_chunks_staging")]
+    conn.close()
+    # The staged chunks stay for the run that took over to resume from
+    assert counts == [0, 1]
@@ -0,0 +1,65 @@
+"""Tests for the retrieval result cache (TTL expiry, LRU eviction, key normalization)."""
+
+from src import query_cache
+from src.query_cache import QueryCache, normalize_query, normalize_category
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(query_cache.time, "monotonic", clock)
+    cache = QueryCache(max_entries=4, ttl_seconds=10.0)
+    
+    cache.put("q", ["hit"])
+    clock.now += 10.0
+    assert cache.get("q") == ["hit"]
+    clock.now += 0.5
+    assert cache.get("q") is None
+    assert cache.stats()['entries'] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(max_entries=2, ttl_seconds=60.0)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()['entries'] == 2
+
+
+def test_zero_size_cache_stores_nothing():
+    cache = QueryCache(max_entries=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+
+
+def test_clear_keeps_counters():
+    cache = QueryCache()
+    cache.put("a", 1)
+    cache.get("a")
+    cache.clear()
+    
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 0)
+    assert stats['hit_rate'] == 0.5
+
+
+def test_keys_are_normalized():
+    assert normalize_query("  Reset   my\tPASSWORD ") == "reset my password"
+    assert normalize_category(None) is None
+    assert normalize_category("All") is None
+    assert normalize_category("Network") == ("Network",)
+    assert normalize_category(["Network", "Email", "Network"]) == ("Email", "Network")
@@ -0,0 +1,71 @@
+"""Tests for resuming an interrupted staged rebuild (kb_pipeline.rebuild_kb_index)."""
+
+from src.database import get_connection
+from src.kb_pipeline import rebuild_kb_index
+from src.retriever import get_active_generation
+from tests.conftest import write_tickets
+
+
+def _tickets(count: int) -> list:
+    return [
+        (f"T{i:02d}", f"Issue {i}", "Network", f"Resolution {i}: " + " ".join(f"step{i}x{j}" for j in range(12)))
+        for i in range(count)
+    ]
+
+
+def _count(table: str) -> int:
+    conn = get_connection()
+    count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return count
+
+
+def _rebuild(**kwargs) -> dict:
+    return rebuild_kb_index(include_existing_docs=False, batch_size=3, compression_workers=1, **kwargs)
+
+
+def test_interrupted_rebuild_resumes_from_staged_sources(kb_env, fake_scaledown):
+    write_tickets(_tickets(10))
+    fake_scaledown.fail_marker = "Resolution 7:"
+    
+    failed = _rebuild()
+    assert not failed["success"]
+    # Two full batches were checkpointed; nothing was published
+    assert _count("kb_sources_staging") == 6
+    assert _count("kb_chunks") == 0
+    assert get_active_generation() is None
+    
+    fake_scaledown.fail_marker = None
+    calls = fake_scaledown.calls
+    result = _rebuild()
+    assert result["success"]
+    assert (result["resumed"], result["attempts"], result["sources_skipped"]) == (True, 2, 6)
+    assert result["chunks_count"] == 10
+    # Staged sources are skipped, and T06 (compressed before T07 failed) comes from the cache
+    assert fake_scaledown.calls - calls == 3
+    assert result["compression_cache"]["hits"] == 1
+    assert _count("kb_chunks") == 10 and _count("kb_chunks_staging") == 0
+    assert get_active_generation()['chunks_count'] == 10
+
+
+def test_rebuild_with_other_settings_starts_over(kb_env, fake_scaledown):
+    write_tickets(_tickets(10))
+    fake_scaledown.fail_marker = "Resolution 7:"
+    _rebuild()
+    
+    fake_scaledown.fail_marker = None
+    result = _rebuild(chunk_tokens=100, overlap_tokens=10)
+    assert result["success"]
+    assert (result["resumed"], result["attempts"], result["sources_skipped"]) == (False, 1, 0)
+
+
+def test_failed_rebuild_keeps_serving_the_live_kb(kb_env, fake_scaledown):
+    write_tickets(_tickets(4))
+    assert _rebuild()["success"]
+    generation = get_active_generation()['generation']
+    
+    write_tickets(_tickets(10))
+    fake_scaledown.fail_marker = "Resolution 7:"
+    assert not _rebuild()["success"]
+    assert get_active_generation()['generation'] == generation
+    assert _count("kb_chunks") == 4
@@ -0,0 +1,82 @@
+"""Tests for KBRetriever result caching: callers must not be able to change cached results."""
+
+import pytest
+from src.chunk_store import ChunkStore
+from src.retriever import KBRetriever
+
+
+CHUNKS = [
+    {'id': 1, 'title': 'VPN', 'category': 'Network', 'text': 'vpn token expired reconnect client'},
+    {'id': 2, 'title': 'Printer', 'category': 'Hardware', 'text': 'printer driver queue reset spooler'},
+    {'id': 3, 'title': 'Mail', 'category': 'Email', 'text': 'outlook mailbox full archive vpn'}
+]
+
+
+def test_chunk_views_are_read_only():
+    view = ChunkStore.from_chunks(CHUNKS)[0]
+    with pytest.raises(TypeError):
+        view['score'] = 1.0
+    
+    scored = view.with_values({'score': 0.5})
+    assert scored['score'] == 0.5 and scored['title'] == 'VPN'
+    assert 'score' not in view
+    assert scored.with_values({'score': 0.7})['score'] == 0.7 and scored['score'] == 0.5
+
+
+@pytest.mark.parametrize("mode", ["tfidf", "bm25", "dense", "hybrid"])
+def test_callers_get_their_own_result_lists(kb_env, mode):
+    retriever = KBRetriever(mode)
+    retriever.build_index([dict(chunk, compressed_text=chunk['text']) for chunk in CHUNKS])
+    
+    first = retriever.retrieve("vpn token", top_k=2)
+    expected = [(hit['id'], hit['score']) for hit in first]
+    first.reverse()
+    first.append({'id': 99, 'score': 1.0})
+    
+    second = retriever.retrieve("vpn token", top_k=2)
+    assert retriever.cache_stats()['hits'] == 1
+    assert [(hit['id'], hit['score']) for hit in second] == expected
+    assert second is not retriever.retrieve("vpn token", top_k=2)
+
+
+def _indexed(mode: str) -> KBRetriever:
+    retriever = KBRetriever(mode)
+    retriever.build_index([dict(chunk, compressed_text=chunk['text']) for chunk in CHUNKS])
+    return retriever
+
+
+NEW_CHUNK = {'id': 4, 'title': 'SSO', 'category': 'Network', 'text': 'kerberos ticket renewal for vpn single sign on'}
+
+
+@pytest.mark.parametrize("mode", ["tfidf", "bm25", "hybrid"])
+def test_words_new_to_the_index_are_searchable_after_add(kb_env, mode):
+    retriever = _indexed(mode)
+    before = retriever.retrieve("vpn token", top_k=3)
+    retriever.add_chunks([dict(NEW_CHUNK, compressed_text=NEW_CHUNK['text'])])
+    
+    hits = retriever.retrieve("kerberos renewal", top_k=3)
+    assert [hit['id'] for hit in hits] == [4]
+    assert 0 < hits[0]['score'] <= 1.0
+    
+    # Queries without new words score the base chunks as before
+    after = {hit['id']: hit['score'] for hit in retriever.retrieve("vpn token", top_k=4)}
+    for hit in before:
+        assert after[hit['id']] == pytest.approx(hit['score'], rel=1e-5)
+    
+    # Merging into a new generation keeps the new words
+    retriever.merge_segments()
+    assert [hit['id'] for hit in retriever.retrieve("kerberos renewal", top_k=3)] == [4]
+
+
+@pytest.mark.parametrize("mode", ["tfidf", "bm25", "dense", "hybrid"])
+def test_chunks_without_a_match_are_not_returned(kb_env, mode):
+    retriever = _indexed(mode)
+    assert retriever.retrieve("zebra giraffe", top_k=3) == []
+    
+    hits = retriever.retrieve("spooler", top_k=3)
+    assert all(hit['score'] > 0 for hit in hits)
+    if mode in ("tfidf", "bm25"):
+        assert [hit['id'] for hit in hits] == [2]
+    elif mode == "hybrid":
+        # Dense neighbours with a positive similarity may follow the lexical match
+        assert hits[0]['id'] == 2
@@ -0,0 +1,112 @@
+"""Tests for the ScaleDown rate limiter and retry policy (no network access)."""
+
+import pytest
+from src import scaledown_client
+from src.scaledown_client import TokenBucket, compress_text_with_retry
+
+
+class FakeClock:
+    """time.monotonic/time.sleep pair where sleeping advances the clock."""
+    
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+    
+    def monotonic(self) -> float:
+        return self.now
+    
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(scaledown_client.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(scaledown_client.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_bucket_allows_burst_then_paces_requests(clock):
+    bucket = TokenBucket(rate=2.0, burst=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.sleeps == []
+    
+    start = clock.now
+    for _ in range(4):
+        bucket.acquire()
+    assert clock.now - start == pytest.approx(2.0)
+
+
+def test_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(rate=1.0, burst=2)
+    bucket.acquire()
+    bucket.acquire()
+    clock.now += 60.0
+    
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert sum(clock.sleeps) == pytest.approx(1.0)
+
+
+def test_zero_rate_disables_limit(clock):
+    bucket = TokenBucket(rate=0, burst=1)
+    for _ in range(100):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+
+def _responses(monkeypatch, errors: list) -> list:
+    """Make compress_text fail with each error in turn, then succeed; return the calls list."""
+    calls = []
+    
+    def fake(text, target_model="gemini-2.5-flash"):
+        calls.append(text)
+        if len(calls) <= len(errors):
+            return {"success": False, "error": errors[len(calls) - 1]}
+        return {"success": True, "error": None, "compressed_text": text}
+    
+    monkeypatch.setattr(scaledown_client, "compress_text", fake)
+    monkeypatch.setattr(scaledown_client, "SCALEDOWN_API_KEY", "test-key")
+    monkeypatch.setattr(scaledown_client, "_rate_limiter", TokenBucket(0, 1))
+    return calls
+
+
+def test_transient_errors_are_retried_with_backoff(monkeypatch, clock):
+    calls = _responses(monkeypatch, ["API error: 503 - unavailable", "API error: 429 - slow down"])
+    
+    result = compress_text_with_retry("text", max_attempts=3)
+    assert result["success"] and result["attempts"] == 3
+    assert len(calls) == 3
+    assert clock.sleeps == [scaledown_client.SCALEDOWN_RETRY_DELAY_SECONDS * 1, scaledown_client.SCALEDOWN_RETRY_DELAY_SECONDS * 2]
+
+
+def test_client_errors_are_not_retried(monkeypatch, clock):
+    calls = _responses(monkeypatch, ["API error: 400 - bad request"])
+    
+    result = compress_text_with_retry("text", max_attempts=3)
+    assert not result["success"] and result["attempts"] == 1
+    assert len(calls) == 1 and clock.sleeps == []
+
+
+def test_gives_up_after_max_attempts(monkeypatch, clock):
+    calls = _responses(monkeypatch, ["Timeout"] * 5)
+    
+    result = compress_text_with_retry("text", max_attempts=2)
+    assert not result["success"] and result["attempts"] == 2
+    assert len(calls) == 2
+
+
+def test_every_attempt_takes_a_token(monkeypatch, clock):
+    _responses(monkeypatch, ["API error: 502 - bad gateway"] * 2)
+    bucket = TokenBucket(rate=1.0, burst=1)
+    monkeypatch.setattr(scaledown_client, "_rate_limiter", bucket)
+    monkeypatch.setattr(scaledown_client, "SCALEDOWN_RETRY_DELAY_SECONDS", 0.0)
+    
+    compress_text_with_retry("text", max_attempts=3)
+    # First attempt uses the burst token; the two retries each wait one second
+    assert sum(clock.sleeps) == pytest.approx(2.0)
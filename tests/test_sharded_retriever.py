@@ -0,0 +1,55 @@
+"""Tests for sharded retrieval: results must match a single unsharded KBRetriever."""
+
+import random
+import pytest
+from src.kb_pipeline import rebuild_kb_index
+from src.retriever import KBRetriever
+from src.sharded_retriever import ShardedRetriever
+from tests.conftest import write_tickets
+
+
+WORDS = [
+    "printer", "driver", "queue", "reset", "vpn", "token", "password", "outlook",
+    "mailbox", "wifi", "adapter", "laptop", "battery", "monitor", "license", "install"
+]
+CATEGORIES = ["Hardware", "Network", "Email", "Software"]
+QUERIES = ["printer driver reset", "vpn token", "outlook mailbox password", "wifi adapter laptop", "license"]
+
+
+@pytest.fixture
+def kb_index(kb_env):
+    rng = random.Random(11)
+    rows = [
+        (
+            f"T{i:03d}",
+            " ".join(rng.sample(WORDS, 3)),
+            rng.choice(CATEGORIES),
+            " ".join(rng.choices(WORDS, k=rng.randint(8, 30)))
+        )
+        for i in range(60)
+    ]
+    write_tickets(rows)
+    rebuild_kb_index(csv_file="data/resolved_tickets.csv", include_existing_docs=False, skip_compression=True)
+    return kb_env
+
+
+def _ranking(hits: list) -> list:
+    return [(hit['id'], round(hit['score'], 6)) for hit in hits]
+
+
+@pytest.mark.parametrize("mode", ["tfidf", "bm25", "dense", "hybrid"])
+def test_sharded_results_match_single_index(kb_index, mode):
+    single = KBRetriever(mode)
+    single.load_index()
+    sharded = ShardedRetriever(num_shards=3, mode=mode)
+    try:
+        sharded.load_index()
+        for category in (None, "Network", ["Email", "Software"]):
+            expected = single.retrieve_many(QUERIES, top_k=5, category=category)
+            actual = sharded.retrieve_many(QUERIES, top_k=5, category=category)
+            for want, got in zip(expected, actual):
+                assert [round(hit['score'], 6) for hit in got] == [round(hit['score'], 6) for hit in want]
+                # Chunks may only swap places where scores tie
+                assert sorted(_ranking(got)) == sorted(_ranking(want))
+    finally:
+        sharded.close()
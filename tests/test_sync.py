@@ -0,0 +1,158 @@
+"""Tests for incremental KB sync (kb_pipeline.sync_kb_sources), including near-duplicate re-ingest."""
+
+import os
+from src.database import get_connection
+from src.retriever import get_retriever
+from src.kb_pipeline import sync_kb_sources, sync_kb_index, load_documents_from_files, ingest_documents
+from tests.conftest import write_doc, write_tickets
+
+
+VPN_GUIDE = "# VPN\n\nOpen the VPN client, sign in with your token and reconnect if the tunnel drops."
+PRINTER_GUIDE = "# Printer\n\nRestart the print spooler and reinstall the printer driver from the portal."
+
+
+def _chunk_sources() -> dict:
+    """source_key -> number of chunk rows."""
+    conn = get_connection()
+    rows = conn.execute("SELECT source_key, COUNT(*) AS n FROM kb_chunks GROUP BY source_key").fetchall()
+    conn.close()
+    return {row['source_key']: row['n'] for row in rows}
+
+
+def _table(query: str) -> set:
+    conn = get_connection()
+    rows = {tuple(row) for row in conn.execute(query).fetchall()}
+    conn.close()
+    return rows
+
+
+def _ticket(ticket_id: str, content: str) -> dict:
+    return {
+        'title': f"Ticket {ticket_id}",
+        'content': content,
+        'category': 'Network',
+        'source': 'resolved_tickets.csv',
+        'source_key': f"tickets#{ticket_id}"
+    }
+
+
+def test_added_changed_and_deleted_sources(kb_env):
+    vpn = write_doc("vpn_guide.md", VPN_GUIDE)
+    printer = write_doc("printer_guide.md", PRINTER_GUIDE)
+    result = sync_kb_sources(load_documents_from_files([vpn, printer]))
+    assert result["success"] and (result["added"], result["changed"], result["deleted"]) == (2, 0, 0)
+    assert set(_chunk_sources()) == {vpn, printer}
+    
+    # Unchanged sources are skipped
+    result = sync_kb_sources(load_documents_from_files([vpn, printer]))
+    assert (result["added"], result["changed"], result["unchanged"]) == (0, 0, 2)
+    assert result["chunks_added"] == 0
+    
+    write_doc("vpn_guide.md", VPN_GUIDE + "\n\nUse the backup gateway when the main one is down.")
+    result = sync_kb_sources(load_documents_from_files([vpn, printer]))
+    assert (result["changed"], result["unchanged"]) == (1, 1)
+    conn = get_connection()
+    texts = [row['text'] for row in conn.execute("SELECT text FROM kb_chunks WHERE source_key = ?", (vpn,))]
+    conn.close()
+    assert any("backup gateway" in text for text in texts)
+    
+    os.remove(printer)
+    result = sync_kb_sources([], deleted_keys=[printer])
+    assert result["deleted"] == 1
+    assert set(_chunk_sources()) == {vpn}
+    assert _table("SELECT source_key FROM kb_sources") == {(vpn,)}
+
+
+def test_duplicate_is_reingested_when_canonical_source_is_deleted(kb_env):
+    first = write_doc("vpn_guide.md", VPN_GUIDE)
+    copy = write_doc("vpn_copy.md", VPN_GUIDE)
+    result = sync_kb_sources(load_documents_from_files([first, copy]))
+    assert result["duplicates_removed"] == 1
+    assert set(_chunk_sources()) == {first}
+    assert _table("SELECT source_key, canonical_key FROM kb_duplicate_sources") == {(copy, first)}
+    
+    # The copy's content only lived in the canonical chunks; it is read back from disk
+    os.remove(first)
+    result = sync_kb_sources([], deleted_keys=[first])
+    assert (result["deleted"], result["reingested"], result["members_pending"]) == (1, 1, 0)
+    assert set(_chunk_sources()) == {copy}
+    assert _table("SELECT source_key FROM kb_duplicate_sources") == set()
+    assert _table("SELECT source_key FROM kb_sources") == {(copy,)}
+
+
+def test_duplicate_is_reingested_when_canonical_source_changes(kb_env):
+    first = write_doc("vpn_guide.md", VPN_GUIDE)
+    copy = write_doc("vpn_copy.md", VPN_GUIDE)
+    sync_kb_sources(load_documents_from_files([first, copy]))
+    
+    write_doc("vpn_guide.md", PRINTER_GUIDE)
+    result = sync_kb_sources(load_documents_from_files([first]))
+    assert (result["changed"], result["reingested"]) == (1, 1)
+    assert set(_chunk_sources()) == {first, copy}
+
+
+def test_unavailable_duplicate_is_released_until_its_next_sync(kb_env):
+    first = write_doc("vpn_guide.md", VPN_GUIDE)
+    ticket = _ticket("T1", VPN_GUIDE)
+    sync_kb_sources(load_documents_from_files([first]) + [ticket])
+    assert set(_chunk_sources()) == {first}
+    
+    # The ticket is not at hand: its fingerprint is dropped so its next sync re-ingests it
+    os.remove(first)
+    result = sync_kb_sources([], deleted_keys=[first])
+    assert (result["reingested"], result["members_pending"]) == (0, 1)
+    assert _table("SELECT source_key FROM kb_sources") == set()
+    
+    result = sync_kb_sources([ticket])
+    assert result["added"] == 1
+    assert set(_chunk_sources()) == {ticket['source_key']}
+
+
+def test_ingest_reingests_duplicate_files_outside_the_batch(kb_env):
+    first = write_doc("vpn_guide.md", VPN_GUIDE)
+    copy = write_doc("vpn_copy.md", VPN_GUIDE)
+    ingest_documents(["data/docs"], update_index=False)
+    # Directory order decides which file is canonical
+    ((member, canonical),) = _table("SELECT source_key, canonical_key FROM kb_duplicate_sources")
+    assert {member, canonical} == {first, copy}
+    assert set(_chunk_sources()) == {canonical}
+    
+    write_doc(os.path.basename(canonical), PRINTER_GUIDE)
+    result = ingest_documents([canonical], update_index=False)
+    assert result["success"]
+    assert set(_chunk_sources()) == {first, copy}
+    assert _table("SELECT source_key FROM kb_duplicate_sources") == set()
+
+
+def test_sync_index_streams_sources_and_reingests_ticket_duplicates(kb_env):
+    vpn = write_doc("vpn_guide.md", VPN_GUIDE)
+    write_doc("printer_guide.md", PRINTER_GUIDE)
+    write_tickets([("T1", "VPN drops", "Network", VPN_GUIDE), ("T2", "Mailbox", "Email", "Archive old mail to free space.")])
+    result = sync_kb_index()
+    assert result["success"] and result["added"] == 4
+    assert result["duplicates_removed"] == 1
+    
+    result = sync_kb_index()
+    assert (result["added"], result["changed"], result["unchanged"]) == (0, 0, 4)
+    
+    # Documents are read before tickets, so the ticket is the member
+    assert _table("SELECT source_key, canonical_key FROM kb_duplicate_sources") == {("tickets#T1", vpn)}
+    
+    # Deleting the canonical document re-reads the ticket from the CSV
+    os.remove(vpn)
+    result = sync_kb_index()
+    assert (result["deleted"], result["reingested"], result["members_pending"], result["unchanged"]) == (1, 1, 0, 2)
+    assert "tickets#T1" in _chunk_sources() and vpn not in _chunk_sources()
+
+
+def test_synced_document_with_new_words_is_retrievable_right_away(kb_env):
+    vpn = write_doc("vpn_guide.md", VPN_GUIDE)
+    sync_kb_sources(load_documents_from_files([vpn]))
+    generation = get_retriever().generation
+    
+    sso = write_doc("sso_guide.md", "# SSO\n\nRenew the kerberos ticket with kinit before opening the intranet.")
+    result = sync_kb_sources(load_documents_from_files([sso]))
+    assert result["success"] and result["generation"] == generation
+    
+    hits = get_retriever().retrieve("kerberos kinit", top_k=3)
+    assert [hit['source_id'] for hit in hits] == [os.path.basename(sso)]